@@ -7,7 +7,6 @@ VPS-Optimized with Monitoring and Advanced Features
 import json
 import logging
 import os
-import socket
 import threading
 import time
 import signal
@@ -16,15 +15,28 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, g, request, jsonify, render_template
 from flask_cors import CORS
 import redis
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import yaml
 from prometheus_client import Counter, Histogram, Gauge, generate_latest
 import schedule
 
+# The shared modules live in Webhook_Server/; the Docker image copies them
+# next to this file, and a source checkout finds them there
+SHARED_MODULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Webhook_Server')
+if os.path.isdir(SHARED_MODULES):
+    sys.path.append(SHARED_MODULES)
+
+from mt_protocol import FramedConnection, SignalRejected
+from mt_transport import create_transport
+from signal_batch import MAX_BATCH_ITEMS, BatchError, parse_batch
+from signal_latency import LatencyTracker, SignalTimeline, parse_reply, source_time
+from traffic_capture import CaptureWriter
+from tracing import TRACEPARENT, Tracer
+
 @dataclass
 class TradingSignal:
     """Enhanced trading signal structure"""
@@ -41,6 +53,7 @@ class TradingSignal:
     mt_platform: str = "MT5"  # MT4 or MT5
     risk_score: float = 0.0
     confidence: float = 0.0
+    traceparent: str = ""  # Trace context handed to the terminal (see tracing.py)
 
 class EnhancedWebhookServer:
     def __init__(self, config_file: str = 'config.yaml'):
@@ -53,6 +66,10 @@ class EnhancedWebhookServer:
         self._setup_metrics()
         self._setup_database()
         self._setup_redis()
+        self._setup_transports()
+        self._setup_capture()
+        self._setup_tracing()
+        self._setup_latency()
         self._setup_routes()
         self._setup_scheduler()
         
@@ -74,7 +91,12 @@ class EnhancedWebhookServer:
             'metatrader': {
                 'mt4_port': 8081,
                 'mt5_port': 8082,
-                'timeout': 30
+                'timeout': 30,
+                # 'line' (one JSON line per connection) or 'framed' (see mt_protocol.py)
+                'protocol': 'line',
+                # Optional per-terminal transport, e.g.
+                # 'terminals': {'MT5': {'transport': 'unix', 'path': '/app/ipc/mt5.sock'}}
+                'terminals': {}
             },
             'database': {
                 'host': os.getenv('POSTGRES_HOST', 'postgres'),
@@ -96,17 +118,41 @@ class EnhancedWebhookServer:
             'logging': {
                 'level': 'INFO',
                 'file': '/app/logs/webhook.log'
+            },
+            'capture': {
+                # Record raw webhook requests for traffic_replay.py
+                'enabled': False,
+                'file': '/app/data/webhook_capture.bin'
+            },
+            'tracing': {
+                # Spans for tracing.py; continues the tunnel's traceparent
+                'enabled': False,
+                'file': '/app/logs/webhook_traces.jsonl',
+                'sample_rate': 1.0
+            },
+            'latency': {
+                # Alert-to-execution samples kept per segment and key for /latency
+                'window': 1000,
+                'recent': 100
+            },
+            'batch': {
+                # Largest request accepted by /webhook/batch
+                'max_items': MAX_BATCH_ITEMS
             }
         }
         
         try:
             if os.path.exists(config_file):
                 with open(config_file, 'r') as f:
-                    config = yaml.safe_load(f)
-                    # Merge with defaults
+                    config = yaml.safe_load(f) or {}
+                    # Merge with defaults, per key within each section, so a
+                    # file that sets only some of a section's keys still works
                     for key, value in default_config.items():
-                        if key not in config:
+                        if key not in config or config[key] is None:
                             config[key] = value
+                        elif isinstance(value, dict) and isinstance(config[key], dict):
+                            for subkey, subvalue in value.items():
+                                config[key].setdefault(subkey, subvalue)
                 return config
         except Exception as e:
             print(f"Error loading config: {e}")
@@ -139,6 +185,10 @@ class EnhancedWebhookServer:
             'processing_time': Histogram('webhook_processing_seconds', 'Signal processing time'),
             'active_connections': Gauge('webhook_active_connections', 'Active MT connections'),
             'mt_latency': Histogram('mt_communication_seconds', 'MT communication latency', ['platform']),
+            'signal_latency': Histogram(
+                'signal_latency_seconds', 'Alert-to-execution latency by segment',
+                ['segment', 'source', 'symbol', 'terminal']
+            ),
             'error_count': Counter('webhook_errors_total', 'Total errors', ['type'])
         }
 
@@ -174,6 +224,59 @@ class EnhancedWebhookServer:
             self.logger.error(f"Redis connection failed: {e}")
             self.redis_client = None
 
+    def _setup_transports(self):
+        """Build the MT transport for each terminal (TCP unless configured otherwise)"""
+        mt_config = self.config['metatrader']
+        terminals = mt_config.get('terminals') or {}
+        self.transports = {}
+        self.mt_connections = {}
+        
+        for platform, port in [('MT4', mt_config['mt4_port']), ('MT5', mt_config['mt5_port'])]:
+            spec = terminals.get(platform) or {'transport': 'tcp', 'host': 'localhost', 'port': port}
+            self.transports[platform] = create_transport(spec, timeout=mt_config['timeout'])
+            self.logger.info(f"{platform} transport: {self.transports[platform].describe()}")
+            
+            # Framed protocol: one persistent connection per terminal shared by
+            # all request threads, with acks matched by sequence ID
+            if mt_config.get('protocol', 'line') == 'framed':
+                self.mt_connections[platform] = FramedConnection(
+                    self.transports[platform], timeout=mt_config['timeout']
+                )
+
+    def _setup_capture(self):
+        """Open the capture file when capture mode is enabled"""
+        self.capture = None
+        capture_config = self.config.get('capture') or {}
+        if capture_config.get('enabled'):
+            Path(capture_config['file']).parent.mkdir(parents=True, exist_ok=True)
+            self.capture = CaptureWriter(capture_config['file'])
+            self.logger.info(f"Capturing webhook traffic to {capture_config['file']}")
+
+    def _setup_tracing(self):
+        """Open the span file when tracing is enabled"""
+        self.tracer = None
+        tracing_config = self.config.get('tracing') or {}
+        if tracing_config.get('enabled'):
+            Path(tracing_config['file']).parent.mkdir(parents=True, exist_ok=True)
+            self.tracer = Tracer(
+                'enhanced_webhook', tracing_config['file'],
+                sample_rate=tracing_config.get('sample_rate', 1.0)
+            )
+            self.logger.info(f"Writing trace spans to {tracing_config['file']}")
+    
+    def _setup_latency(self):
+        """Per-signal timelines summarized by source, symbol and terminal"""
+        latency_config = self.config.get('latency') or {}
+        self.latency = LatencyTracker(
+            window=latency_config.get('window', 1000),
+            recent=latency_config.get('recent', 100)
+        )
+    
+    def _start_span(self, name: str, **attributes):
+        """Child span of the current request's span, or None when not tracing"""
+        parent = g.get('trace_span')
+        return self.tracer.start_span(name, parent, **attributes) if parent else None
+    
     def _init_database_schema(self):
         """Initialize database schema"""
         if not self.db_pool:
@@ -199,6 +302,14 @@ class EnhancedWebhookServer:
             result TEXT
         );
         
+        -- Alert-to-execution timestamps (see signal_latency.py)
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS source_time TIMESTAMP;
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS received_at TIMESTAMP;
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS dispatched_at TIMESTAMP;
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS acked_at TIMESTAMP;
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS executed_at TIMESTAMP;
+        ALTER TABLE trading_signals ADD COLUMN IF NOT EXISTS latency_ms JSONB;
+        
         CREATE TABLE IF NOT EXISTS system_metrics (
             id SERIAL PRIMARY KEY,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -224,6 +335,29 @@ class EnhancedWebhookServer:
     def _setup_routes(self):
         """Setup Flask routes"""
         
+        @self.app.before_request
+        def capture_request():
+            if self.capture and request.path.startswith('/webhook'):
+                path = request.path
+                if request.query_string:
+                    path += '?' + request.query_string.decode('utf-8')
+                self.capture.write(request.method, path, request.headers, request.get_data(cache=True))
+        
+        @self.app.before_request
+        def start_trace():
+            if self.tracer and request.path.startswith('/webhook'):
+                g.trace_span = self.tracer.start_span(
+                    'webhook.request', request.headers.get(TRACEPARENT), path=request.path
+                )
+        
+        @self.app.after_request
+        def end_trace(response):
+            span = g.pop('trace_span', None)
+            if span:
+                span.set(status_code=response.status_code)
+                span.end('ok' if response.status_code < 500 else 'error')
+            return response
+        
         @self.app.route('/', methods=['GET'])
         def index():
             return render_template('dashboard.html')
@@ -260,15 +394,29 @@ class EnhancedWebhookServer:
                 signal.risk_score = self._calculate_risk_score(signal)
                 signal.confidence = self._calculate_confidence(signal)
                 
-                # Process signal
-                result = self._process_signal(signal)
+                terminal = 'MT5' if signal.mt_platform == 'MT5' else 'MT4'
+                timeline = SignalTimeline(signal.source, signal.symbol, terminal,
+                                          source_time(signal_data), start_time)
+                
+                # Process signal; the terminal sees the delivery span as its parent
+                delivery = self._start_span('mt.delivery', platform=signal.mt_platform, symbol=signal.symbol)
+                if delivery:
+                    signal.traceparent = delivery.traceparent()
+                timeline.mark('dispatched')
+                result = self._process_signal(signal, timeline)
+                if delivery:
+                    delivery.end('ok' if result['success'] else 'error')
+                self._record_latency(timeline)
                 
                 # Record processing time
                 processing_time = (time.time() - start_time) * 1000
                 self.metrics['processing_time'].observe(time.time() - start_time)
                 
                 # Log to database
-                self._log_signal_to_db(signal, processing_time, result)
+                db_span = self._start_span('db.write') if self.db_pool else None
+                self._log_signal_to_db(signal, processing_time, result, timeline)
+                if db_span:
+                    db_span.end()
                 
                 # Cache recent signals
                 self._cache_signal(signal)
@@ -276,6 +424,9 @@ class EnhancedWebhookServer:
                 if result['success']:
                     self.metrics['signals_processed'].labels(status='success').inc()
                     return jsonify({"status": "success", "message": result['message']})
+                elif result.get('rejected'):
+                    self.metrics['signals_processed'].labels(status='rejected').inc()
+                    return jsonify({"status": "error", "message": result['message']}), 422
                 else:
                     self.metrics['signals_processed'].labels(status='error').inc()
                     return jsonify({"status": "error", "message": result['message']}), 500
@@ -285,6 +436,98 @@ class EnhancedWebhookServer:
                 self.metrics['error_count'].labels(type='webhook').inc()
                 return jsonify({"status": "error", "message": str(e)}), 500
 
+        @self.app.route('/webhook/batch', methods=['POST'])
+        def webhook_batch():
+            start_time = time.time()
+            
+            try:
+                # Authentication and rate limiting apply once per batch
+                if not self._authenticate_request(request):
+                    return jsonify({"error": "Unauthorized"}), 401
+                
+                if not self._check_rate_limit(request.remote_addr):
+                    return jsonify({"error": "Rate limit exceeded"}), 429
+                
+                max_items = (self.config.get('batch') or {}).get('max_items', MAX_BATCH_ITEMS)
+                try:
+                    entries = parse_batch(request.get_data(cache=True), max_items)
+                except BatchError as e:
+                    return jsonify({"status": "error", "message": str(e)}), e.status
+                
+                # Validate every item and group the valid signals per terminal
+                results = [None] * len(entries)
+                batches = {}
+                for index, (signal_data, error) in enumerate(entries):
+                    sig = None
+                    if error is None:
+                        try:
+                            sig = self._parse_signal(signal_data)
+                        except (AttributeError, TypeError, ValueError) as e:
+                            # A non-string action fails .upper() with AttributeError
+                            error = f"Invalid signal: {e}"
+                    if sig:
+                        self.metrics['signals_total'].labels(source=sig.source, action=sig.action).inc()
+                        if not self._validate_signal(sig):
+                            error = "Invalid signal"
+                    if error:
+                        self.metrics['signals_processed'].labels(status='invalid').inc()
+                        results[index] = {"index": index, "status": "error", "message": error}
+                        continue
+                    
+                    sig.risk_score = self._calculate_risk_score(sig)
+                    sig.confidence = self._calculate_confidence(sig)
+                    terminal = 'MT5' if sig.mt_platform == 'MT5' else 'MT4'
+                    timeline = SignalTimeline(sig.source, sig.symbol, terminal,
+                                              source_time(signal_data), start_time)
+                    batches.setdefault(terminal, []).append((index, sig, timeline))
+                
+                # One write per terminal
+                rows = []
+                for terminal, batch in batches.items():
+                    signals = [sig for _, sig, _ in batch]
+                    timelines = [timeline for _, _, timeline in batch]
+                    delivery = self._start_span('mt.delivery', platform=terminal, batch=len(batch))
+                    for sig, timeline in zip(signals, timelines):
+                        if delivery:
+                            sig.traceparent = delivery.traceparent()
+                        timeline.mark('dispatched')
+                    
+                    outcomes = self._process_batch(signals, terminal, timelines)
+                    if delivery:
+                        delivery.end('ok' if all(result['success'] for result in outcomes) else 'error')
+                    
+                    processing_time = (time.time() - start_time) * 1000
+                    for (index, sig, timeline), result in zip(batch, outcomes):
+                        self._record_latency(timeline)
+                        rows.append((sig, processing_time, result, timeline))
+                        status = 'success' if result['success'] else 'error'
+                        self.metrics['signals_processed'].labels(
+                            status='rejected' if result.get('rejected') else status
+                        ).inc()
+                        results[index] = {"index": index, "status": status, "message": result['message']}
+                
+                self.metrics['processing_time'].observe(time.time() - start_time)
+                
+                # One database round trip and one Redis pipeline for the batch
+                db_span = self._start_span('db.write', batch=len(rows)) if self.db_pool and rows else None
+                self._log_signals_to_db(rows)
+                if db_span:
+                    db_span.end()
+                self._cache_signals([row[0] for row in rows])
+                
+                failed = sum(1 for result in results if result['status'] != 'success')
+                return jsonify({
+                    "status": "success" if not failed else "partial" if failed < len(results) else "error",
+                    "received": len(results),
+                    "failed": failed,
+                    "results": results
+                }), 200 if not failed else 207
+            
+            except Exception as e:
+                self.logger.error(f"Batch webhook error: {str(e)}")
+                self.metrics['error_count'].labels(type='webhook').inc()
+                return jsonify({"status": "error", "message": str(e)}), 500
+        
         @self.app.route('/health', methods=['GET'])
         def health():
             health_status = {
@@ -312,6 +555,11 @@ class EnhancedWebhookServer:
                 "system_load": self._get_system_metrics()
             })
 
+        @self.app.route('/latency', methods=['GET'])
+        def latency():
+            recent = request.args.get('recent', 20, type=int)
+            return jsonify(self.latency.summary(recent))
+        
         @self.app.route('/signals', methods=['GET'])
         def get_signals():
             limit = request.args.get('limit', 100, type=int)
@@ -374,7 +622,7 @@ class EnhancedWebhookServer:
         if signal.action not in valid_actions:
             return False
         
-        if not signal.symbol:
+        if not signal.symbol or not isinstance(signal.symbol, str):
             return False
         
         if signal.lot_size <= 0:
@@ -406,81 +654,171 @@ class EnhancedWebhookServer:
         
         return min(base_confidence, 1.0)
 
-    def _process_signal(self, signal: TradingSignal) -> Dict:
+    def _process_signal(self, signal: TradingSignal, timeline: Optional[SignalTimeline] = None) -> Dict:
         """Process trading signal"""
         try:
-            # Determine MT platform port
-            mt_port = (self.config['metatrader']['mt5_port'] 
-                      if signal.mt_platform == 'MT5' 
-                      else self.config['metatrader']['mt4_port'])
+            # Determine MT platform terminal
+            platform = 'MT5' if signal.mt_platform == 'MT5' else 'MT4'
+            transport = self.transports[platform]
             
             # Try socket communication first
-            if self._send_via_socket(signal, mt_port):
-                return {"success": True, "message": "Signal sent via socket"}
+            if self._send_via_socket(signal, platform, timeline):
+                return {"success": True, "message": f"Signal sent via {transport.name}"}
             
             # Fallback to file communication
+            if timeline:
+                timeline.delivered_via = 'file'
             if self._send_via_file(signal):
                 return {"success": True, "message": "Signal sent via file"}
             
             return {"success": False, "message": "Failed to send signal"}
-            
+        
+        except SignalRejected as e:
+            # Refused by the terminal: reported back, never retried via the file
+            return {"success": False, "rejected": True, "message": str(e)}
         except Exception as e:
             self.logger.error(f"Signal processing error: {e}")
             return {"success": False, "message": str(e)}
 
-    def _send_via_socket(self, signal: TradingSignal, port: int) -> bool:
-        """Send signal via socket to MetaTrader"""
+    def _process_batch(self, signals: List[TradingSignal], platform: str,
+                       timelines: List[SignalTimeline]) -> List[Dict]:
+        """Send one terminal's share of a batch as one unit; one result per signal"""
+        transport = self.transports[platform]
+        sent = [False] * len(signals)
+        try:
+            sent = self._send_batch_via_socket(signals, platform, timelines)
+        except Exception as e:
+            self.logger.debug(f"Batch socket communication failed: {e}")
+        
+        results = []
+        for ok in sent:
+            if isinstance(ok, SignalRejected):
+                # Refused by the terminal: reported back, never retried via the file
+                results.append({"success": False, "rejected": True, "message": str(ok)})
+            else:
+                results.append({"success": True, "message": f"Signal sent via {transport.name}"} if ok else None)
+        
+        failed = [index for index, ok in enumerate(sent) if ok is False]
+        if failed:
+            # Fallback to file communication for signals that got no ack, in one write
+            for index in failed:
+                timelines[index].delivered_via = 'file'
+            if self._send_signals_via_file([signals[index] for index in failed]):
+                result = {"success": True, "message": "Signal sent via file"}
+            else:
+                result = {"success": False, "message": "Failed to send signal"}
+            for index in failed:
+                results[index] = result
+        return results
+    
+    def _send_batch_via_socket(self, signals: List[TradingSignal], platform: str,
+                               timelines: List[SignalTimeline]) -> List:
+        """Send signals to the terminal; framed connections take the whole batch in one write.
+        
+        One outcome per signal: True when acked, False when it got no ack, or
+        the SignalRejected for a signal the terminal refused.
+        """
+        if platform in self.mt_connections:
+            results = []
+            batch = self.mt_connections[platform].request_many([asdict(sig) for sig in signals])
+            for sig, pending, timeline in zip(signals, batch, timelines):
+                if pending.error is not None:
+                    self.logger.warning(f"No ack from {platform} for {sig.action} {sig.symbol}: {pending.error}")
+                    results.append(False)
+                    continue
+                
+                timeline.ack(pending.ack)
+                self.metrics['mt_latency'].labels(platform=sig.mt_platform).observe(pending.latency_ms / 1000)
+                if pending.ack.get('status') != 'ok':
+                    self.logger.warning(f"{platform} rejected signal: {pending.ack}")
+                    results.append(SignalRejected(pending.ack))
+                else:
+                    results.append(True)
+            
+            acked = sum(1 for result in results if result is True)
+            self.logger.info(f"Batch of {len(signals)} sent to {platform}, {acked} acked")
+            return results
+        
+        # The line protocol carries one signal per connection
+        results = [False] * len(signals)
+        for index, sig in enumerate(signals):
+            if not self._send_via_socket(sig, platform, timelines[index]):
+                break
+            results[index] = True
+        return results
+    
+    def _send_via_socket(self, signal: TradingSignal, platform: str,
+                         timeline: Optional[SignalTimeline] = None) -> bool:
+        """Send signal to MetaTrader over the terminal's transport"""
         start_time = time.time()
+        transport = self.transports[platform]
         
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self.config['metatrader']['timeout'])
-            sock.connect(('localhost', port))
+            if platform in self.mt_connections:
+                ack, latency_ms = self.mt_connections[platform].request(asdict(signal))
+                if timeline:
+                    timeline.ack(ack)
+                self.metrics['mt_latency'].labels(platform=signal.mt_platform).observe(latency_ms / 1000)
+                
+                if ack.get('status') != 'ok':
+                    self.logger.warning(f"{platform} rejected signal: {ack}")
+                    raise SignalRejected(ack)
+                
+                self.logger.info(f"Signal acked by {platform} in {latency_ms:.2f} ms: {ack}")
+                return True
             
             message = json.dumps(asdict(signal)) + '\n'
-            sock.send(message.encode('utf-8'))
-            
-            response = sock.recv(1024).decode('utf-8')
-            sock.close()
+            response = transport.request(message.encode('utf-8')).decode('utf-8')
+            if timeline:
+                timeline.ack(parse_reply(response))
             
             # Record latency
             latency = time.time() - start_time
             self.metrics['mt_latency'].labels(platform=signal.mt_platform).observe(latency)
             
-            self.logger.info(f"Signal sent via socket to {signal.mt_platform}: {response}")
+            self.logger.info(f"Signal sent via {transport.name} to {signal.mt_platform}: {response}")
             return True
-            
+        
+        except SignalRejected:
+            raise
         except Exception as e:
             self.logger.debug(f"Socket communication failed: {e}")
             return False
 
     def _send_via_file(self, signal: TradingSignal) -> bool:
         """Send signal via file to MetaTrader"""
+        return self._send_signals_via_file([signal])
+    
+    def _send_signals_via_file(self, signals: List[TradingSignal]) -> bool:
+        """Append signals to their platform's signal file, one write per file"""
         try:
-            signal_file = f"/app/data/{signal.mt_platform.lower()}_signals.json"
-            
-            # Read existing signals
-            existing_signals = []
-            try:
-                if os.path.exists(signal_file):
-                    with open(signal_file, 'r') as f:
-                        existing_signals = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                pass
-            
-            # Add new signal
-            existing_signals.append(asdict(signal))
+            by_file = {}
+            for sig in signals:
+                by_file.setdefault(f"/app/data/{sig.mt_platform.lower()}_signals.json", []).append(sig)
             
-            # Keep only last 100 signals
-            if len(existing_signals) > 100:
-                existing_signals = existing_signals[-100:]
-            
-            # Write back to file
-            os.makedirs(os.path.dirname(signal_file), exist_ok=True)
-            with open(signal_file, 'w') as f:
-                json.dump(existing_signals, f, indent=2)
-            
-            self.logger.info(f"Signal saved to file: {signal_file}")
+            for signal_file, new_signals in by_file.items():
+                # Read existing signals
+                existing_signals = []
+                try:
+                    if os.path.exists(signal_file):
+                        with open(signal_file, 'r') as f:
+                            existing_signals = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    pass
+                
+                # Add new signals
+                existing_signals.extend(asdict(sig) for sig in new_signals)
+                
+                # Keep only last 100 signals
+                if len(existing_signals) > 100:
+                    existing_signals = existing_signals[-100:]
+                
+                # Write back to file
+                os.makedirs(os.path.dirname(signal_file), exist_ok=True)
+                with open(signal_file, 'w') as f:
+                    json.dump(existing_signals, f, indent=2)
+                
+                self.logger.info(f"{len(new_signals)} signal(s) saved to file: {signal_file}")
             return True
             
         except Exception as e:
@@ -525,26 +863,50 @@ class EnhancedWebhookServer:
             except Exception as e:
                 self.logger.error(f"Cleanup error: {e}")
 
-    def _log_signal_to_db(self, signal: TradingSignal, processing_time: float, result: Dict):
+    def _record_latency(self, timeline: SignalTimeline):
+        """Add a signal's timeline to /latency and the latency histograms"""
+        for segment, ms in self.latency.record(timeline).items():
+            self.metrics['signal_latency'].labels(
+                segment=segment, source=timeline.source,
+                symbol=timeline.symbol, terminal=timeline.terminal
+            ).observe(ms / 1000)
+    
+    def _log_signal_to_db(self, signal: TradingSignal, processing_time: float, result: Dict,
+                          timeline: Optional[SignalTimeline] = None):
         """Log signal to database"""
-        if not self.db_pool:
+        self._log_signals_to_db([(signal, processing_time, result, timeline)])
+    
+    def _log_signals_to_db(self, rows: List[tuple]):
+        """Insert (signal, processing_time, result, timeline) rows in one statement and commit"""
+        if not self.db_pool or not rows:
             return
         
+        values = []
+        for sig, processing_time, result, timeline in rows:
+            times = timeline.times if timeline else {}
+            stamps = [
+                datetime.fromtimestamp(times[stage]) if times.get(stage) is not None else None
+                for stage in ('source', 'received', 'dispatched', 'acked', 'executed')
+            ]
+            values.append((
+                sig.action, sig.symbol, sig.price, sig.lot_size,
+                sig.stop_loss, sig.take_profit, sig.comment,
+                sig.source, sig.mt_platform, sig.risk_score,
+                sig.confidence, processing_time, json.dumps(result),
+                *stamps, json.dumps(timeline.segments()) if timeline else None
+            ))
+        
         try:
             conn = self.db_pool.getconn()
             with conn.cursor() as cursor:
-                cursor.execute("""
+                execute_values(cursor, """
                     INSERT INTO trading_signals 
                     (action, symbol, price, lot_size, stop_loss, take_profit, 
                      comment, source, mt_platform, risk_score, confidence, 
-                     processing_time_ms, result)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    signal.action, signal.symbol, signal.price, signal.lot_size,
-                    signal.stop_loss, signal.take_profit, signal.comment,
-                    signal.source, signal.mt_platform, signal.risk_score,
-                    signal.confidence, processing_time, json.dumps(result)
-                ))
+                     processing_time_ms, result, source_time, received_at,
+                     dispatched_at, acked_at, executed_at, latency_ms)
+                    VALUES %s
+                """, values)
             conn.commit()
             self.db_pool.putconn(conn)
         except Exception as e:
@@ -552,12 +914,19 @@ class EnhancedWebhookServer:
 
     def _cache_signal(self, signal: TradingSignal):
         """Cache signal in Redis"""
-        if not self.redis_client:
+        self._cache_signals([signal])
+    
+    def _cache_signals(self, signals: List[TradingSignal]):
+        """Cache signals in Redis with one pipelined round trip"""
+        if not self.redis_client or not signals:
             return
         
         try:
-            key = f"signal:{signal.timestamp}"
-            self.redis_client.setex(key, 3600, json.dumps(asdict(signal)))  # 1 hour TTL
+            pipeline = self.redis_client.pipeline()
+            for sig in signals:
+                key = f"signal:{sig.timestamp}"
+                pipeline.setex(key, 3600, json.dumps(asdict(sig)))  # 1 hour TTL
+            pipeline.execute()
         except Exception as e:
             self.logger.error(f"Redis caching error: {e}")
 
@@ -590,14 +959,9 @@ class EnhancedWebhookServer:
         """Check MetaTrader connections"""
         connections = {}
         
-        for platform, port in [('MT4', self.config['metatrader']['mt4_port']), 
-                              ('MT5', self.config['metatrader']['mt5_port'])]:
+        for platform, transport in self.transports.items():
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(5)
-                result = sock.connect_ex(('localhost', port))
-                sock.close()
-                connections[platform] = "connected" if result == 0 else "disconnected"
+                connections[platform] = "connected" if transport.probe() else "disconnected"
             except:
                 connections[platform] = "error"
         
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - MT Transport Benchmark
+Copyright 2024, AI Trading Team
+
+Measures signal round-trip latency for each transport in mt_transport.py
+against a local stand-in receiver that acknowledges every message the way
+the Expert Advisor does. Run on the deployment host to decide which
+transport to configure per terminal:
+
+    python3 benchmark_transports.py --iterations 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from mt_transport import FifoTransport, TcpTransport, UnixSocketTransport
+
+SAMPLE_SIGNAL = {
+    'action': 'BUY',
+    'symbol': 'EURUSD',
+    'lot_size': 0.1,
+    'stop_loss': 1.0850,
+    'take_profit': 1.0950,
+    'source': 'TradingView'
+}
+
+
+class StandInReceiver:
+    """Minimal MetaTrader stand-in: reads one JSON line, replies with an ack line"""
+
+    def __init__(self, kind: str, address):
+        self.kind = kind
+        self.address = address
+        self.is_running = False
+
+    def start(self):
+        self.is_running = True
+        if self.kind == 'fifo':
+            # Open both ends read/write so neither side ever sees EOF
+            self.request_fd = os.open(self.address, os.O_RDWR)
+            self.ack_fd = os.open(f"{self.address}.ack", os.O_RDWR)
+            target = self._serve_fifo
+        else:
+            family = socket.AF_INET if self.kind == 'tcp' else socket.AF_UNIX
+            self.server = socket.socket(family, socket.SOCK_STREAM)
+            if self.kind == 'tcp':
+                self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.bind(self.address)
+            self.server.listen(128)
+            if self.kind == 'tcp':
+                self.address = self.server.getsockname()
+            target = self._serve_socket
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return self
+
+    def _ack(self, line: bytes) -> bytes:
+        signal = json.loads(line)
+        reply = {'status': 'ok', 'symbol': signal.get('symbol')}
+        if 'request_id' in signal:
+            reply['request_id'] = signal['request_id']
+        return (json.dumps(reply) + '\n').encode('utf-8')
+
+    def _serve_socket(self):
+        while self.is_running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            with conn:
+                buffer = b''
+                while b'\n' not in buffer:
+                    chunk = conn.recv(4096)
+                    if not chunk:
+                        break
+                    buffer += chunk
+                if buffer:
+                    conn.sendall(self._ack(buffer.split(b'\n', 1)[0]))
+
+    def _serve_fifo(self):
+        buffer = b''
+        while self.is_running:
+            chunk = os.read(self.request_fd, 4096)
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                os.write(self.ack_fd, self._ack(line))
+
+    def stop(self):
+        self.is_running = False
+        if self.kind == 'fifo':
+            os.close(self.request_fd)
+            os.close(self.ack_fd)
+        else:
+            self.server.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(transport, iterations: int, warmup: int):
+    """Return round-trip latencies in microseconds"""
+    payload = (json.dumps(SAMPLE_SIGNAL) + '\n').encode('utf-8')
+
+    for _ in range(warmup):
+        transport.request(payload)
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        transport.request(payload)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark MT signal transports')
+    parser.add_argument('--iterations', type=int, default=1000, help='Round trips per transport')
+    parser.add_argument('--warmup', type=int, default=100, help='Untimed round trips per transport')
+    parser.add_argument('--transports', default='tcp,unix,fifo', help='Comma-separated transports to run')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mt_transport_bench_')
+    results = {}
+
+    for kind in args.transports.split(','):
+        if kind == 'tcp':
+            receiver = StandInReceiver('tcp', ('127.0.0.1', 0)).start()
+            transport = TcpTransport('127.0.0.1', receiver.address[1])
+        elif kind == 'unix':
+            path = os.path.join(workdir, 'mt.sock')
+            receiver = StandInReceiver('unix', path).start()
+            transport = UnixSocketTransport(path)
+        elif kind == 'fifo':
+            path = os.path.join(workdir, 'mt.fifo')
+            os.mkfifo(path)
+            os.mkfifo(f"{path}.ack")
+            receiver = StandInReceiver('fifo', path).start()
+            transport = FifoTransport(path)
+        else:
+            parser.error(f"Unknown transport: {kind}")
+
+        try:
+            results[kind] = run_benchmark(transport, args.iterations, args.warmup)
+        finally:
+            receiver.stop()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'transport':<10}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (microseconds)")
+    for kind, samples in results.items():
+        print(
+            f"{kind:<10}"
+            f"{statistics.mean(samples):>10.1f}"
+            f"{percentile(samples, 50):>10.1f}"
+            f"{percentile(samples, 95):>10.1f}"
+            f"{percentile(samples, 99):>10.1f}"
+            f"{max(samples):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
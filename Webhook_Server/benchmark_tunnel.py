@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+DodoHook - Tunnel Overhead Benchmark
+Copyright 2024, Camlo Technologies
+
+Measures what the DodoHook TunnelServer adds on top of hitting the webhook
+server directly. A stub upstream with a fixed response latency and body
+size runs in its own process. For every configuration (TLS on/off,
+streaming on/off, concurrency level) a fresh tunnel process is started in
+front of it, and the same closed-loop load is driven against the stub
+directly and through the tunnel:
+
+    python3 benchmark_tunnel.py
+    python3 benchmark_tunnel.py --concurrency 1,16,64 --requests 5000 --body-size 65536
+    python3 benchmark_tunnel.py --json > tunnel_baseline.json
+    python3 benchmark_tunnel.py --baseline tunnel_baseline.json --tolerance 25
+
+Added latency is each tunnel percentile minus the same percentile of the
+direct run taken right before it. Every configuration runs --repeats
+times and the median is reported, so the numbers are steady enough to
+gate on: with --baseline the exit status is 1 when added p50/p95 latency
+or requests/sec regressed by more than --tolerance percent. p99 is
+reported but not gated; a few thousand requests are too few to pin it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import yaml
+from aiohttp import web
+
+TUNNEL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_tunnel_server.py')
+
+SAMPLE_ALERT = {
+    'action': 'BUY',
+    'symbol': 'EURUSD',
+    'lot_size': 0.1,
+    'stop_loss': 1.0850,
+    'take_profit': 1.0950,
+    'source': 'TradingView'
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_stub_upstream(port: int, latency_ms: float, body_size: int):
+    """Stand-in webhook server: reads the request, waits, returns `body_size` bytes"""
+    body = b'x' * body_size
+    delay = latency_ms / 1000
+
+    async def handle(request):
+        await request.read()
+        if delay:
+            await asyncio.sleep(delay)
+        return web.Response(body=body, content_type='application/octet-stream')
+
+    app = web.Application(client_max_size=0)
+    app.router.add_route('*', '/{path:.*}', handle)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with status {process.returncode} before listening")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def read_rss_kb(pid: int):
+    """(current, peak) resident set size of `pid` in KiB, or (None, None) without /proc"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['VmHWM'].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def make_certificate(workdir: str):
+    """Self-signed localhost certificate, or None when openssl is unavailable"""
+    if not shutil.which('openssl'):
+        return None
+    cert = os.path.join(workdir, 'bench.crt')
+    key = os.path.join(workdir, 'bench.key')
+    result = subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-keyout', key, '-out', cert],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return (cert, key) if result.returncode == 0 else None
+
+
+class TunnelProcess:
+    """A TunnelServer in its own process, configured for one benchmark run"""
+
+    def __init__(self, workdir: str, upstream_port: int, tls, streaming: bool, concurrency: int):
+        self.port = free_port()
+        self.workdir = os.path.join(workdir, f"tunnel-{self.port}")
+        os.makedirs(self.workdir)
+
+        config = {
+            'server': {
+                'host': '127.0.0.1',
+                'port': self.port,
+                'domain': 'localhost',
+                'ssl_cert': tls[0] if tls else '',
+                'ssl_key': tls[1] if tls else '',
+                'workers': 1
+            },
+            'tunnel': {
+                'local_host': '127.0.0.1',
+                'local_port': upstream_port,
+                'streaming': streaming,
+                'max_connections': max(100, concurrency),
+                'queue_size': concurrency,
+                'timeout': 30
+            },
+            'security': {'allowed_ips': [], 'rate_limit': 10 ** 9, 'require_auth': False},
+            'logging': {'level': 'WARNING', 'file': os.path.join(self.workdir, 'tunnel_server.log')}
+        }
+        # TunnelConfig reads tunnel_config.yaml from the working directory
+        with open(os.path.join(self.workdir, 'tunnel_config.yaml'), 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, TUNNEL_SCRIPT], cwd=self.workdir,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port, self.process)
+        return self
+
+    def __exit__(self, *exc):
+        stop_process(self.process)
+
+
+async def drive(url: str, payload: bytes, concurrency: int, requests: int, warmup: int,
+                ssl_context=None) -> dict:
+    """Closed-loop load: `concurrency` clients each send requests back to back"""
+    connector = aiohttp.TCPConnector(limit=concurrency, ssl=ssl_context)
+    timeout = aiohttp.ClientTimeout(total=30)
+    headers = {'Content-Type': 'application/json'}
+    latencies = []
+    errors = 0
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+        async def client(count: int, record: bool):
+            nonlocal errors
+            for _ in range(count):
+                start = time.perf_counter()
+                try:
+                    async with session.post(url, data=payload, headers=headers) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if not record:
+                    continue
+                if ok:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        def split(total: int):
+            return [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+        # Warm up connections (and TLS sessions) outside the measurement
+        await asyncio.gather(*(client(count, False) for count in split(warmup)))
+        started = time.perf_counter()
+        await asyncio.gather(*(client(count, True) for count in split(requests)))
+        elapsed = time.perf_counter() - started
+
+    result = {'rps': requests / elapsed, 'errors': errors}
+    if latencies:
+        for pct in PERCENTILES:
+            result[f"p{pct}"] = percentile(latencies, pct)
+    return result
+
+
+def run_configuration(args, workdir: str, upstream_port: int, payload: bytes,
+                      tls, streaming: bool, concurrency: int) -> dict:
+    client_ssl = None
+    if tls:
+        client_ssl = ssl.create_default_context()
+        client_ssl.check_hostname = False
+        client_ssl.verify_mode = ssl.CERT_NONE
+
+    direct_url = f"http://127.0.0.1:{upstream_port}/webhook"
+    runs = []
+    with TunnelProcess(workdir, upstream_port, tls, streaming, concurrency) as tunnel:
+        tunnel_url = f"{'https' if tls else 'http'}://127.0.0.1:{tunnel.port}/webhook"
+        for _ in range(args.repeats):
+            # Direct and tunnelled runs back to back, so drift hits both alike
+            direct = asyncio.run(drive(direct_url, payload, concurrency, args.requests, args.warmup))
+            tunnelled = asyncio.run(drive(tunnel_url, payload, concurrency, args.requests,
+                                          args.warmup, client_ssl))
+            runs.append((direct, tunnelled))
+        rss_kb, peak_rss_kb = read_rss_kb(tunnel.process.pid)
+
+    result = {
+        'tls': bool(tls),
+        'streaming': streaming,
+        'concurrency': concurrency,
+        'rps': round(statistics.median(t['rps'] for _, t in runs), 1),
+        'direct_rps': round(statistics.median(d['rps'] for d, _ in runs), 1),
+        'errors': sum(t['errors'] + d['errors'] for d, t in runs),
+        'rss_kb': rss_kb,
+        'peak_rss_kb': peak_rss_kb
+    }
+    complete = [(d, t) for d, t in runs if 'p50' in d and 'p50' in t]
+    for pct in PERCENTILES:
+        key = f"p{pct}"
+        if complete:
+            result[f"direct_{key}_ms"] = round(statistics.median(d[key] for d, _ in complete), 3)
+            result[f"added_{key}_ms"] = round(statistics.median(t[key] - d[key] for d, t in complete), 3)
+    return result
+
+
+def configuration_name(result: dict) -> str:
+    return (f"tls={'on' if result['tls'] else 'off'} "
+            f"streaming={'on' if result['streaming'] else 'off'} "
+            f"c={result['concurrency']}")
+
+
+def compare(results, baseline, tolerance: float, min_delta_ms: float):
+    """Regressions of `results` against a previous --json output"""
+    previous = {configuration_name(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        name = configuration_name(result)
+        base = previous.get(name)
+        if base is None:
+            continue
+        for key in ('added_p50_ms', 'added_p95_ms'):
+            if key not in result or key not in base:
+                continue
+            # Sub-millisecond jitter is not a regression, whatever the ratio
+            limit = max(base[key] * (1 + tolerance / 100), base[key] + min_delta_ms)
+            if result[key] > limit:
+                regressions.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result['rps'] < base['rps'] * (1 - tolerance / 100):
+            regressions.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+    return regressions
+
+
+def parse_switch(value: str):
+    return {'off': [False], 'on': [True], 'both': [False, True]}[value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DodoHook tunnel overhead')
+    parser.add_argument('--concurrency', default='1,16,64', help='Comma-separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=2000, help='Timed requests per run')
+    parser.add_argument('--warmup', type=int, default=200, help='Untimed requests per run')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per configuration (median is reported)')
+    parser.add_argument('--tls', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--streaming', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--latency', type=float, default=0, help='Stub upstream latency in milliseconds')
+    parser.add_argument('--body-size', type=int, default=256, help='Stub upstream response size in bytes')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--baseline', help='Previous --json output to compare against')
+    parser.add_argument('--tolerance', type=float, default=20, help='Allowed regression in percent')
+    parser.add_argument('--min-delta', type=float, default=0.2,
+                        help='Added-latency increases below this many ms never count as regressions')
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    settings = {
+        'requests': args.requests,
+        'repeats': args.repeats,
+        'latency_ms': args.latency,
+        'body_size': args.body_size
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != settings:
+            parser.error(f"{args.baseline} was recorded with different settings: {baseline['settings']}")
+    payload = json.dumps(SAMPLE_ALERT).encode('utf-8')
+    workdir = tempfile.mkdtemp(prefix='dodohook_bench_')
+
+    upstream_port = free_port()
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--stub-upstream', str(upstream_port),
+         '--latency', str(args.latency), '--body-size', str(args.body_size)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    results = []
+
+    try:
+        wait_for_port(upstream_port, upstream)
+        certificate = None
+        if True in parse_switch(args.tls):
+            certificate = make_certificate(workdir)
+            if certificate is None:
+                print("openssl not found, skipping TLS configurations", file=sys.stderr)
+
+        for tls in parse_switch(args.tls):
+            if tls and certificate is None:
+                continue
+            for streaming in parse_switch(args.streaming):
+                for concurrency in concurrency_levels:
+                    result = run_configuration(args, workdir, upstream_port, payload,
+                                               certificate if tls else None, streaming, concurrency)
+                    results.append(result)
+                    if not args.json:
+                        print(f"  finished {configuration_name(result)}", file=sys.stderr)
+    finally:
+        stop_process(upstream)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'settings': settings, 'results': results}, indent=2))
+    else:
+        print(f"{'configuration':<30}{'added p50':>10}{'p95':>9}{'p99':>9}   (ms)"
+              f"{'rps':>10}{'direct rps':>12}{'rss MiB':>9}{'errors':>8}")
+        for result in results:
+            rss = f"{result['peak_rss_kb'] / 1024:.1f}" if result['peak_rss_kb'] else '-'
+            print(
+                f"{configuration_name(result):<30}"
+                f"{result.get('added_p50_ms', float('nan')):>10.3f}"
+                f"{result.get('added_p95_ms', float('nan')):>9.3f}"
+                f"{result.get('added_p99_ms', float('nan')):>9.3f}     "
+                f"{result['rps']:>10.1f}"
+                f"{result['direct_rps']:>12.1f}"
+                f"{rss:>9}"
+                f"{result['errors']:>8}"
+            )
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Internal: the stub upstream runs in its own process
+    if len(sys.argv) > 2 and sys.argv[1] == '--stub-upstream':
+        stub = argparse.ArgumentParser()
+        stub.add_argument('--stub-upstream', type=int)
+        stub.add_argument('--latency', type=float, default=0)
+        stub.add_argument('--body-size', type=int, default=256)
+        stub_args = stub.parse_args()
+        run_stub_upstream(stub_args.stub_upstream, stub_args.latency, stub_args.body_size)
+    else:
+        main()
@@ -9,21 +9,1666 @@ Part of the AI Trading Expert ecosystem.
 """
 
 import asyncio
+import bisect
+import heapq
+import ipaddress
 import json
 import logging
+import math
+import os
+import random
+import re
+import signal
 import socket
 import ssl
+import tempfile
 import threading
 import time
 import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import aiohttp
 from aiohttp import web, ClientSession
+from multidict import CIMultiDict
 import yaml
 
+from traffic_capture import CaptureWriter
+from tracing import TRACEPARENT, Tracer
+from tunnel_mux import Multiplexer, StreamReset
+from tunnel_relay import TcpRelay, merge_relay_stats
+
+
+# Hop-by-hop headers (RFC 7230) that apply to a single connection only
+HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+
+DEFAULT_MAX_BODY_SIZE = '10MB'
+STREAM_CHUNK_SIZE = 64 * 1024
+CONTROL_LINE_LIMIT = 16 * 1024 * 1024  # Largest worker <-> hub message
+MAX_STATS_TOP = 100  # Most rate-limit offenders /stats?top= may list
+
+# Upstream responses that count as a failed request for outlier ejection
+UPSTREAM_FAILURE_STATUSES = {502, 503, 504}
+
+# Client handshake headers that ws_connect regenerates for the upstream leg
+WEBSOCKET_HANDSHAKE_HEADERS = {
+    'sec-websocket-key', 'sec-websocket-version', 'sec-websocket-extensions',
+    'sec-websocket-protocol', 'content-length', 'host'
+}
+
+
+class ClientBodyError(Exception):
+    """Raised when the client's request body cannot be read; not the upstream's fault"""
+
+
+class RequestBodyTooLarge(ClientBodyError):
+    """Raised while streaming a request body past the configured limit"""
+
+
+def parse_size(value) -> int:
+    """Parse a size such as 10MB, 512KB or 1048576 into bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    
+    text = str(value).strip().upper()
+    for suffix, multiplier in (('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024), ('B', 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * multiplier)
+    return int(text)
+
+
+def is_websocket_upgrade(request: web.Request) -> bool:
+    connection = {token.strip().lower() for token in request.headers.get('Connection', '').split(',')}
+    return 'upgrade' in connection and request.headers.get('Upgrade', '').lower() == 'websocket'
+
+
+def filter_hop_headers(headers) -> CIMultiDict:
+    """Copy headers without hop-by-hop entries (case-insensitive)"""
+    return CIMultiDict(
+        (key, value) for key, value in headers.items()
+        if key.lower() not in HOP_HEADERS
+    )
+
+
+IPV4_MAPPED_PREFIX = bytes(10) + b'\xff\xff'
+
+
+def parse_ip(address: str):
+    """(version, integer value) of an IP address string, or None if it isn't one"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+    except (OSError, ValueError):
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, address.split('%', 1)[0])
+    except (OSError, ValueError):
+        return None
+    # ::ffff:a.b.c.d is how a dual-stack socket reports IPv4 clients
+    if packed[:12] == IPV4_MAPPED_PREFIX:
+        return 4, int.from_bytes(packed[12:], 'big')
+    return 6, int.from_bytes(packed, 'big')
+
+
+class IPRangeTable:
+    """Set of IP addresses and CIDR ranges, compiled for fast lookups
+    
+    Entries ("52.89.214.238", "52.89.214.0/24", "2001:db8::/32") are turned
+    into sorted, merged [start, end] intervals per IP version when the table
+    is built, so a lookup is a single bisect over the interval starts.
+    """
+    
+    def __init__(self, entries=()):
+        self.entries = [str(entry).strip() for entry in entries]
+        spans = {4: [], 6: []}
+        for entry in self.entries:
+            network = ipaddress.ip_network(entry, strict=False)
+            spans[network.version].append((int(network.network_address), int(network.broadcast_address)))
+        
+        self.starts = {}
+        self.ends = {}
+        for version, ranges in spans.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [start for start, _ in merged]
+            self.ends[version] = [end for _, end in merged]
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def __contains__(self, address: str) -> bool:
+        """Whether `address` is covered; anything unparsable is not"""
+        parsed = parse_ip(address)
+        if parsed is None:
+            return False
+        version, value = parsed
+        index = bisect.bisect_right(self.starts[version], value) - 1
+        return index >= 0 and value <= self.ends[version][index]
+
+
+class ClientWindow:
+    """Sliding-window counter state for one client"""
+    
+    __slots__ = ('window_start', 'previous', 'current', 'rejected', 'window_rejected', 'last_seen')
+    
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.previous = 0
+        self.current = 0
+        self.rejected = 0
+        self.window_rejected = 0
+        self.last_seen = window_start
+
+
+class SlidingWindowRateLimiter:
+    """O(1) per-request rate limiter using the sliding-window-counter method.
+    
+    Each client keeps only the counts of the current and previous fixed
+    windows; the request rate is estimated by weighting the previous count
+    by how much of it still overlaps the sliding window. Clients are kept
+    in LRU order, so idle ones are evicted from the front and the table
+    never grows beyond max_clients.
+    """
+    
+    def __init__(self, limit: int, window: float = 3600, max_clients: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.max_clients = max_clients
+        self.clients: 'OrderedDict[str, ClientWindow]' = OrderedDict()
+        self.evicted = 0
+    
+    def _roll(self, client: ClientWindow, now: float):
+        elapsed_windows = int((now - client.window_start) // self.window)
+        if elapsed_windows >= 1:
+            client.previous = client.current if elapsed_windows == 1 else 0
+            client.current = 0
+            client.window_rejected = 0
+            client.window_start += elapsed_windows * self.window
+    
+    def _estimate(self, client: ClientWindow, now: float) -> float:
+        overlap = 1 - (now - client.window_start) / self.window
+        return client.previous * overlap + client.current
+    
+    def _touch(self, key: str, now: float) -> ClientWindow:
+        """Return the up-to-date window for a client, creating it if needed"""
+        client = self.clients.get(key)
+        
+        if client is None:
+            client = self.clients[key] = ClientWindow(now)
+            if len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.clients.move_to_end(key)
+            self._roll(client, now)
+        
+        client.last_seen = now
+        return client
+    
+    def allow(self, key: str, now: float = None) -> bool:
+        """Count a request and return whether it is within the limit"""
+        now = time.time() if now is None else now
+        client = self._touch(key, now)
+        
+        if self._estimate(client, now) >= self.limit:
+            client.rejected += 1
+            client.window_rejected += 1
+            return False
+        
+        client.current += 1
+        return True
+    
+    def record(self, key: str, allowed: int, rejected: int = 0, now: float = None):
+        """Add counts decided elsewhere (another worker) without a limit check"""
+        now = time.time() if now is None else now
+        client = self._touch(key, now)
+        client.current += allowed
+        client.rejected += rejected
+        client.window_rejected += rejected
+    
+    def is_limited(self, key: str, now: float = None) -> bool:
+        """Whether the next request from this client would be rejected"""
+        now = time.time() if now is None else now
+        client = self.clients.get(key)
+        if client is None:
+            return False
+        self._roll(client, now)
+        return self._estimate(client, now) >= self.limit
+    
+    def is_first_rejection(self, key: str) -> bool:
+        """True on a client's first rejection in the current window (for logging)"""
+        client = self.clients.get(key)
+        return client is not None and client.window_rejected == 1
+    
+    def evict_idle(self, now: float = None) -> int:
+        """Drop clients idle for two full windows; their counters are zero by then"""
+        now = time.time() if now is None else now
+        evicted = 0
+        while self.clients:
+            key, client = next(iter(self.clients.items()))
+            if now - client.last_seen < 2 * self.window:
+                break
+            self.clients.popitem(last=False)
+            evicted += 1
+        self.evicted += evicted
+        return evicted
+    
+    def top_offenders(self, k: int = 10, now: float = None) -> List[dict]:
+        """The k clients with the most rejected requests"""
+        now = time.time() if now is None else now
+        offenders = heapq.nlargest(
+            k,
+            ((key, client) for key, client in self.clients.items() if client.rejected),
+            key=lambda item: item[1].rejected
+        )
+        result = []
+        for key, client in offenders:
+            self._roll(client, now)
+            result.append({
+                'ip': key,
+                'rejected': client.rejected,
+                'current_rate': round(self._estimate(client, now), 1)
+            })
+        return result
+    
+    def stats(self, k: int = 10) -> dict:
+        return {
+            'limit': self.limit,
+            'window_seconds': self.window,
+            'tracked_clients': len(self.clients),
+            'max_clients': self.max_clients,
+            'evicted_clients': self.evicted,
+            'top_offenders': self.top_offenders(k)
+        }
+
+
+class UpstreamHealthMonitor:
+    """Probes upstreams in the background and caches their health.
+    
+    Probes are async TCP connects, so neither the probes nor /health ever
+    block the event loop. An upstream is marked unhealthy after
+    `unhealthy_threshold` consecutive failed probes and healthy again after
+    `healthy_threshold` consecutive successes.
+    """
+    
+    def __init__(self, interval: float = 5, timeout: float = 2,
+                 unhealthy_threshold: int = 2, healthy_threshold: int = 1,
+                 logger: logging.Logger = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+        self.logger = logger or logging.getLogger(__name__)
+        self.upstreams: Dict[str, dict] = {}
+    
+    def add(self, upstream: str):
+        """Track an upstream given as host:port"""
+        if upstream not in self.upstreams:
+            self.upstreams[upstream] = {
+                'healthy': True,  # Optimistic until the first probe says otherwise
+                'checked_at': None,
+                'last_change': None,
+                'latency_ms': None,
+                'error': None,
+                'consecutive_failures': 0,
+                'consecutive_successes': 0
+            }
+    
+    def is_healthy(self, upstream: str) -> bool:
+        state = self.upstreams.get(upstream)
+        return state is None or state['healthy']
+    
+    async def probe(self, upstream: str):
+        """Run one connect probe and update the cached state"""
+        host, port = upstream.rsplit(':', 1)
+        state = self.upstreams[upstream]
+        first_probe = state['checked_at'] is None
+        start = time.perf_counter()
+        
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, int(port)), timeout=self.timeout
+            )
+            writer.close()
+            state['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            state['error'] = None
+            state['consecutive_failures'] = 0
+            state['consecutive_successes'] += 1
+            if not state['healthy'] and (first_probe or state['consecutive_successes'] >= self.healthy_threshold):
+                self._set_healthy(upstream, state, True)
+        except (OSError, asyncio.TimeoutError) as e:
+            state['latency_ms'] = None
+            state['error'] = str(e) or type(e).__name__
+            state['consecutive_successes'] = 0
+            state['consecutive_failures'] += 1
+            # The very first probe sets the state directly, without thresholds
+            if state['healthy'] and (first_probe or state['consecutive_failures'] >= self.unhealthy_threshold):
+                self._set_healthy(upstream, state, False)
+        
+        state['checked_at'] = time.time()
+    
+    def _set_healthy(self, upstream: str, state: dict, healthy: bool):
+        state['healthy'] = healthy
+        state['last_change'] = time.time()
+        if healthy:
+            self.logger.info(f"Upstream {upstream} is healthy again")
+        else:
+            self.logger.warning(f"Upstream {upstream} marked unhealthy: {state['error']}")
+    
+    async def check_all(self):
+        await asyncio.gather(*(self.probe(upstream) for upstream in list(self.upstreams)))
+    
+    async def run(self):
+        """Probe every upstream on the configured interval"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check_all()
+    
+    def snapshot(self) -> Dict[str, dict]:
+        now = time.time()
+        return {
+            upstream: dict(
+                state,
+                age_seconds=round(now - state['checked_at'], 3) if state['checked_at'] else None
+            )
+            for upstream, state in self.upstreams.items()
+        }
+
+
+# Log-spaced latency buckets: 10 µs to ~100 s, each ~19% wider than the last
+LATENCY_BUCKETS_MS = [0.01 * 2 ** (i / 4) for i in range(93)]
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram; percentiles are accurate to one bucket (~19%)"""
+    
+    __slots__ = ('counts', 'count', 'sum_ms')
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # Last slot: overflow
+        self.count = 0
+        self.sum_ms = 0.0
+    
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        """Estimate a percentile by interpolating inside its bucket"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if index >= len(LATENCY_BUCKETS_MS):
+                    return LATENCY_BUCKETS_MS[-1]
+                upper = LATENCY_BUCKETS_MS[index]
+                lower = LATENCY_BUCKETS_MS[index - 1] if index else 0.0
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return LATENCY_BUCKETS_MS[-1]
+    
+    def summary(self) -> dict:
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+        return {
+            'count': self.count,
+            'mean_ms': rounded(self.sum_ms / self.count if self.count else None),
+            'p50_ms': rounded(self.percentile(50)),
+            'p95_ms': rounded(self.percentile(95)),
+            'p99_ms': rounded(self.percentile(99))
+        }
+    
+    def prometheus_lines(self, name: str, labels: str = '') -> List[str]:
+        """Bucket, sum and count samples in seconds for a Prometheus histogram"""
+        bucket_labels = f"{labels}," if labels else ''
+        series_labels = f"{{{labels}}}" if labels else ''
+        lines = []
+        
+        # Every 4th bucket (powers of two) keeps the exposition compact;
+        # cumulative counts at those bounds are still exact
+        cumulative = 0
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            cumulative += self.counts[index]
+            if index % 4 == 0:
+                lines.append(f'{name}_bucket{{{bucket_labels}le="{bound / 1000:.6g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{series_labels} {self.sum_ms / 1000:.6f}')
+        lines.append(f'{name}_count{series_labels} {self.count}')
+        return lines
+    
+    def to_dict(self) -> dict:
+        """Sparse form for the worker stats hub"""
+        return {
+            'buckets': {str(index): count for index, count in enumerate(self.counts) if count},
+            'count': self.count,
+            'sum_ms': self.sum_ms
+        }
+    
+    def merge(self, data: dict):
+        for index, count in data.get('buckets', {}).items():
+            self.counts[int(index)] += count
+        self.count += data.get('count', 0)
+        self.sum_ms += data.get('sum_ms', 0.0)
+
+
+class RouteMetrics:
+    """Counters and latency histograms for one route"""
+    
+    COUNTERS = ('requests', 'success', 'client_errors', 'server_errors')
+    
+    def __init__(self):
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.overhead = LatencyHistogram()  # Time spent in the tunnel itself
+        self.upstream = LatencyHistogram()  # Time waiting on the upstream
+
+
+class TunnelMetrics:
+    """Per-route request metrics, exportable as JSON summaries or Prometheus text"""
+    
+    def __init__(self):
+        self.routes: Dict[str, RouteMetrics] = {}
+    
+    def observe(self, route: str, status: int, total_ms: float, upstream_ms: Optional[float]):
+        metrics = self.routes.get(route)
+        if metrics is None:
+            metrics = self.routes[route] = RouteMetrics()
+        
+        metrics.counters['requests'] += 1
+        if status >= 500:
+            metrics.counters['server_errors'] += 1
+        elif status >= 400:
+            metrics.counters['client_errors'] += 1
+        else:
+            metrics.counters['success'] += 1
+        
+        if upstream_ms is not None:
+            metrics.upstream.observe(upstream_ms)
+            metrics.overhead.observe(max(0.0, total_ms - upstream_ms))
+        else:
+            # Answered by the tunnel itself (auth, rate limit, no upstream)
+            metrics.overhead.observe(total_ms)
+    
+    def to_dict(self) -> dict:
+        return {
+            route: {
+                'counters': dict(metrics.counters),
+                'overhead': metrics.overhead.to_dict(),
+                'upstream': metrics.upstream.to_dict()
+            }
+            for route, metrics in self.routes.items()
+        }
+    
+    @classmethod
+    def merged(cls, exports: List[dict]) -> 'TunnelMetrics':
+        """Combine to_dict() exports from several workers"""
+        combined = cls()
+        for export in exports:
+            for route, data in export.items():
+                metrics = combined.routes.get(route)
+                if metrics is None:
+                    metrics = combined.routes[route] = RouteMetrics()
+                for key, value in data['counters'].items():
+                    metrics.counters[key] = metrics.counters.get(key, 0) + value
+                metrics.overhead.merge(data['overhead'])
+                metrics.upstream.merge(data['upstream'])
+        return combined
+    
+    def summary(self) -> dict:
+        return {
+            route: dict(
+                metrics.counters,
+                tunnel_overhead=metrics.overhead.summary(),
+                upstream=metrics.upstream.summary()
+            )
+            for route, metrics in sorted(self.routes.items())
+        }
+    
+    def prometheus(self, prefix: str = 'dodohook') -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines = [
+            f"# HELP {prefix}_requests_total Webhook requests by route and outcome",
+            f"# TYPE {prefix}_requests_total counter"
+        ]
+        for route, metrics in sorted(self.routes.items()):
+            for outcome in ('success', 'client_errors', 'server_errors'):
+                lines.append(
+                    f'{prefix}_requests_total{{route="{route}",outcome="{outcome}"}} {metrics.counters[outcome]}'
+                )
+        
+        for name, attribute, help_text in (
+            ('tunnel_overhead_seconds', 'overhead', 'Time spent in the tunnel excluding the upstream'),
+            ('upstream_seconds', 'upstream', 'Time waiting on the upstream webhook server')
+        ):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for route, metrics in sorted(self.routes.items()):
+                lines.extend(getattr(metrics, attribute).prometheus_lines(f"{prefix}_{name}", f'route="{route}"'))
+        
+        return '\n'.join(lines) + '\n'
+
+
+class PayloadSchema:
+    """Required fields and per-field rules for one route's JSON payloads.
+    
+    Compiled once from a `payload_schemas` entry into a flat list of
+    checks; `check` stops at the first failing one, so a payload costs one
+    json.loads plus a few dict lookups and comparisons. Rejections are
+    counted by reason ("missing:symbol", "enum:action", "invalid_json").
+    """
+    
+    TYPES = {
+        'string': lambda value: isinstance(value, str),
+        'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+        'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+        'boolean': lambda value: isinstance(value, bool),
+        'object': lambda value: isinstance(value, dict),
+        'array': lambda value: isinstance(value, list)
+    }
+    
+    def __init__(self, prefix: str, spec: dict):
+        self.prefix = prefix
+        self.max_size = parse_size(spec['max_size']) if spec.get('max_size') else None
+        self.checks = []  # (reason, message, test(payload) -> bool)
+        
+        for name in spec.get('required') or []:
+            self.checks.append((
+                f"missing:{name}", f"Missing required field: {name}",
+                lambda payload, name=name: name in payload
+            ))
+        for name, rules in (spec.get('fields') or {}).items():
+            self.checks.extend(self.compile_field(name, rules or {}))
+        
+        self.checked = 0
+        self.rejected: Dict[str, int] = {}
+    
+    def compile_field(self, name: str, rules: dict) -> list:
+        """Checks for one field; each passes when the field is absent"""
+        unknown = set(rules) - {'type', 'enum', 'pattern', 'min', 'max', 'min_length', 'max_length'}
+        if unknown:
+            raise ValueError(f"Payload schema {self.prefix}: unknown rule(s) for {name}: {sorted(unknown)}")
+        
+        checks = []
+        
+        def add(rule: str, message: str, test):
+            checks.append((
+                f"{rule}:{name}", f"Invalid field {name}: {message}",
+                lambda payload: name not in payload or test(payload[name])
+            ))
+        
+        if 'type' in rules:
+            if rules['type'] not in self.TYPES:
+                raise ValueError(f"Payload schema {self.prefix}: unknown type {rules['type']!r} for {name}")
+            add('type', f"expected {rules['type']}", self.TYPES[rules['type']])
+        if 'enum' in rules:
+            allowed = frozenset(rules['enum'])
+            add('enum', f"expected one of {sorted(map(str, allowed))}", lambda value: value in allowed)
+        if 'pattern' in rules:
+            pattern = re.compile(rules['pattern'])
+            add('pattern', f"does not match {rules['pattern']}",
+                lambda value: isinstance(value, str) and pattern.fullmatch(value) is not None)
+        if 'min' in rules:
+            add('min', f"below {rules['min']}", lambda value, low=rules['min']: value >= low)
+        if 'max' in rules:
+            add('max', f"above {rules['max']}", lambda value, high=rules['max']: value <= high)
+        if 'min_length' in rules:
+            add('length', f"shorter than {rules['min_length']}",
+                lambda value, low=rules['min_length']: len(value) >= low)
+        if 'max_length' in rules:
+            add('length', f"longer than {rules['max_length']}",
+                lambda value, high=rules['max_length']: len(value) <= high)
+        return checks
+    
+    def check(self, body: bytes) -> Optional[Tuple[str, str]]:
+        """(reason, message) of the first failed check, or None when valid"""
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 'invalid_json', 'Body is not valid JSON'
+        if not isinstance(payload, dict):
+            return 'not_object', 'Body must be a JSON object'
+        
+        for reason, message, test in self.checks:
+            try:
+                if not test(payload):
+                    return reason, message
+            except TypeError:
+                # Unorderable or unhashable values fail min/max/enum/length
+                return reason, message
+        return None
+    
+    def record(self, reason: Optional[str]):
+        self.checked += 1
+        if reason:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+    
+    def stats(self) -> dict:
+        return {'checked': self.checked, 'rejected': sum(self.rejected.values()), 'reasons': dict(self.rejected)}
+    
+    @staticmethod
+    def merge_stats(snapshots: List[Dict[str, dict]]) -> Dict[str, dict]:
+        """Combine stats() by route prefix from several workers"""
+        merged = {}
+        for snapshot in snapshots:
+            for prefix, stats in snapshot.items():
+                total = merged.setdefault(prefix, {'checked': 0, 'rejected': 0, 'reasons': {}})
+                total['checked'] += stats['checked']
+                total['rejected'] += stats['rejected']
+                for reason, count in stats['reasons'].items():
+                    total['reasons'][reason] = total['reasons'].get(reason, 0) + count
+        return merged
+    
+    @staticmethod
+    def prometheus(stats: Dict[str, dict], prefix: str = 'dodohook') -> str:
+        if not stats:
+            return ''
+        lines = [
+            f"# HELP {prefix}_payload_checks_total Payloads validated in the tunnel, by schema route",
+            f"# TYPE {prefix}_payload_checks_total counter"
+        ]
+        for route, route_stats in sorted(stats.items()):
+            lines.append(f'{prefix}_payload_checks_total{{route="{route}"}} {route_stats["checked"]}')
+        lines.append(f"# HELP {prefix}_payload_rejections_total Payloads rejected in the tunnel, by route and reason")
+        lines.append(f"# TYPE {prefix}_payload_rejections_total counter")
+        for route, route_stats in sorted(stats.items()):
+            for reason, count in sorted(route_stats['reasons'].items()):
+                rule, _, field = reason.partition(':')
+                lines.append(
+                    f'{prefix}_payload_rejections_total{{route="{route}",reason="{rule}",field="{field}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+class AdmissionController:
+    """Caps concurrent forwarded requests, with a short bounded FIFO wait queue.
+    
+    Up to `limit` requests are forwarded at once. Up to `queue_size` more
+    wait, each for at most `queue_timeout` seconds or until its own
+    deadline. Anything beyond that is shed at once, so a stalled upstream
+    costs callers a fast 503 instead of a slow timeout for everyone.
+    """
+    
+    COUNTERS = ('admitted', 'queued', 'shed_queue_full', 'shed_timeout')
+    
+    def __init__(self, limit: int, queue_size: int = 50, queue_timeout: float = 2.0):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters = deque()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.queue_wait = LatencyHistogram()
+    
+    async def acquire(self, deadline: float) -> bool:
+        """Wait for a slot until the queue timeout or `deadline` (loop time)"""
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            self.counters['admitted'] += 1
+            self.queue_wait.observe(0.0)
+            return True
+        
+        loop = asyncio.get_running_loop()
+        timeout = min(self.queue_timeout, deadline - loop.time())
+        if len(self.waiters) >= self.queue_size or timeout <= 0:
+            self.counters['shed_queue_full'] += 1
+            return False
+        
+        waiter = loop.create_future()
+        self.waiters.append(waiter)
+        self.counters['queued'] += 1
+        started = loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self.waiters.remove(waiter)
+                self.counters['shed_timeout'] += 1
+                self.queue_wait.observe((loop.time() - started) * 1000)
+                return False
+            # Granted just as the timer fired; keep the slot
+        except asyncio.CancelledError:
+            # The client went away while queued
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            raise
+        
+        self.counters['admitted'] += 1
+        self.queue_wait.observe((loop.time() - started) * 1000)
+        return True
+    
+    def release(self):
+        """Free a slot, handing it straight to the oldest waiter if any"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+    
+    def stats(self) -> dict:
+        return dict(
+            self.counters,
+            limit=self.limit,
+            in_flight=self.in_flight,
+            waiting=len(self.waiters),
+            queue_size=self.queue_size,
+            queue_wait=self.queue_wait.summary()
+        )
+    
+    def to_dict(self) -> dict:
+        """Counters and gauges for the worker stats hub"""
+        return {
+            'counters': dict(self.counters, in_flight=self.in_flight, waiting=len(self.waiters)),
+            'queue_wait': self.queue_wait.to_dict()
+        }
+    
+    @classmethod
+    def merge_exports(cls, exports: List[dict]):
+        """Sum to_dict() exports of several workers into (counters, queue_wait)"""
+        counters = dict.fromkeys(cls.COUNTERS + ('in_flight', 'waiting'), 0)
+        queue_wait = LatencyHistogram()
+        for export in exports:
+            for key, value in export['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            queue_wait.merge(export['queue_wait'])
+        return counters, queue_wait
+    
+    @classmethod
+    def summarize(cls, exports: List[dict]) -> dict:
+        counters, queue_wait = cls.merge_exports(exports)
+        return dict(counters, queue_wait=queue_wait.summary())
+    
+    @classmethod
+    def prometheus(cls, exports: List[dict], prefix: str = 'dodohook') -> str:
+        """Prometheus samples summed over `exports` (to_dict() of every worker)"""
+        counters, queue_wait = cls.merge_exports(exports)
+        
+        lines = [
+            f"# HELP {prefix}_admission_total Forwarding admission decisions",
+            f"# TYPE {prefix}_admission_total counter"
+        ]
+        for outcome in cls.COUNTERS:
+            lines.append(f'{prefix}_admission_total{{outcome="{outcome}"}} {counters[outcome]}')
+        for gauge, help_text in (('in_flight', 'Requests being forwarded'),
+                                 ('waiting', 'Requests waiting for a slot')):
+            lines.append(f"# HELP {prefix}_admission_{gauge} {help_text}")
+            lines.append(f"# TYPE {prefix}_admission_{gauge} gauge")
+            lines.append(f"{prefix}_admission_{gauge} {counters[gauge]}")
+        lines.append(f"# HELP {prefix}_admission_queue_wait_seconds Time spent waiting for a slot")
+        lines.append(f"# TYPE {prefix}_admission_queue_wait_seconds histogram")
+        lines.extend(queue_wait.prometheus_lines(f"{prefix}_admission_queue_wait_seconds"))
+        return '\n'.join(lines) + '\n'
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one upstream address.
+    
+    Outcomes are counted in one-second buckets over the last `window`
+    seconds. Once at least `min_requests` were seen, the breaker opens when
+    the failure rate reaches `failure_rate` or the share of calls slower
+    than `slow_call_ms` reaches `slow_call_rate`. While open, the target is
+    not used at all, so callers get an immediate 503. After `open_time`
+    seconds it lets `half_open_requests` probes through: if they all
+    succeed it closes again, any failure re-opens it.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, address: str, window: float = 30, min_requests: int = 20,
+                 failure_rate: float = 0.5, slow_call_ms: float = 5000,
+                 slow_call_rate: float = 0.8, open_time: float = 30,
+                 half_open_requests: int = 3, logger: logging.Logger = None):
+        self.address = address
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate = slow_call_rate
+        self.open_time = open_time
+        self.half_open_requests = half_open_requests
+        self.logger = logger or logging.getLogger(__name__)
+        
+        self.state = self.CLOSED
+        self.opened_until = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.opens = 0
+        self.transitions = deque(maxlen=10)
+        self.buckets = deque()  # [second, calls, failures, slow]
+        self.calls = 0
+        self.failures = 0
+        self.slow = 0
+    
+    def transition(self, state: str, now: float, reason: str):
+        self.transitions.append({'time': now, 'from': self.state, 'to': state, 'reason': reason})
+        log = self.logger.warning if state == self.OPEN else self.logger.info
+        log(f"Circuit breaker for {self.address}: {self.state} -> {state} ({reason})")
+        self.state = state
+        self.buckets.clear()
+        self.calls = self.failures = self.slow = 0
+        self.probes_in_flight = self.probe_successes = 0
+        if state == self.OPEN:
+            self.opens += 1
+            self.opened_until = now + self.open_time
+    
+    def allows(self, now: float) -> bool:
+        """Whether a request may be sent to the upstream right now"""
+        if self.state == self.OPEN:
+            if now < self.opened_until:
+                return False
+            self.transition(self.HALF_OPEN, now, f"{self.open_time}s open, probing")
+        if self.state == self.HALF_OPEN:
+            return self.probes_in_flight < self.half_open_requests
+        return True
+    
+    def would_allow(self, now: float) -> bool:
+        """allows() without its open -> half-open transition, for reports"""
+        if self.state == self.OPEN:
+            return now >= self.opened_until
+        if self.state == self.HALF_OPEN:
+            return self.probes_in_flight < self.half_open_requests
+        return True
+    
+    def on_acquire(self):
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight += 1
+    
+    def on_abandon(self):
+        """A request ended on the client's side before the upstream gave an outcome"""
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+    
+    def record(self, ok: bool, latency_ms: Optional[float], now: float):
+        """Count the outcome of one request; latency None means it never answered"""
+        slow = latency_ms is None or latency_ms >= self.slow_call_ms
+        
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if not ok or slow:
+                self.transition(self.OPEN, now, 'probe failed' if not ok else 'probe too slow')
+            else:
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_requests:
+                    self.transition(self.CLOSED, now, f"{self.half_open_requests} probes succeeded")
+            return
+        if self.state == self.OPEN:
+            return  # Sent before the breaker opened
+        
+        second = int(now)
+        if not self.buckets or self.buckets[-1][0] != second:
+            self.buckets.append([second, 0, 0, 0])
+        bucket = self.buckets[-1]
+        bucket[1] += 1
+        bucket[2] += not ok
+        bucket[3] += slow
+        self.calls += 1
+        self.failures += not ok
+        self.slow += slow
+        
+        while self.buckets and self.buckets[0][0] <= now - self.window:
+            _, calls, failures, slow_calls = self.buckets.popleft()
+            self.calls -= calls
+            self.failures -= failures
+            self.slow -= slow_calls
+        
+        if self.calls < self.min_requests:
+            return
+        if self.failures / self.calls >= self.failure_rate:
+            self.transition(self.OPEN, now, f"failure rate {self.failures / self.calls:.0%} over {self.calls} calls")
+        elif self.slow / self.calls >= self.slow_call_rate:
+            self.transition(
+                self.OPEN, now,
+                f"{self.slow / self.calls:.0%} of {self.calls} calls slower than {self.slow_call_ms:g} ms"
+            )
+    
+    def retry_after(self, now: float) -> float:
+        """Seconds until the next probe is allowed (0 unless open)"""
+        return max(0.0, self.opened_until - now) if self.state == self.OPEN else 0.0
+    
+    def snapshot(self, now: float) -> dict:
+        return {
+            'state': self.state,
+            'calls': self.calls,
+            'failure_rate': round(self.failures / self.calls, 4) if self.calls else 0.0,
+            'slow_call_rate': round(self.slow / self.calls, 4) if self.calls else 0.0,
+            'opens': self.opens,
+            'retry_after_seconds': round(self.retry_after(now), 1),
+            'transitions': list(self.transitions)
+        }
+    
+    @classmethod
+    def merge(cls, snapshots: Dict[str, dict]) -> dict:
+        """One view of the same breaker across workers ({worker: snapshot()})"""
+        severity = [cls.CLOSED, cls.HALF_OPEN, cls.OPEN]
+        calls = sum(snapshot['calls'] for snapshot in snapshots.values())
+        
+        def rate(key: str) -> float:
+            if not calls:
+                return 0.0
+            return round(sum(snapshot[key] * snapshot['calls'] for snapshot in snapshots.values()) / calls, 4)
+        
+        return {
+            'state': max((snapshot['state'] for snapshot in snapshots.values()), key=severity.index),
+            'worker_states': {worker: snapshot['state'] for worker, snapshot in snapshots.items()},
+            'calls': calls,
+            'failure_rate': rate('failure_rate'),
+            'slow_call_rate': rate('slow_call_rate'),
+            'opens': sum(snapshot['opens'] for snapshot in snapshots.values()),
+            'retry_after_seconds': max(snapshot['retry_after_seconds'] for snapshot in snapshots.values()),
+            'transitions': sorted(
+                (dict(transition, worker=worker)
+                 for worker, snapshot in snapshots.items() for transition in snapshot['transitions']),
+                key=lambda transition: transition['time']
+            )[-10:]
+        }
+
+
+class UpstreamTarget:
+    """Load-balancing state for one upstream address"""
+    
+    def __init__(self, address: str):
+        self.address = address
+        self.outstanding = 0
+        self.ewma_ms = None
+        self.ewma_updated = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.recovered_at = 0.0  # Start of the current slow-start period
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.breaker: Optional[CircuitBreaker] = None
+
+
+class UpstreamPool:
+    """Chooses a target for each request among the healthy upstreams of one route.
+    
+    Strategies:
+      least_outstanding - fewest requests in flight
+      ewma              - lowest EWMA response time, scaled by requests in flight
+    
+    A target is ejected for `ejection_time` seconds after
+    `ejection_failures` consecutive failed requests, and skipped while the
+    health monitor reports it down or its circuit breaker is open. When it
+    comes back, its weight ramps linearly from 10% to 100% over
+    `slow_start` seconds so a cold server is not flooded.
+    """
+    
+    STRATEGIES = ('least_outstanding', 'ewma')
+    
+    def __init__(self, name: str, addresses: List[str], health_monitor: 'UpstreamHealthMonitor',
+                 strategy: str = 'least_outstanding', ejection_failures: int = 3,
+                 ejection_time: float = 30, slow_start: float = 30, ewma_decay: float = 10,
+                 breaker: dict = None, logger: logging.Logger = None):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown load-balancing strategy: {strategy}")
+        self.name = name
+        self.targets = [UpstreamTarget(address) for address in addresses]
+        self.health_monitor = health_monitor
+        self.strategy = strategy
+        self.ejection_failures = ejection_failures
+        self.ejection_time = ejection_time
+        self.slow_start = slow_start
+        self.ewma_decay = ewma_decay
+        self.logger = logger or logging.getLogger(__name__)
+        if breaker is not None:
+            for target in self.targets:
+                target.breaker = CircuitBreaker(target.address, logger=self.logger, **breaker)
+    
+    def available(self, now: float = None) -> List[UpstreamTarget]:
+        """Targets not ejected, not marked down and not behind an open breaker"""
+        now = time.time() if now is None else now
+        targets = []
+        for target in self.targets:
+            if target.ejected_until:
+                if now < target.ejected_until:
+                    continue
+                target.ejected_until = 0.0
+                target.recovered_at = now
+                self.logger.info(f"Upstream {target.address} ({self.name}) back from ejection")
+            if target.breaker and not target.breaker.allows(now):
+                continue
+            if self.health_monitor.is_healthy(target.address):
+                targets.append(target)
+        return targets
+    
+    def target_available(self, target: UpstreamTarget, now: float) -> bool:
+        """Whether available() would include `target`, leaving all state untouched"""
+        if target.ejected_until and now < target.ejected_until:
+            return False
+        if target.breaker and not target.breaker.would_allow(now):
+            return False
+        return self.health_monitor.is_healthy(target.address)
+    
+    def is_available(self) -> bool:
+        """Whether any target can take a request; read-only, for /health"""
+        now = time.time()
+        return any(self.target_available(target, now) for target in self.targets)
+
+    def weight(self, target: UpstreamTarget, now: float) -> float:
+        """Slow-start weight in [0.1, 1]"""
+        recovered_at = target.recovered_at
+        state = self.health_monitor.upstreams.get(target.address)
+        if state and state['last_change']:
+            recovered_at = max(recovered_at, state['last_change'])
+        if not recovered_at or not self.slow_start:
+            return 1.0
+        return min(1.0, max(0.1, (now - recovered_at) / self.slow_start))
+    
+    def pick(self) -> Optional[UpstreamTarget]:
+        now = time.time()
+        candidates = self.available(now)
+        if not candidates:
+            return None
+        
+        def score(target: UpstreamTarget) -> float:
+            load = target.outstanding + 1
+            if self.strategy == 'ewma':
+                # Unmeasured targets get explored first
+                load *= target.ewma_ms if target.ewma_ms is not None else 0.0
+            return load / self.weight(target, now)
+        
+        # Random tie-break so idle targets share the load evenly
+        return min(candidates, key=lambda target: (score(target), random.random()))
+    
+    def acquire(self, target: UpstreamTarget):
+        target.outstanding += 1
+        target.requests += 1
+        if target.breaker:
+            target.breaker.on_acquire()
+    
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through, 0 if none is open"""
+        now = time.time()
+        waits = [target.breaker.retry_after(now) for target in self.targets if target.breaker]
+        waits = [wait for wait in waits if wait > 0]
+        return min(waits) if waits else 0.0
+    
+    def release(self, target: UpstreamTarget, latency_ms: Optional[float], ok: Optional[bool]):
+        """Record the outcome of a request sent to `target`
+        
+        `ok` is None when the request ended on the client's side (body too
+        large or unreadable, client gone) before the upstream answered or
+        failed: the slot is freed without counting anything for or against
+        the target.
+        """
+        now = time.time()
+        target.outstanding -= 1
+        if ok is None:
+            if target.breaker:
+                target.breaker.on_abandon()
+            return
+        if target.breaker:
+            target.breaker.record(ok, latency_ms, now)
+        
+        if latency_ms is not None:
+            if target.ewma_ms is None:
+                target.ewma_ms = latency_ms
+            else:
+                # Time-based decay: recent samples count more than old ones
+                decay = math.exp(-(now - target.ewma_updated) / self.ewma_decay)
+                target.ewma_ms = target.ewma_ms * decay + latency_ms * (1 - decay)
+            target.ewma_updated = now
+        
+        if ok:
+            target.consecutive_failures = 0
+            return
+        
+        target.failures += 1
+        target.consecutive_failures += 1
+        if target.consecutive_failures >= self.ejection_failures and not target.ejected_until:
+            target.ejected_until = now + self.ejection_time
+            target.consecutive_failures = 0
+            target.ejections += 1
+            self.logger.warning(
+                f"Ejected upstream {target.address} ({self.name}) for {self.ejection_time}s "
+                f"after {self.ejection_failures} consecutive failures"
+            )
+    
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            'strategy': self.strategy,
+            'targets': {
+                target.address: {
+                    'available': self.target_available(target, now),
+                    'outstanding': target.outstanding,
+                    'ewma_ms': round(target.ewma_ms, 3) if target.ewma_ms is not None else None,
+                    'weight': round(self.weight(target, now), 2),
+                    'requests': target.requests,
+                    'failures': target.failures,
+                    'ejections': target.ejections,
+                    'ejected_for_seconds': round(target.ejected_until - now, 1) if target.ejected_until else 0,
+                    'circuit_breaker': target.breaker.state if target.breaker else None
+                }
+                for target in self.targets
+            }
+        }
+
+
+class ShadowMirror:
+    """Replays a sample of forwarded requests against a staging upstream.
+    
+    The primary path only samples and enqueues: the queue is bounded and a
+    copy that does not fit is dropped, so the mirror can never slow the
+    real request down. A few background workers send the copies, discard
+    the responses and compare status and latency with the primary's.
+    """
+    
+    COUNTERS = ('sampled', 'mirrored', 'dropped', 'skipped', 'errors', 'status_match', 'status_mismatch')
+    MAX_MISMATCH_PAIRS = 50  # Distinct "primary->mirror" status pairs tracked
+    
+    def __init__(self, upstream: str, sample_rate: float = 1.0, queue_size: int = 100,
+                 concurrency: int = 4, timeout: float = 10, logger: logging.Logger = None):
+        self.upstream = upstream
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue: Optional[asyncio.Queue] = None
+        self.session: Optional[ClientSession] = None
+        
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.mismatches: Dict[str, int] = {}
+        self.primary_latency = LatencyHistogram()  # Only requests that were mirrored
+        self.mirror_latency = LatencyHistogram()
+        self.delta_sum_ms = 0.0
+        self.delta_count = 0
+        self.recent = deque(maxlen=20)  # Latest status mismatches
+    
+    def start(self) -> List[asyncio.Task]:
+        """Open the queue and session; returns the worker tasks to cancel on shutdown"""
+        self.queue = asyncio.Queue(self.queue_size)
+        self.session = ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            auto_decompress=False
+        )
+        self.logger.info(f"Mirroring {self.sample_rate:.0%} of forwarded requests to {self.upstream}")
+        return [asyncio.create_task(self.run()) for _ in range(self.concurrency)]
+    
+    async def close(self):
+        if self.session:
+            await self.session.close()
+    
+    def sample(self) -> bool:
+        """Whether to mirror the current request"""
+        if self.queue is None or random.random() >= self.sample_rate:
+            return False
+        self.counters['sampled'] += 1
+        return True
+    
+    def offer(self, method: str, path_qs: str, headers: CIMultiDict, body: Optional[bytes],
+              primary_status: int, primary_ms: float):
+        """Queue a copy without waiting; drop it when the queue is full"""
+        try:
+            self.queue.put_nowait((method, path_qs, headers, body, primary_status, primary_ms))
+        except asyncio.QueueFull:
+            self.counters['dropped'] += 1
+    
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self.replay(*item)
+            except Exception as e:
+                self.counters['errors'] += 1
+                self.logger.error(f"Mirror replay failed: {e}")
+    
+    async def replay(self, method: str, path_qs: str, headers: CIMultiDict, body: Optional[bytes],
+                     primary_status: int, primary_ms: float):
+        started = time.perf_counter()
+        try:
+            async with self.session.request(
+                method, f"http://{self.upstream}{path_qs}",
+                headers=headers,
+                data=body,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.counters['errors'] += 1
+            self.logger.debug(f"Mirror {method} {path_qs} failed: {e}")
+            return
+        
+        mirror_ms = (time.perf_counter() - started) * 1000
+        self.counters['mirrored'] += 1
+        self.primary_latency.observe(primary_ms)
+        self.mirror_latency.observe(mirror_ms)
+        self.delta_sum_ms += mirror_ms - primary_ms
+        self.delta_count += 1
+        
+        if status == primary_status:
+            self.counters['status_match'] += 1
+            return
+        self.counters['status_mismatch'] += 1
+        pair = f"{primary_status}->{status}"
+        if pair not in self.mismatches and len(self.mismatches) >= self.MAX_MISMATCH_PAIRS:
+            pair = 'other'
+        self.mismatches[pair] = self.mismatches.get(pair, 0) + 1
+        self.recent.append({
+            'time': time.time(),
+            'method': method,
+            'path': path_qs,
+            'primary_status': primary_status,
+            'mirror_status': status,
+            'primary_ms': round(primary_ms, 3),
+            'mirror_ms': round(mirror_ms, 3)
+        })
+    
+    def to_dict(self) -> dict:
+        """Counters, histograms and recent mismatches for the worker stats hub"""
+        return {
+            'upstream': self.upstream,
+            'sample_rate': self.sample_rate,
+            'counters': dict(self.counters, queued=self.queue.qsize() if self.queue else 0),
+            'mismatches': dict(self.mismatches),
+            'primary_latency': self.primary_latency.to_dict(),
+            'mirror_latency': self.mirror_latency.to_dict(),
+            'delta_sum_ms': self.delta_sum_ms,
+            'delta_count': self.delta_count,
+            'recent': list(self.recent)
+        }
+    
+    @classmethod
+    def summarize(cls, exports: List[dict]) -> dict:
+        """Comparison report over the to_dict() exports of one or more workers"""
+        counters = dict.fromkeys(cls.COUNTERS + ('queued',), 0)
+        mismatches = {}
+        primary, mirror = LatencyHistogram(), LatencyHistogram()
+        delta_sum, delta_count = 0.0, 0
+        for export in exports:
+            for key, value in export['counters'].items():
+                counters[key] += value
+            for pair, count in export['mismatches'].items():
+                mismatches[pair] = mismatches.get(pair, 0) + count
+            primary.merge(export['primary_latency'])
+            mirror.merge(export['mirror_latency'])
+            delta_sum += export['delta_sum_ms']
+            delta_count += export['delta_count']
+        
+        compared = counters['status_match'] + counters['status_mismatch']
+        return dict(
+            counters,
+            upstream=exports[0]['upstream'],
+            sample_rate=exports[0]['sample_rate'],
+            status_match_rate=round(counters['status_match'] / compared, 4) if compared else None,
+            status_mismatches=dict(sorted(mismatches.items(), key=lambda item: -item[1])),
+            latency={
+                'primary': primary.summary(),
+                'mirror': mirror.summary(),
+                'mean_delta_ms': round(delta_sum / delta_count, 3) if delta_count else None
+            },
+            recent_mismatches=sorted(
+                (entry for export in exports for entry in export['recent']),
+                key=lambda entry: entry['time']
+            )[-10:]
+        )
+
+
+class WorkerStatsHub:
+    """Aggregates request stats and rate-limit state across tunnel workers.
+    
+    Runs in the master process of multi-worker mode and listens on a local
+    Unix socket. Every worker periodically sends its counters together with
+    the per-IP request counts seen since its last sync; the hub folds those
+    into one global SlidingWindowRateLimiter and answers with the IPs that
+    are over the limit across all workers. Messages are JSON lines.
+    """
+    
+    def __init__(self, limit: int, window: float = 3600, max_clients: int = 100000,
+                 logger: logging.Logger = None):
+        self.rate_limiter = SlidingWindowRateLimiter(limit, window, max_clients)
+        self.blocked = set()
+        self.workers: Dict[int, dict] = {}
+        self.logger = logger or logging.getLogger(__name__)
+    
+    def sync(self, message: dict) -> dict:
+        """Apply one worker update and return the globally blocked IPs"""
+        now = time.time()
+        self.workers[message['worker']] = {
+            'pid': message.get('pid'),
+            'stats': message.get('stats', {}),
+            'synced_at': now
+        }
+        
+        for client_ip, (allowed, rejected) in message.get('rate', {}).items():
+            self.rate_limiter.record(client_ip, allowed, rejected, now)
+            if client_ip not in self.blocked and self.rate_limiter.is_limited(client_ip, now):
+                self.blocked.add(client_ip)
+                self.logger.warning(f"Rate limit exceeded for IP: {client_ip} (across all workers)")
+        
+        # Windows slide, so blocked clients are released once their rate drops
+        self.blocked = {ip for ip in self.blocked if self.rate_limiter.is_limited(ip, now)}
+        
+        reply = {'blocked': sorted(self.blocked)}
+        if message.get('op') == 'aggregate':
+            reply['totals'] = self.aggregate(message.get('top', 10))
+        return reply
+    
+    def aggregate(self, top: int = 10) -> dict:
+        """Global stats: counters summed over the latest report of every worker"""
+        now = time.time()
+        requests = {}
+        pool = {'connections_created': 0, 'connections_reused': 0}
+        connections = 0
+        
+        for state in self.workers.values():
+            stats = state['stats']
+            for key, value in stats.get('requests', {}).items():
+                requests[key] = requests.get(key, 0) + value
+            for key in pool:
+                pool[key] += stats.get('upstream_pool', {}).get(key, 0)
+            connections += stats.get('connections', 0)
+        
+        created, reused = pool['connections_created'], pool['connections_reused']
+        pool['hit_ratio'] = round(reused / (created + reused), 4) if created + reused else 0.0
+        metrics = TunnelMetrics.merged([state['stats'].get('metrics', {}) for state in self.workers.values()])
+        admission = [state['stats']['admission'] for state in self.workers.values() if 'admission' in state['stats']]
+        relays = {}
+        breakers = {}
+        websockets = {}
+        validation = []
+        mirrors = []
+        for worker, state in self.workers.items():
+            validation.append(state['stats'].get('payload_validation', {}))
+            if state['stats'].get('mirror'):
+                mirrors.append(state['stats']['mirror'])
+            for key, value in state['stats'].get('websockets', {}).items():
+                websockets[key] = websockets.get(key, 0) + value
+            for name, relay in state['stats'].get('tcp_relays', {}).items():
+                relays.setdefault(name, []).append(relay)
+            for pool_name, targets in state['stats'].get('circuit_breakers', {}).items():
+                for address, breaker in targets.items():
+                    breakers.setdefault(pool_name, {}).setdefault(address, {})[str(worker)] = breaker
+        
+        return {
+            'requests': requests,
+            'routes': metrics.summary(),
+            'admission': AdmissionController.summarize(admission),
+            'metrics': metrics.to_dict(),
+            'admission_exports': admission,
+            'connections': connections,
+            'websockets': websockets,
+            'payload_validation': PayloadSchema.merge_stats(validation),
+            'mirror': ShadowMirror.summarize(mirrors) if mirrors else None,
+            'upstream_pool': pool,
+            'rate_limiter': dict(self.rate_limiter.stats(top), blocked_clients=len(self.blocked)),
+            'tcp_relays': {name: merge_relay_stats(snapshots) for name, snapshots in relays.items()},
+            'circuit_breakers': {
+                pool_name: {address: CircuitBreaker.merge(snapshots) for address, snapshots in targets.items()}
+                for pool_name, targets in breakers.items()
+            },
+            'workers': {
+                str(worker): {
+                    'pid': state['pid'],
+                    'requests': state['stats'].get('requests', {}),
+                    'last_sync_seconds': round(now - state['synced_at'], 3)
+                }
+                for worker, state in sorted(self.workers.items())
+            }
+        }
+    
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = self.sync(json.loads(line))
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError) as e:
+            self.logger.warning(f"Worker control connection failed: {e}")
+        except asyncio.CancelledError:
+            pass  # Hub shutting down; asyncio.streams on 3.11 chokes on cancelled handlers
+        finally:
+            writer.close()
+    
+    async def serve(self, sock, stop: asyncio.Event):
+        """Serve workers on an already-bound Unix socket until `stop` is set"""
+        server = await asyncio.start_unix_server(self.handle_worker, sock=sock, limit=CONTROL_LINE_LIMIT)
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    self.rate_limiter.evict_idle()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+class WorkerSync:
+    """Worker side of WorkerStatsHub: pushes counters, pulls blocked IPs"""
+    
+    def __init__(self, worker_id: int, control_socket: str, interval: float = 1.0,
+                 logger: logging.Logger = None):
+        self.worker_id = worker_id
+        self.control_socket = control_socket
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.pending: Dict[str, List[int]] = {}  # ip -> [allowed, rejected] since last sync
+        self.blocked = set()
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+    
+    def record(self, client_ip: str, allowed: bool):
+        counts = self.pending.get(client_ip)
+        if counts is None:
+            counts = self.pending[client_ip] = [0, 0]
+        counts[0 if allowed else 1] += 1
+    
+    def is_blocked(self, client_ip: str) -> bool:
+        return client_ip in self.blocked
+    
+    async def exchange(self, op: str, stats: dict, top: int = 10) -> Optional[dict]:
+        """Send one update to the hub; returns the reply or None if it is unreachable"""
+        async with self.lock:
+            rate, self.pending = self.pending, {}
+            message = {
+                'op': op,
+                'worker': self.worker_id,
+                'pid': os.getpid(),
+                'stats': stats,
+                'rate': rate,
+                'top': top
+            }
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.open_unix_connection(
+                        self.control_socket, limit=CONTROL_LINE_LIMIT
+                    )
+                self.writer.write(json.dumps(message).encode('utf-8') + b'\n')
+                await self.writer.drain()
+                line = await self.reader.readline()
+                if not line:
+                    raise ConnectionError("Control socket closed")
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Worker {self.worker_id} cannot reach the stats hub: {e}")
+                if self.writer:
+                    self.writer.close()
+                self.reader = self.writer = None
+                # Keep the counts for the next attempt
+                for client_ip, (allowed, rejected) in rate.items():
+                    counts = self.pending.setdefault(client_ip, [0, 0])
+                    counts[0] += allowed
+                    counts[1] += rejected
+                return None
+            
+            reply = json.loads(line)
+            self.blocked = set(reply.get('blocked', ()))
+            return reply
+    
+    async def run(self, snapshot):
+        """Sync every `interval` seconds; `snapshot` returns this worker's counters"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.exchange('sync', snapshot())
+    
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class ActivityLog:
+    """Fixed-size ring buffer of recent request summaries for the dashboard"""
+    
+    def __init__(self, size: int = 200):
+        self.entries = deque(maxlen=size)
+        self.seq = 0
+    
+    def add(self, **entry):
+        self.seq += 1
+        entry['seq'] = self.seq
+        self.entries.append(entry)
+    
+    def since(self, seq: int) -> List[dict]:
+        """Entries newer than `seq`, oldest first"""
+        newer = []
+        for entry in reversed(self.entries):
+            if entry['seq'] <= seq:
+                break
+            newer.append(entry)
+        newer.reverse()
+        return newer
+
+
+class DashboardBroadcaster:
+    """Pushes batched dashboard updates to Server-Sent Events subscribers.
+    
+    Once per tick, and only while someone is subscribed, the broadcaster
+    collects stats, diffs them against the previous tick and serializes one
+    event holding the changed stats and the new activity entries. The same
+    bytes are queued for every subscriber, so open dashboards cost one
+    serialization per tick rather than one poll each. A subscriber whose
+    queue fills up (a stalled browser) is disconnected and will reconnect
+    through EventSource.
+    """
+    
+    def __init__(self, stats_source, activity: ActivityLog, interval: float = 1.0,
+                 queue_size: int = 16, logger: logging.Logger = None):
+        self.stats_source = stats_source
+        self.activity = activity
+        self.interval = interval
+        self.queue_size = queue_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.subscribers = set()
+        self.last_stats = {}
+        self.last_seq = 0
+        self.stats = {'ticks': 0, 'events_sent': 0, 'subscribers_dropped': 0}
+    
+    @staticmethod
+    def encode(event: str, payload: dict) -> bytes:
+        return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode('utf-8')
+    
+    async def tick(self):
+        """Build and fan out one delta event"""
+        if not self.subscribers:
+            # Nobody is watching; new subscribers start from a snapshot anyway
+            self.last_stats = {}
+            self.last_seq = self.activity.seq
+            return
+        
+        stats = await self.stats_source()
+        changed = {key: value for key, value in stats.items() if self.last_stats.get(key) != value}
+        activity = self.activity.since(self.last_seq)
+        self.last_stats = stats
+        self.last_seq = self.activity.seq
+        self.stats['ticks'] += 1
+        if not changed and not activity:
+            return
+        
+        message = self.encode('delta', {'stats': changed, 'activity': activity})
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.drop(queue)
+        self.stats['events_sent'] += 1
+    
+    def drop(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        self.stats['subscribers_dropped'] += 1
+        self.end_stream(queue)
+    
+    @staticmethod
+    def end_stream(queue: asyncio.Queue):
+        """Tell the handler to end the stream; a full queue is emptied first"""
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                self.logger.error(f"Dashboard update failed: {e}")
+    
+    async def close(self, app: web.Application = None):
+        """End every open stream so shutdown does not wait on them"""
+        for queue in list(self.subscribers):
+            self.subscribers.discard(queue)
+            self.end_stream(queue)
+    
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        """GET /events: a snapshot event, then deltas as they are broadcast"""
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+        })
+        await response.prepare(request)
+        
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        stats = await self.stats_source()
+        snapshot = self.encode('snapshot', {'stats': stats, 'activity': list(self.activity.entries)})
+        if not self.subscribers:
+            # First subscriber: the next delta only needs what changes after this
+            self.last_stats = stats
+            self.last_seq = self.activity.seq
+        self.subscribers.add(queue)
+        
+        try:
+            await response.write(snapshot)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    message = b': keepalive\n\n'
+                if message is None:
+                    break
+                await response.write(message)
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(queue)
+        
+        return response
+
 
 class TunnelConfig:
     """Configuration management for the tunnel server"""
@@ -40,214 +1685,1158 @@ class TunnelConfig:
                 'port': 443,  # HTTPS port
                 'domain': 'localhost',  # Your domain name
                 'ssl_cert': 'server.crt',
-                'ssl_key': 'server.key'
+                'ssl_key': 'server.key',
+                'workers': 1,  # >1 forks processes sharing the port via SO_REUSEPORT
+                'event_loop': 'asyncio',  # or uvloop, when installed
+                'control_socket': '',  # Stats hub socket; empty = temp dir
+                'stats_sync_interval': 1.0  # seconds between worker -> hub syncs
             },
             'tunnel': {
                 'local_host': '127.0.0.1',
                 'local_port': 5000,
+                'mode': 'proxy',  # or reverse: forward through connected tunnel agents
                 'auth_token': str(uuid.uuid4()),
                 'max_connections': 100,
-                'timeout': 30
+                'max_connections_per_host': 0,  # 0 = same as max_connections
+                'keepalive_timeout': 30,
+                'streaming': False,  # Pipe bodies chunk by chunk instead of buffering
+                'stream_chunk_size': STREAM_CHUNK_SIZE,
+                'timeout': 30,  # Deadline per forwarded request, queueing included
+                'queue_size': 50,  # Requests that may wait when max_connections are busy
+                'queue_timeout': 2,  # Longest wait for a slot before a 503
+                'health_check_interval': 5,  # seconds between upstream probes
+                'health_check_timeout': 2,
+                'unhealthy_threshold': 2,  # failed probes before an upstream is marked down
+                'healthy_threshold': 1
             },
             'security': {
-                'allowed_ips': [],  # Empty = allow all
-                'rate_limit': 1000,  # requests per hour
+                'allowed_ips': [],  # Addresses or CIDR ranges; empty = allow all
+                'trusted_proxies': [],  # Proxies whose X-Forwarded-For hops are believed
+                'rate_limit': 1000,  # requests per window per IP
+                'rate_limit_window': 3600,  # seconds
+                'rate_limit_max_clients': 100000,  # memory cap on tracked IPs
                 'require_auth': True
             },
             'logging': {
                 'level': 'INFO',
                 'file': 'tunnel_server.log'
+            },
+            'advanced': {
+                'max_request_size': DEFAULT_MAX_BODY_SIZE
+            },
+            'capture': {
+                'enabled': False,  # Record raw webhook requests for traffic_replay.py
+                'file': 'tunnel_capture.bin',
+                'redact': True  # Replace Authorization and secret header values
+            },
+            'tracing': {
+                'enabled': False,  # Spans for tracing.py; context goes upstream as traceparent
+                'file': 'tunnel_traces.jsonl',
+                'sample_rate': 1.0  # share of new traces recorded
+            },
+            'dashboard': {
+                'activity_size': 200,  # Recent requests kept for the dashboard
+                'push_interval': 1.0  # seconds between live dashboard updates
+            },
+            'websocket': {
+                'enabled': True,
+                'paths': [],  # extra path prefixes proxied as-is, e.g. n8n's /rest/push
+                'max_connections': 200,
+                'idle_timeout': 300,  # seconds without a message in either direction
+                'max_message_size': '4MB'
+            },
+            'upstreams': {},  # pool name -> [host:port, ...]; default = local_host:local_port
+            'routes': {},  # path prefix -> pool name (longest prefix wins)
+            'payload_schemas': {},  # path prefix -> {required, fields, max_size}; checked before forwarding
+            'tcp_relays': {},  # name -> {listen_port, backend: host:port, ...}
+            'load_balancing': {
+                'strategy': 'least_outstanding',  # or ewma
+                'ejection_failures': 3,  # consecutive failures before a target is ejected
+                'ejection_time': 30,  # seconds
+                'slow_start': 30,  # seconds to ramp a recovered target back to full weight
+                'ewma_decay': 10  # seconds; how fast old latency samples fade
+            },
+            'mirror': {
+                'upstream': '',  # host:port of a staging webhook server; empty = off
+                'sample_rate': 1.0,  # share of forwarded requests copied to it
+                'queue_size': 100,  # copies waiting to be sent; more are dropped
+                'concurrency': 4,  # copies in flight at once
+                'timeout': 10
+            },
+            'circuit_breaker': {
+                'enabled': True,
+                'window': 30,  # seconds of outcomes the rates are computed over
+                'min_requests': 20,  # calls in the window before the breaker may open
+                'failure_rate': 0.5,  # share of failed calls that opens the breaker
+                'slow_call_ms': 5000,  # calls at least this slow count as slow
+                'slow_call_rate': 0.8,  # share of slow calls that opens the breaker
+                'open_time': 30,  # seconds before probing a tripped upstream
+                'half_open_requests': 3  # successful probes needed to close again
+            }
+        }
+        
+        try:
+            with open(self.config_file, 'r') as f:
+                config = yaml.safe_load(f)
+                # Merge with defaults
+                for key in default_config:
+                    if key not in config:
+                        config[key] = default_config[key]
+                    elif isinstance(default_config[key], dict):
+                        for subkey in default_config[key]:
+                            if subkey not in config[key]:
+                                config[key][subkey] = default_config[key][subkey]
+                self.config = config
+        except FileNotFoundError:
+            # Create default config file
+            self.config = default_config
+            self.save_config()
+    
+    def save_config(self):
+        """Save configuration to YAML file"""
+        with open(self.config_file, 'w') as f:
+            yaml.dump(self.config, f, default_flow_style=False, indent=2)
+    
+    def get(self, section: str, key: str = None):
+        """Get configuration value"""
+        if key:
+            return self.config.get(section, {}).get(key)
+        return self.config.get(section, {})
+
+
+class TunnelServer:
+    """Custom tunnel server that replaces ngrok functionality"""
+    
+    def __init__(self, config: TunnelConfig, worker_id: int = None, control_socket: str = None):
+        self.config = config
+        self.worker_id = worker_id
+        self.app = web.Application(
+            middlewares=[self.metrics_middleware, self.capture_middleware],
+            client_max_size=parse_size(config.get('advanced', 'max_request_size') or DEFAULT_MAX_BODY_SIZE)
+        )
+        self.connections: Dict[str, dict] = {}
+        self.request_stats = {'total': 0, 'success': 0, 'errors': 0}
+        self.metrics = TunnelMetrics()
+        
+        # Admission control in front of forward_request
+        self.admission = AdmissionController(
+            limit=config.get('tunnel', 'max_connections') or 100,
+            queue_size=config.get('tunnel', 'queue_size'),
+            queue_timeout=config.get('tunnel', 'queue_timeout')
+        )
+        self.rate_limiter = SlidingWindowRateLimiter(
+            limit=config.get('security', 'rate_limit'),
+            window=config.get('security', 'rate_limit_window'),
+            max_clients=config.get('security', 'rate_limit_max_clients')
+        )
+        self.background_tasks: List[asyncio.Task] = []
+        
+        # Cached upstream health, refreshed by a background task
+        self.health_monitor = UpstreamHealthMonitor(
+            logger=logging.getLogger(__name__),
+            interval=config.get('tunnel', 'health_check_interval'),
+            timeout=config.get('tunnel', 'health_check_timeout'),
+            unhealthy_threshold=config.get('tunnel', 'unhealthy_threshold'),
+            healthy_threshold=config.get('tunnel', 'healthy_threshold')
+        )
+        
+        # Upstream pools and the routes that select them
+        self.pools = self.build_pools()
+        self.routes = sorted(
+            (config.get('routes') or {}).items(), key=lambda route: len(route[0]), reverse=True
+        )
+        for prefix, pool_name in self.routes:
+            if pool_name not in self.pools:
+                raise ValueError(f"Route {prefix} refers to unknown upstream pool '{pool_name}'")
+        if config.get('tunnel', 'mode') != 'reverse':
+            for pool in self.pools.values():
+                for target in pool.targets:
+                    self.health_monitor.add(target.address)
+        
+        # Per-route payload schemas, longest prefix first; a null entry
+        # exempts its prefix from a shorter one
+        self.payload_schemas = sorted(
+            (
+                (prefix, PayloadSchema(prefix, spec) if spec else None)
+                for prefix, spec in (config.get('payload_schemas') or {}).items()
+            ),
+            key=lambda entry: len(entry[0]), reverse=True
+        )
+        
+        # Raw TCP passthrough listeners (MT bridges and other non-HTTP clients)
+        self.relays = self.build_relays()
+        
+        # Compiled CIDR tables; SIGHUP reloads them (reload_access_lists)
+        self.allowed_ips, self.trusted_proxies = self.compile_access_lists(config)
+        
+        # Reverse-tunnel mode: agents connected from trading hosts, by agent ID
+        self.agents: Dict[str, dict] = {}
+        
+        # Proxied WebSockets by connection ID: (client side, upstream side)
+        self.websockets: Dict[str, tuple] = {}
+        self.websocket_stats = {
+            'opened': 0, 'closed': 0, 'idle_timeouts': 0, 'rejected': 0,
+            'messages_in': 0, 'messages_out': 0, 'bytes_in': 0, 'bytes_out': 0
+        }
+        
+        # Long-lived keep-alive client sessions, one per upstream
+        self.upstream_sessions: Dict[str, ClientSession] = {}
+        self.pool_stats = {'connections_created': 0, 'connections_reused': 0}
+        
+        # Setup logging
+        logging.basicConfig(
+            level=getattr(logging, config.get('logging', 'level')),
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            handlers=[
+                logging.FileHandler(config.get('logging', 'file')),
+                logging.StreamHandler()
+            ]
+        )
+        self.logger = logging.getLogger(__name__)
+        
+        # Multi-worker mode: counters and rate limits are shared through the
+        # stats hub in the master process
+        self.worker_sync = None
+        if control_socket:
+            self.worker_sync = WorkerSync(
+                worker_id, control_socket,
+                interval=config.get('server', 'stats_sync_interval'),
+                logger=self.logger
+            )
+        
+        # Capture mode (one file per worker so records never interleave)
+        self.capture = None
+        if config.get('capture', 'enabled'):
+            capture_file = config.get('capture', 'file')
+            if worker_id is not None:
+                capture_file = f"{capture_file}.{worker_id}"
+            self.capture = CaptureWriter(
+                capture_file, redact=config.get('capture', 'redact') is not False, logger=self.logger
+            )
+            self.logger.info(f"Capturing webhook traffic to {capture_file}")
+        
+        # Tracing: one span per webhook request, continued by the webhook server
+        self.tracer = None
+        if config.get('tracing', 'enabled'):
+            trace_file = config.get('tracing', 'file')
+            if worker_id is not None:
+                trace_file = f"{trace_file}.{worker_id}"
+            self.tracer = Tracer('tunnel', trace_file, sample_rate=config.get('tracing', 'sample_rate'))
+            self.logger.info(f"Writing trace spans to {trace_file}")
+        
+        # Shadow traffic: forwarded requests copied to a staging upstream
+        self.mirror = None
+        if config.get('mirror', 'upstream'):
+            self.mirror = ShadowMirror(
+                config.get('mirror', 'upstream'),
+                sample_rate=config.get('mirror', 'sample_rate'),
+                queue_size=config.get('mirror', 'queue_size'),
+                concurrency=config.get('mirror', 'concurrency'),
+                timeout=config.get('mirror', 'timeout'),
+                logger=self.logger
+            )
+        
+        # Live dashboard: recent requests plus pushed stats updates
+        self.activity = ActivityLog(config.get('dashboard', 'activity_size'))
+        self.dashboard = DashboardBroadcaster(
+            lambda: self.collect_stats(top=0),
+            self.activity,
+            interval=config.get('dashboard', 'push_interval'),
+            logger=self.logger
+        )
+        
+        # Setup routes
+        self.setup_routes()
+        
+        # Upstream connection pools live as long as the application
+        self.app.on_startup.append(self.start_upstream_sessions)
+        self.app.on_startup.append(self.start_background_tasks)
+        self.app.on_startup.append(self.start_relays)
+        self.app.on_shutdown.append(self.dashboard.close)
+        self.app.on_shutdown.append(self.close_agents)
+        self.app.on_shutdown.append(self.close_websockets)
+        self.app.on_shutdown.append(self.close_relays)
+        self.app.on_cleanup.append(self.stop_background_tasks)
+        self.app.on_cleanup.append(self.close_upstream_sessions)
+    
+    def setup_routes(self):
+        """Setup HTTP routes for the tunnel server"""
+        
+        # Main webhook endpoint that forwards to local server
+        self.app.router.add_route('*', '/webhook', self.handle_webhook)
+        self.app.router.add_route('*', '/webhook/{path:.*}', self.handle_webhook)
+        
+        # n8n specific endpoints
+        self.app.router.add_route('*', '/webhook/n8n', self.handle_n8n_webhook)
+        self.app.router.add_route('*', '/webhook/n8n/{workflow_id}', self.handle_n8n_workflow)
+        
+        # Automation platform endpoints
+        self.app.router.add_route('*', '/webhook/zapier', self.handle_automation_webhook)
+        self.app.router.add_route('*', '/webhook/make', self.handle_automation_webhook)
+        self.app.router.add_route('*', '/webhook/automation/{platform}', self.handle_automation_webhook)
+        
+        # Reverse-tunnel agents dial in here
+        self.app.router.add_get('/tunnel/connect', self.handle_agent_connect)
+        
+        # Extra prefixes for WebSocket apps such as the n8n editor
+        for prefix in self.config.get('websocket', 'paths') or []:
+            prefix = '/' + prefix.strip('/')
+            self.app.router.add_route('*', prefix, self.handle_passthrough)
+            self.app.router.add_route('*', prefix + '/{tail:.*}', self.handle_passthrough)
+        
+        # Management endpoints
+        self.app.router.add_get('/status', self.handle_status)
+        self.app.router.add_get('/health', self.handle_health)
+        self.app.router.add_get('/dashboard', self.handle_dashboard)
+        self.app.router.add_get('/stats', self.handle_stats)
+        self.app.router.add_get('/events', self.handle_events)
+        self.app.router.add_get('/metrics', self.handle_metrics)
+        
+        # Static files for dashboard (optional, handled in dashboard endpoint)
+        # self.app.router.add_static('/', path='dashboard/', name='dashboard')
+    
+    def route_label(self, path: str) -> str:
+        """Metrics label for a webhook path: the platform it belongs to"""
+        parts = path.strip('/').split('/')
+        if len(parts) < 2:
+            return 'tradingview'
+        if parts[1] in ('n8n', 'zapier', 'make'):
+            return parts[1]
+        if parts[1] == 'automation' and len(parts) > 2:
+            # Only configured platforms get their own label, so arbitrary
+            # paths cannot create unbounded metric series
+            platforms = (self.config.get('automation') or {}).get('platforms') or {}
+            return parts[2] if parts[2] in platforms else 'automation'
+        return 'tradingview'
+    
+    @web.middleware
+    async def metrics_middleware(self, request: web.Request, handler):
+        """Count every webhook request once, by its final status, and time it"""
+        if not request.path.startswith('/webhook'):
+            return await handler(request)
+        
+        start = time.perf_counter()
+        status = 500
+        span = None
+        if self.tracer:
+            span = request['trace_span'] = self.tracer.start_span(
+                'tunnel.request', request.headers.get(TRACEPARENT),
+                method=request.method, path=request.path
+            )
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            route = self.route_label(request.path)
+            
+            self.request_stats['total'] += 1
+            self.request_stats['success' if status < 400 else 'errors'] += 1
+            # forward_request stores the upstream's share of the time; a
+            # proxied WebSocket's lifetime is not a latency
+            if not request.get('websocket'):
+                self.metrics.observe(route, status, total_ms, request.get('upstream_ms'))
+            if span:
+                span.set(route=route, status_code=status)
+                if 'upstream_ms' in request:
+                    span.set(upstream_ms=round(request['upstream_ms'], 3))
+                span.end('ok' if status < 500 else 'error')
+            
+            self.activity.add(
+                time=time.time(),
+                method=request.method,
+                path=request.path,
+                route=route,
+                status=status,
+                duration_ms=round(total_ms, 2),
+                client=self.client_ip(request)
+            )
+    
+    @web.middleware
+    async def capture_middleware(self, request: web.Request, handler):
+        """Record webhook requests with their arrival time when capture mode is on"""
+        if self.capture and request.path.startswith('/webhook'):
+            arrived_at = time.time()
+            body = await request.read()  # Cached by aiohttp for the handler
+            self.capture.write(request.method, request.path_qs, request.headers, body, arrived_at)
+        return await handler(request)
+    
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        """Handle incoming webhook requests and forward to local server"""
+        try:
+            # Security checks
+            if not await self.check_security(request):
+                return web.Response(
+                    text='Unauthorized',
+                    status=401
+                )
+            
+            # Rate limiting
+            if not await self.check_rate_limit(request):
+                return web.Response(
+                    text='Rate limit exceeded',
+                    status=429
+                )
+            
+            # Forward request to local webhook server (counted by metrics_middleware)
+            return await self.forward_request(request)
+        
+        except Exception as e:
+            self.logger.error(f"Error handling webhook: {str(e)}")
+            return web.Response(
+                text=f'Internal server error: {str(e)}',
+                status=500
+            )
+    
+    def build_pools(self) -> Dict[str, UpstreamPool]:
+        """Upstream pools from the `upstreams` section"""
+        upstreams = dict(self.config.get('upstreams') or {})
+        upstreams.setdefault('default', [
+            f"{self.config.get('tunnel', 'local_host')}:{self.config.get('tunnel', 'local_port')}"
+        ])
+        
+        balancing = self.config.get('load_balancing')
+        breaker = dict(self.config.get('circuit_breaker'))
+        if not breaker.pop('enabled'):
+            breaker = None
+        return {
+            name: UpstreamPool(
+                name, list(addresses), self.health_monitor,
+                strategy=balancing['strategy'],
+                ejection_failures=balancing['ejection_failures'],
+                ejection_time=balancing['ejection_time'],
+                slow_start=balancing['slow_start'],
+                ewma_decay=balancing['ewma_decay'],
+                breaker=breaker,
+                logger=logging.getLogger(__name__)
+            )
+            for name, addresses in upstreams.items()
+        }
+    
+    def pool_for(self, path: str) -> UpstreamPool:
+        """The pool of the longest route prefix matching `path`"""
+        for prefix, pool_name in self.routes:
+            if path == prefix or path.startswith(prefix.rstrip('/') + '/'):
+                return self.pools[pool_name]
+        return self.pools['default']
+    
+    def schema_for(self, path: str) -> Optional[PayloadSchema]:
+        """The payload schema of the longest prefix matching `path`, if any"""
+        for prefix, schema in self.payload_schemas:
+            if path == prefix or path.startswith(prefix.rstrip('/') + '/'):
+                return schema
+        return None
+    
+    def get_validation_stats(self) -> Dict[str, dict]:
+        return {prefix: schema.stats() for prefix, schema in self.payload_schemas if schema}
+    
+    def build_relays(self) -> Dict[str, TcpRelay]:
+        """TCP relays from the `tcp_relays` section"""
+        relays = {}
+        for name, relay in (self.config.get('tcp_relays') or {}).items():
+            if 'listen_port' not in relay or 'backend' not in relay:
+                raise ValueError(f"TCP relay '{name}' needs listen_port and backend")
+            relays[name] = TcpRelay(
+                name,
+                relay.get('listen_host', self.config.get('server', 'host')),
+                int(relay['listen_port']),
+                relay['backend'],
+                zero_copy=relay.get('zero_copy', True),
+                connect_timeout=relay.get('connect_timeout', 10),
+                logger=logging.getLogger(__name__)
+            )
+        return relays
+    
+    async def start_relays(self, app: web.Application):
+        for relay in self.relays.values():
+            # Workers share each relay port the same way they share the HTTPS port
+            await relay.start(reuse_port=self.worker_sync is not None)
+    
+    async def close_relays(self, app: web.Application):
+        await asyncio.gather(*(relay.close() for relay in self.relays.values()))
+    
+    async def start_upstream_sessions(self, app: web.Application):
+        """Create the shared keep-alive sessions for every upstream target"""
+        for pool in self.pools.values():
+            for target in pool.targets:
+                self.get_upstream_session(target.address)
+    
+    def get_upstream_session(self, upstream: str) -> ClientSession:
+        """Return the pooled session for an upstream, creating it on first use"""
+        session = self.upstream_sessions.get(upstream)
+        if session is None or session.closed:
+            max_connections = self.config.get('tunnel', 'max_connections') or 100
+            per_host = self.config.get('tunnel', 'max_connections_per_host') or max_connections
+            
+            connector = aiohttp.TCPConnector(
+                limit=max_connections,
+                limit_per_host=per_host,
+                keepalive_timeout=self.config.get('tunnel', 'keepalive_timeout'),
+                ttl_dns_cache=300
+            )
+            
+            # Count new vs. reused pooled connections
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+            
+            session = ClientSession(
+                connector=connector,
+                trace_configs=[trace_config],
+                auto_decompress=False
+            )
+            self.upstream_sessions[upstream] = session
+            self.logger.info(
+                f"Upstream pool for {upstream}: {max_connections} connections, {per_host} per host"
+            )
+        return session
+    
+    async def _on_connection_created(self, session, context, params):
+        self.pool_stats['connections_created'] += 1
+    
+    async def _on_connection_reused(self, session, context, params):
+        self.pool_stats['connections_reused'] += 1
+    
+    def get_pool_stats(self) -> dict:
+        """Connection pool hit statistics"""
+        created = self.pool_stats['connections_created']
+        reused = self.pool_stats['connections_reused']
+        return {
+            'connections_created': created,
+            'connections_reused': reused,
+            'hit_ratio': round(reused / (created + reused), 4) if created + reused else 0.0
+        }
+    
+    def get_breaker_stats(self) -> dict:
+        """Circuit breaker state per pool and target"""
+        now = time.time()
+        return {
+            name: {
+                target.address: target.breaker.snapshot(now)
+                for target in pool.targets if target.breaker
             }
+            for name, pool in self.pools.items()
+        }
+    
+    async def close_upstream_sessions(self, app: web.Application):
+        """Close every upstream session on shutdown"""
+        for session in self.upstream_sessions.values():
+            await session.close()
+        self.upstream_sessions.clear()
+    
+    def get_max_body_size(self) -> int:
+        """Maximum accepted request body in bytes (advanced.max_request_size)"""
+        return parse_size(self.config.get('advanced', 'max_request_size') or DEFAULT_MAX_BODY_SIZE)
+    
+    async def forward_request(self, request: web.Request, extra_headers: dict = None,
+                              response_headers: dict = None) -> web.StreamResponse:
+        """Forward the request to the local webhook server
+        
+        extra_headers are added to the upstream request and response_headers
+        to the response sent back to the client. With tunnel.streaming
+        enabled, bodies are piped chunk by chunk in both directions instead
+        of being buffered in memory. At most tunnel.max_connections requests
+        are forwarded at once; the rest queue briefly or get a 503.
+        """
+        # Enforce the body limit before reading anything
+        max_body_size = self.get_max_body_size()
+        if request.content_length is not None and request.content_length > max_body_size:
+            self.logger.warning(
+                f"Rejected {request.method} {request.path}: body of {request.content_length} bytes "
+                f"exceeds {max_body_size}"
+            )
+            return web.Response(text='Request body too large', status=413)
+        
+        # The webhook server continues the trace under the tunnel's span
+        span = request.get('trace_span')
+        if span:
+            extra_headers = dict(extra_headers or {}, **{TRACEPARENT: span.traceparent()})
+        
+        # Upgrades hold their connection open, so they bypass admission control
+        if is_websocket_upgrade(request) and self.config.get('websocket', 'enabled'):
+            return await self.proxy_websocket(request, extra_headers)
+        
+        # Malformed payloads are answered here and never take an upstream slot
+        schema = self.schema_for(request.path)
+        if schema and request.method in ('POST', 'PUT', 'PATCH'):
+            rejection = await self.check_payload(request, schema, max_body_size)
+            if rejection:
+                return rejection
+        
+        # The whole request, queueing included, must finish within tunnel.timeout
+        deadline = asyncio.get_running_loop().time() + (self.config.get('tunnel', 'timeout') or 30)
+        if not await self.admission.acquire(deadline):
+            self.logger.warning(f"Shed {request.method} {request.path}: {self.admission.in_flight} in flight")
+            return web.Response(
+                text='Server busy, retry shortly',
+                status=503,
+                headers={'Retry-After': str(max(1, math.ceil(self.admission.queue_timeout)))}
+            )
+        
+        try:
+            response = await self._forward_admitted(
+                request, extra_headers, response_headers, max_body_size, deadline
+            )
+        finally:
+            self.admission.release()
+        
+        if self.mirror and 'upstream_ms' in request:
+            await self.mirror_request(request, response.status, extra_headers)
+        return response
+    
+    def streams_body(self, request: web.Request) -> bool:
+        """Whether the body is piped through rather than buffered"""
+        # Capture mode and payload schemas have already buffered the body
+        return bool(self.config.get('tunnel', 'streaming') and not self.capture
+                    and not request.get('payload_checked'))
+    
+    async def mirror_request(self, request: web.Request, status: int, extra_headers: dict):
+        """Queue a copy of a request the primary upstream has answered"""
+        if not self.mirror.sample():
+            return
+        body = None
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            if self.streams_body(request):
+                # A streamed body went to the primary and was never kept
+                self.mirror.counters['skipped'] += 1
+                return
+            body = await request.read()  # Cached by aiohttp
+        
+        headers = filter_hop_headers(request.headers)
+        headers.pop('Host', None)
+        headers.update(extra_headers or {})
+        headers['X-DodoHook-Mirror'] = '1'
+        self.mirror.offer(request.method, request.path_qs, headers, body, status, request['upstream_ms'])
+    
+    async def check_payload(self, request: web.Request, schema: PayloadSchema,
+                            max_body_size: int) -> Optional[web.Response]:
+        """Validate the body against the route's schema; the 4xx response, or None"""
+        limit = min(schema.max_size or max_body_size, max_body_size)
+        body = None
+        if request.content_length is None or request.content_length <= limit:
+            try:
+                body = await request.read()  # Cached by aiohttp for forwarding
+            except web.HTTPRequestEntityTooLarge:
+                pass
+        request['payload_checked'] = True
+        
+        if body is None or len(body) > limit:
+            schema.record('too_large')
+            self.logger.warning(f"Rejected {request.method} {request.path}: payload exceeds {limit} bytes")
+            return web.Response(text='Request body too large', status=413)
+        
+        failure = schema.check(body)
+        schema.record(failure and failure[0])
+        if failure is None:
+            return None
+        
+        self.logger.warning(f"Rejected {request.method} {request.path}: {failure[1]}")
+        return web.json_response({'status': 'error', 'message': failure[1]}, status=400)
+    
+    def remaining(self, deadline: float) -> float:
+        """Seconds left until `deadline` (event loop time)"""
+        return max(0.001, deadline - asyncio.get_running_loop().time())
+    
+    async def _forward_admitted(self, request: web.Request, extra_headers: dict,
+                                response_headers: dict, max_body_size: int,
+                                deadline: float) -> web.StreamResponse:
+        """forward_request once admission control has granted a slot"""
+        streaming = self.streams_body(request)
+        
+        # Reverse-tunnel mode: requests travel over the agent's existing
+        # connection instead of a new one to local_host:local_port
+        if self.config.get('tunnel', 'mode') == 'reverse':
+            return await self.forward_via_agent(
+                request, extra_headers, response_headers, streaming, max_body_size, deadline
+            )
+        
+        # Pick a target from the route's pool; unhealthy, ejected and
+        # circuit-broken targets are skipped, so fail fast when none is left
+        pool = self.pool_for(request.path)
+        target = pool.pick()
+        if target is None:
+            retry_after = pool.retry_after() or self.health_monitor.interval
+            return web.Response(
+                text='Local server unavailable',
+                status=503,
+                headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+            )
+        upstream = target.address
+        local_url = f"http://{upstream}{request.path_qs}"
+        
+        pool.acquire(target)
+        started = time.perf_counter()
+        latency_ms = None
+        ok = None  # No verdict on the target until the upstream answers or fails
+        try:
+            session = self.get_upstream_session(upstream)
+            
+            # Prepare request data; hop-by-hop headers such as
+            # "Connection: close" must not reach the pooled upstream connection
+            headers = filter_hop_headers(request.headers)
+            headers.pop('Host', None)  # Remove host header
+            headers.update(extra_headers or {})
+            
+            # Get request body
+            body = None
+            if request.method in ['POST', 'PUT', 'PATCH']:
+                if streaming:
+                    body = self._stream_request_body(request, max_body_size)
+                else:
+                    body = await self._read_request_body(request)
+            
+            # Forward request
+            async with session.request(
+                method=request.method,
+                url=local_url,
+                headers=headers,
+                data=body,
+                timeout=aiohttp.ClientTimeout(total=self.remaining(deadline))
+            ) as response:
+                # Time to response headers feeds the EWMA; gateway errors
+                # count towards ejection, application errors do not
+                latency_ms = (time.perf_counter() - started) * 1000
+                ok = response.status not in UPSTREAM_FAILURE_STATUSES
+                request['upstream_ms'] = latency_ms
+                
+                # Remove hop-by-hop headers
+                client_headers = filter_hop_headers(response.headers)
+                client_headers.update(response_headers or {})
+                
+                if streaming:
+                    return await self._stream_response(request, response, client_headers)
+                
+                # Get response data
+                response_body = await response.read()
+                request['upstream_ms'] = (time.perf_counter() - started) * 1000
+                client_headers.pop('Content-Length', None)
+                
+                self.logger.info(
+                    f"Forwarded {request.method} {request.path} -> "
+                    f"{response.status} ({len(response_body)} bytes)"
+                )
+                
+                return web.Response(
+                    body=response_body,
+                    status=response.status,
+                    headers=client_headers
+                )
+                
+        except web.HTTPRequestEntityTooLarge:
+            return web.Response(text='Request body too large', status=413)
+        except asyncio.TimeoutError:
+            if ok is None:
+                ok = False
+            self.logger.error(f"Timeout forwarding request to {local_url}")
+            return web.Response(text='Local server timeout', status=504)
+        except Exception as e:
+            # aiohttp wraps errors raised by the streamed body generator
+            body_error = e if isinstance(e, ClientBodyError) else e.__cause__
+            if isinstance(body_error, RequestBodyTooLarge):
+                self.logger.warning(
+                    f"Rejected {request.method} {request.path}: streamed body exceeds {max_body_size}"
+                )
+                return web.Response(text='Request body too large', status=413)
+            if isinstance(body_error, ClientBodyError):
+                self.logger.warning(f"Could not read the body of {request.method} {request.path}: {body_error}")
+                return web.Response(text='Could not read request body', status=400)
+            if ok is None:
+                ok = False
+            self.logger.error(f"Error forwarding request: {str(e)}")
+            return web.Response(text='Failed to connect to local server', status=502)
+        finally:
+            pool.release(target, latency_ms, ok)
+    
+    async def handle_passthrough(self, request: web.Request) -> web.StreamResponse:
+        """Extra websocket.paths: proxied like webhooks, with the same checks
+        
+        Browser apps behind these paths (the n8n editor, dashboards) cannot
+        send the tunnel token; serve them with security.require_auth off and
+        an allowed_ips list.
+        """
+        if not await self.check_security(request):
+            return web.Response(text='Unauthorized', status=401)
+        if not await self.check_rate_limit(request):
+            return web.Response(text='Rate limit exceeded', status=429)
+        return await self.forward_request(request)
+    
+    async def proxy_websocket(self, request: web.Request, extra_headers: dict = None) -> web.StreamResponse:
+        """Relay a WebSocket between the client and the upstream, frame by frame
+        
+        Each direction awaits the send before reading the next frame, and
+        aiohttp pauses reading a socket whose frame queue is full, so a slow
+        receiver pushes back on the sender instead of growing buffers.
+        """
+        request['websocket'] = True
+        if self.config.get('tunnel', 'mode') == 'reverse':
+            return web.Response(text='WebSocket proxying is not available in reverse mode', status=501)
+        if len(self.websockets) >= self.config.get('websocket', 'max_connections'):
+            self.websocket_stats['rejected'] += 1
+            return web.Response(text='Too many WebSocket connections', status=503, headers={'Retry-After': '5'})
+        
+        pool = self.pool_for(request.path)
+        target = pool.pick()
+        if target is None:
+            retry_after = pool.retry_after() or self.health_monitor.interval
+            return web.Response(
+                text='Local server unavailable',
+                status=503,
+                headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+            )
+        
+        headers = CIMultiDict(
+            (key, value) for key, value in filter_hop_headers(request.headers).items()
+            if key.lower() not in WEBSOCKET_HANDSHAKE_HEADERS
+        )
+        headers.update(extra_headers or {})
+        protocols = [
+            protocol.strip() for protocol in request.headers.get('Sec-WebSocket-Protocol', '').split(',')
+            if protocol.strip()
+        ]
+        max_message_size = parse_size(self.config.get('websocket', 'max_message_size'))
+        
+        # Connect upstream first, so a refusal is answered before the client
+        # is upgraded. The handshake counts as one request to the target, for
+        # the breaker, ejection and EWMA like any forwarded request.
+        pool.acquire(target)
+        started = time.perf_counter()
+        latency_ms = None
+        ok = None  # Stays None if the client goes away mid-handshake
+        try:
+            upstream_ws = await self.get_upstream_session(target.address).ws_connect(
+                f"http://{target.address}{request.path_qs}",
+                headers=headers,
+                protocols=protocols,
+                max_msg_size=max_message_size
+            )
+            latency_ms = (time.perf_counter() - started) * 1000
+            ok = True
+        except aiohttp.WSServerHandshakeError as e:
+            # Whatever the upstream answered, the client asked for an upgrade
+            latency_ms = (time.perf_counter() - started) * 1000
+            ok = e.status not in UPSTREAM_FAILURE_STATUSES
+            self.logger.warning(f"Upstream {target.address} refused WebSocket {request.path}: {e.status} {e.message}")
+            return web.Response(text=f'Upstream refused WebSocket: {e.message}', status=502)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            ok = False
+            self.logger.error(f"WebSocket connect to {target.address} failed: {e}")
+            return web.Response(text='Failed to connect to local server', status=502)
+        finally:
+            pool.release(target, latency_ms, ok)
+        
+        client_ws = web.WebSocketResponse(
+            protocols=[upstream_ws.protocol] if upstream_ws.protocol else (),
+            max_msg_size=max_message_size
+        )
+        try:
+            await client_ws.prepare(request)
+        except Exception:
+            await upstream_ws.close()
+            raise
+        
+        connection_id = f"ws-{uuid.uuid4().hex[:12]}"
+        entry = {
+            'type': 'websocket',
+            'path': request.path,
+            'remote': self.client_ip(request),
+            'upstream': target.address,
+            'connected_at': datetime.now().isoformat(),
+            'messages_in': 0, 'messages_out': 0, 'bytes_in': 0, 'bytes_out': 0,
+            'last_activity': time.time()
         }
+        self.connections[connection_id] = entry
+        self.websockets[connection_id] = (client_ws, upstream_ws)
+        self.websocket_stats['opened'] += 1
+        self.logger.info(f"WebSocket {connection_id} {request.path} -> {target.address}")
         
+        async def pump(source, sink, direction: str):
+            async for msg in source:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    await sink.send_str(msg.data)
+                    size = len(msg.data.encode('utf-8'))
+                elif msg.type == aiohttp.WSMsgType.BINARY:
+                    await sink.send_bytes(msg.data)
+                    size = len(msg.data)
+                else:
+                    break  # ERROR; CLOSE ends the iteration by itself
+                entry[f"messages_{direction}"] += 1
+                entry[f"bytes_{direction}"] += size
+                self.websocket_stats[f"messages_{direction}"] += 1
+                self.websocket_stats[f"bytes_{direction}"] += size
+                entry['last_activity'] = time.time()
+            # Pass the close on with the peer's code
+            await sink.close(code=source.close_code or aiohttp.WSCloseCode.OK)
+        
+        async def watchdog(idle_timeout: float):
+            while True:
+                remaining = entry['last_activity'] + idle_timeout - time.time()
+                if remaining <= 0:
+                    self.websocket_stats['idle_timeouts'] += 1
+                    self.logger.info(f"WebSocket {connection_id} idle for {idle_timeout}s, closing")
+                    await client_ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Idle timeout')
+                    await upstream_ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Idle timeout')
+                    return
+                await asyncio.sleep(remaining)
+        
+        tasks = [
+            asyncio.create_task(pump(client_ws, upstream_ws, 'in')),
+            asyncio.create_task(pump(upstream_ws, client_ws, 'out'))
+        ]
+        idle_timeout = self.config.get('websocket', 'idle_timeout')
+        if idle_timeout:
+            tasks.append(asyncio.create_task(watchdog(idle_timeout)))
         try:
-            with open(self.config_file, 'r') as f:
-                config = yaml.safe_load(f)
-                # Merge with defaults
-                for key in default_config:
-                    if key not in config:
-                        config[key] = default_config[key]
-                    elif isinstance(default_config[key], dict):
-                        for subkey in default_config[key]:
-                            if subkey not in config[key]:
-                                config[key][subkey] = default_config[key][subkey]
-                self.config = config
-        except FileNotFoundError:
-            # Create default config file
-            self.config = default_config
-            self.save_config()
+            # Either side closing (or the watchdog firing) ends the session
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream_ws.close()
+            await client_ws.close()
+            self.websockets.pop(connection_id, None)
+            self.connections.pop(connection_id, None)
+            self.websocket_stats['closed'] += 1
+            self.logger.info(
+                f"WebSocket {connection_id} closed: {entry['messages_in']} messages in, "
+                f"{entry['messages_out']} out"
+            )
+        return client_ws
     
-    def save_config(self):
-        """Save configuration to YAML file"""
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.config, f, default_flow_style=False, indent=2)
+    async def close_websockets(self, app: web.Application):
+        """Close proxied WebSockets on shutdown so handlers can finish"""
+        for client_ws, upstream_ws in list(self.websockets.values()):
+            await client_ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Server shutdown')
+            await upstream_ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Server shutdown')
     
-    def get(self, section: str, key: str = None):
-        """Get configuration value"""
-        if key:
-            return self.config.get(section, {}).get(key)
-        return self.config.get(section, {})
-
-
-class TunnelServer:
-    """Custom tunnel server that replaces ngrok functionality"""
+    def get_websocket_stats(self) -> dict:
+        return dict(self.websocket_stats, open=len(self.websockets))
     
-    def __init__(self, config: TunnelConfig):
-        self.config = config
-        self.app = web.Application()
-        self.connections: Dict[str, dict] = {}
-        self.request_stats = {'total': 0, 'success': 0, 'errors': 0}
-        self.rate_limiter = {}
+    async def handle_agent_connect(self, request: web.Request) -> web.StreamResponse:
+        """Accept a tunnel agent's outbound connection (reverse-tunnel mode)"""
+        request_token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        if request_token != self.config.get('tunnel', 'auth_token'):
+            self.logger.warning(f"Rejected tunnel agent from {request.remote}: invalid auth token")
+            return web.Response(text='Unauthorized', status=401)
         
-        # Setup logging
-        logging.basicConfig(
-            level=getattr(logging, config.get('logging', 'level')),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(config.get('logging', 'file')),
-                logging.StreamHandler()
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
+        agent_id = request.query.get('agent') or str(uuid.uuid4())
+        if agent_id in self.agents:
+            return web.Response(text=f'Agent {agent_id} is already connected', status=409)
         
-        # Setup routes
-        self.setup_routes()
-    
-    def setup_routes(self):
-        """Setup HTTP routes for the tunnel server"""
+        ws = web.WebSocketResponse(heartbeat=30, max_msg_size=0)
+        await ws.prepare(request)
+        mux = Multiplexer(ws.send_bytes, logger=self.logger)
+        self.agents[agent_id] = {'mux': mux, 'ws': ws}
+        self.connections[agent_id] = {
+            'type': 'agent',
+            'remote': request.remote,
+            'connected_at': datetime.now().isoformat()
+        }
+        self.logger.info(f"Tunnel agent {agent_id} connected from {request.remote}")
         
-        # Main webhook endpoint that forwards to local server
-        self.app.router.add_route('*', '/webhook', self.handle_webhook)
-        self.app.router.add_route('*', '/webhook/{path:.*}', self.handle_webhook)
+        try:
+            async for msg in ws:
+                if msg.type == web.WSMsgType.BINARY:
+                    await mux.feed(msg.data)
+                elif msg.type == web.WSMsgType.ERROR:
+                    break
+        finally:
+            mux.close(f"Tunnel agent {agent_id} disconnected")
+            self.agents.pop(agent_id, None)
+            self.connections.pop(agent_id, None)
+            self.logger.warning(f"Tunnel agent {agent_id} disconnected")
         
-        # n8n specific endpoints
-        self.app.router.add_route('*', '/webhook/n8n', self.handle_n8n_webhook)
-        self.app.router.add_route('*', '/webhook/n8n/{workflow_id}', self.handle_n8n_workflow)
+        return ws
+    
+    async def close_agents(self, app: web.Application):
+        """Disconnect agents on shutdown; they reconnect to the next server"""
+        for agent in list(self.agents.values()):
+            await agent['ws'].close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b'Server shutdown')
+    
+    def get_agent_stats(self) -> Dict[str, dict]:
+        return {
+            agent_id: dict(self.connections.get(agent_id, {}), **agent['mux'].snapshot())
+            for agent_id, agent in self.agents.items()
+        }
+    
+    async def forward_via_agent(self, request: web.Request, extra_headers: dict,
+                                response_headers: dict, streaming: bool,
+                                max_body_size: int, deadline: float) -> web.StreamResponse:
+        """Forward the request as a multiplexed stream over a connected agent"""
+        if not self.agents:
+            return web.Response(
+                text='No tunnel agent connected',
+                status=503,
+                headers={'Retry-After': '5'}
+            )
         
-        # Automation platform endpoints
-        self.app.router.add_route('*', '/webhook/zapier', self.handle_automation_webhook)
-        self.app.router.add_route('*', '/webhook/make', self.handle_automation_webhook)
-        self.app.router.add_route('*', '/webhook/automation/{platform}', self.handle_automation_webhook)
+        # Least busy agent when several trading hosts are connected
+        mux = min((agent['mux'] for agent in self.agents.values()), key=lambda m: len(m.streams))
         
-        # Management endpoints
-        self.app.router.add_get('/status', self.handle_status)
-        self.app.router.add_get('/health', self.handle_health)
-        self.app.router.add_get('/dashboard', self.handle_dashboard)
-        self.app.router.add_get('/stats', self.handle_stats)
+        headers = filter_hop_headers(request.headers)
+        headers.pop('Host', None)
+        headers.update(extra_headers or {})
+        has_body = request.method in ['POST', 'PUT', 'PATCH']
         
-        # Static files for dashboard (optional, handled in dashboard endpoint)
-        # self.app.router.add_static('/', path='dashboard/', name='dashboard')
-    
-    async def handle_webhook(self, request: web.Request) -> web.Response:
-        """Handle incoming webhook requests and forward to local server"""
+        stream = None
+        finished = False
+        started = time.perf_counter()
         try:
-            # Security checks
-            if not await self.check_security(request):
-                self.request_stats['errors'] += 1
-                return web.Response(
-                    text='Unauthorized',
-                    status=401
-                )
+            stream = await mux.open_stream({
+                'method': request.method,
+                'path': request.path_qs,
+                'headers': list(headers.items()),
+                'has_body': has_body,
+                'timeout': self.remaining(deadline)
+            })
             
-            # Rate limiting
-            if not await self.check_rate_limit(request):
-                self.request_stats['errors'] += 1
-                return web.Response(
-                    text='Rate limit exceeded',
-                    status=429
+            # The upstream may answer before it has read the whole body (a 413,
+            # say) and then stops granting window credit, so the body is sent
+            # while we wait for the head and abandoned once the head arrives
+            writer = asyncio.create_task(
+                self._send_agent_body(stream, request, has_body, streaming, max_body_size)
+            )
+            try:
+                await asyncio.wait(
+                    {writer, stream.head},
+                    timeout=self.remaining(deadline),
+                    return_when=asyncio.FIRST_COMPLETED
                 )
+                if writer.done() and not stream.head.done():
+                    writer.result()  # Raises body errors: too large, reset
+                head = await asyncio.wait_for(stream.head, self.remaining(deadline))
+            finally:
+                writer.cancel()
+                await asyncio.gather(writer, return_exceptions=True)
+            request['upstream_ms'] = (time.perf_counter() - started) * 1000
+            client_headers = CIMultiDict(
+                (key, value) for key, value in head['headers']
+                if key.lower() not in HOP_HEADERS
+            )
+            client_headers.update(response_headers or {})
             
-            # Forward request to local webhook server
-            response = await self.forward_request(request)
-            self.request_stats['success'] += 1
-            self.request_stats['total'] += 1
-            
-            return response
+            if streaming:
+                response = web.StreamResponse(status=head['status'], headers=client_headers)
+                await response.prepare(request)
+                async for chunk in stream.chunks():
+                    await response.write(chunk)
+                await response.write_eof()
+                finished = True
+                return response
             
-        except Exception as e:
-            self.logger.error(f"Error handling webhook: {str(e)}")
-            self.request_stats['errors'] += 1
-            self.request_stats['total'] += 1
+            body = b''.join([chunk async for chunk in stream.chunks()])
+            request['upstream_ms'] = (time.perf_counter() - started) * 1000
+            client_headers.pop('Content-Length', None)
+            finished = True
             
-            return web.Response(
-                text=f'Internal server error: {str(e)}',
-                status=500
+            self.logger.info(
+                f"Tunnelled {request.method} {request.path} -> {head['status']} ({len(body)} bytes)"
             )
-    
-    async def forward_request(self, request: web.Request) -> web.Response:
-        """Forward the request to the local webhook server"""
-        local_host = self.config.get('tunnel', 'local_host')
-        local_port = self.config.get('tunnel', 'local_port')
-        local_url = f"http://{local_host}:{local_port}{request.path_qs}"
+            return web.Response(body=body, status=head['status'], headers=client_headers)
         
-        try:
-            async with ClientSession() as session:
-                # Prepare request data
-                headers = dict(request.headers)
-                headers.pop('Host', None)  # Remove host header
-                
-                # Get request body
-                body = None
-                if request.method in ['POST', 'PUT', 'PATCH']:
-                    body = await request.read()
-                
-                # Forward request
-                async with session.request(
-                    method=request.method,
-                    url=local_url,
-                    headers=headers,
-                    data=body,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    # Get response data
-                    response_body = await response.read()
-                    response_headers = dict(response.headers)
-                    
-                    # Remove hop-by-hop headers
-                    hop_headers = ['connection', 'keep-alive', 'proxy-authenticate',
-                                 'proxy-authorization', 'te', 'trailers', 'transfer-encoding',
-                                 'upgrade']
-                    for header in hop_headers:
-                        response_headers.pop(header, None)
-                    
-                    self.logger.info(
-                        f"Forwarded {request.method} {request.path} -> "
-                        f"{response.status} ({len(response_body)} bytes)"
-                    )
-                    
-                    return web.Response(
-                        body=response_body,
-                        status=response.status,
-                        headers=response_headers
-                    )
-                    
+        except (RequestBodyTooLarge, web.HTTPRequestEntityTooLarge):
+            return web.Response(text='Request body too large', status=413)
+        except ClientBodyError as e:
+            self.logger.warning(f"Could not read the body of {request.method} {request.path}: {e}")
+            return web.Response(text='Could not read request body', status=400)
         except asyncio.TimeoutError:
-            self.logger.error(f"Timeout forwarding request to {local_url}")
+            self.logger.error(f"Timeout waiting for the tunnel agent on {request.path}")
             return web.Response(text='Local server timeout', status=504)
+        except StreamReset as e:
+            self.logger.error(f"Tunnel stream failed for {request.path}: {e}")
+            return web.Response(text='Tunnel stream failed', status=502)
+        finally:
+            # Covers errors and client disconnects alike, and a body left
+            # unsent because the upstream answered early
+            if stream is not None and not finished:
+                await stream.reset('request aborted')
+            elif stream is not None and not stream.local_closed:
+                await stream.reset('response sent before the request body')
+    
+    async def _send_agent_body(self, stream, request: web.Request, has_body: bool,
+                               streaming: bool, max_body_size: int):
+        """Write the client's body into an agent stream and end our side"""
+        if has_body:
+            if streaming:
+                async for chunk in self._stream_request_body(request, max_body_size):
+                    await stream.write(chunk)
+            else:
+                await stream.write(await self._read_request_body(request))
+        await stream.end()
+
+    async def _read_request_body(self, request: web.Request) -> bytes:
+        """The client's whole body; a broken one raises ClientBodyError"""
+        try:
+            return await request.read()
+        except web.HTTPRequestEntityTooLarge:
+            raise
         except Exception as e:
-            self.logger.error(f"Error forwarding request: {str(e)}")
-            return web.Response(text='Failed to connect to local server', status=502)
+            raise ClientBodyError(str(e) or type(e).__name__) from e
+    
+    async def _stream_request_body(self, request: web.Request, max_body_size: int):
+        """Yield the client's body in bounded chunks, enforcing the size limit
+        
+        Anything that goes wrong reading it, such as the client disconnecting
+        or bad chunked encoding, is raised as ClientBodyError.
+        """
+        received = 0
+        chunk_size = self.config.get('tunnel', 'stream_chunk_size') or STREAM_CHUNK_SIZE
+        try:
+            async for chunk in request.content.iter_chunked(chunk_size):
+                received += len(chunk)
+                if received > max_body_size:
+                    raise RequestBodyTooLarge()
+                yield chunk
+        except ClientBodyError:
+            raise
+        except Exception as e:
+            raise ClientBodyError(str(e) or type(e).__name__) from e
+    
+    async def _stream_response(self, request: web.Request, response: aiohttp.ClientResponse,
+                               headers: CIMultiDict) -> web.StreamResponse:
+        """Pipe the upstream response to the client as it arrives"""
+        stream = web.StreamResponse(status=response.status, headers=headers)
+        if response.content_length is not None:
+            stream.content_length = response.content_length
+        await stream.prepare(request)
+        
+        # iter_chunked reads at most chunk_size at a time and write() waits for
+        # the client to drain, so memory per request stays bounded
+        sent = 0
+        chunk_size = self.config.get('tunnel', 'stream_chunk_size') or STREAM_CHUNK_SIZE
+        async for chunk in response.content.iter_chunked(chunk_size):
+            await stream.write(chunk)
+            sent += len(chunk)
+        await stream.write_eof()
+        
+        self.logger.info(
+            f"Streamed {request.method} {request.path} -> {response.status} ({sent} bytes)"
+        )
+        return stream
     
     async def handle_n8n_webhook(self, request: web.Request) -> web.Response:
         """Handle n8n specific webhook requests with enhanced features"""
         try:
             # Add n8n specific headers and processing
-            headers = dict(request.headers)
-            headers['X-DodoHook-Platform'] = 'n8n'
-            headers['X-DodoHook-Timestamp'] = str(time.time())
+            headers = {
+                'X-DodoHook-Platform': 'n8n',
+                'X-DodoHook-Timestamp': str(time.time())
+            }
             
             # Enhanced logging for n8n workflows
             workflow_id = request.match_info.get('workflow_id', 'default')
             self.logger.info(f"n8n webhook received - Workflow: {workflow_id}")
             
-            # Forward with n8n enhancements
-            response = await self.forward_request(request)
-            
-            # Add n8n specific response headers
-            response.headers['X-DodoHook-Platform'] = 'n8n'
-            response.headers['X-DodoHook-Processed'] = 'true'
-            
-            return response
+            # Forward with n8n enhancements and n8n specific response headers
+            return await self.forward_request(
+                request,
+                extra_headers=headers,
+                response_headers={'X-DodoHook-Platform': 'n8n', 'X-DodoHook-Processed': 'true'}
+            )
             
         except Exception as e:
             self.logger.error(f"n8n webhook error: {str(e)}")
@@ -266,14 +2855,16 @@ class TunnelServer:
             self.logger.info(f"n8n workflow webhook - ID: {workflow_id}")
             
             # Add workflow tracking
-            headers = dict(request.headers)
-            headers['X-n8n-Workflow-ID'] = workflow_id
-            headers['X-DodoHook-Platform'] = 'n8n'
-            
-            response = await self.forward_request(request)
-            response.headers['X-n8n-Workflow-ID'] = workflow_id
+            headers = {
+                'X-n8n-Workflow-ID': workflow_id,
+                'X-DodoHook-Platform': 'n8n'
+            }
             
-            return response
+            return await self.forward_request(
+                request,
+                extra_headers=headers,
+                response_headers={'X-n8n-Workflow-ID': workflow_id}
+            )
             
         except Exception as e:
             self.logger.error(f"n8n workflow {workflow_id} error: {str(e)}")
@@ -291,14 +2882,16 @@ class TunnelServer:
             self.logger.info(f"Automation webhook from {platform}")
             
             # Add platform identification
-            headers = dict(request.headers)
-            headers['X-DodoHook-Platform'] = platform
-            headers['X-DodoHook-Type'] = 'automation'
-            
-            response = await self.forward_request(request)
-            response.headers['X-DodoHook-Platform'] = platform
+            headers = {
+                'X-DodoHook-Platform': platform,
+                'X-DodoHook-Type': 'automation'
+            }
             
-            return response
+            return await self.forward_request(
+                request,
+                extra_headers=headers,
+                response_headers={'X-DodoHook-Platform': platform}
+            )
             
         except Exception as e:
             self.logger.error(f"Automation platform {platform} error: {str(e)}")
@@ -307,13 +2900,65 @@ class TunnelServer:
                 status=500
             )
     
-    async def check_security(self, request: web.Request) -> bool:
-        """Check security constraints"""
-        # Check allowed IPs
-        allowed_ips = self.config.get('security', 'allowed_ips')
-        if allowed_ips:
-            client_ip = request.remote
-            if client_ip not in allowed_ips:
+    @staticmethod
+    def compile_access_lists(config: TunnelConfig):
+        """(allowed_ips, trusted_proxies) tables from the security section"""
+        return (
+            IPRangeTable(config.get('security', 'allowed_ips') or []),
+            IPRangeTable(config.get('security', 'trusted_proxies') or [])
+        )
+    
+    def reload_access_lists(self):
+        """Re-read allowed_ips and trusted_proxies from the config file"""
+        try:
+            config = TunnelConfig(self.config.config_file)
+            allowed_ips, trusted_proxies = self.compile_access_lists(config)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            self.logger.error(f"IP allowlist reload failed, keeping the current one: {e}")
+            return
+        
+        self.allowed_ips, self.trusted_proxies = allowed_ips, trusted_proxies
+        for key in ('allowed_ips', 'trusted_proxies'):
+            self.config.config['security'][key] = config.get('security', key)
+        self.logger.info(
+            f"Reloaded IP allowlist: {len(allowed_ips)} entries, {len(trusted_proxies)} trusted proxies"
+        )
+    
+    def client_ip(self, request: web.Request) -> str:
+        """The originating client address
+        
+        Behind a trusted proxy (nginx), X-Forwarded-For is walked from the
+        right: each hop appended by a trusted proxy is skipped, and the first
+        address not in trusted_proxies is the client.
+        """
+        client = request.get('client_ip')
+        if client is not None:
+            return client
+        
+        client = request.remote or ''
+        if self.trusted_proxies and client in self.trusted_proxies:
+            hops = [
+                hop.strip()
+                for header in request.headers.getall('X-Forwarded-For', [])
+                for hop in header.split(',')
+            ]
+            for hop in reversed(hops):
+                if hop not in self.trusted_proxies:
+                    if parse_ip(hop) is not None:
+                        client = hop
+                    # else a garbage hop: keep the last address we could verify
+                    break
+                client = hop
+        
+        request['client_ip'] = client
+        return client
+    
+    async def check_security(self, request: web.Request, query_token: bool = False) -> bool:
+        """Check security constraints; query_token also accepts ?token= (EventSource cannot set headers)"""
+        # Check allowed IPs (CIDR ranges, see IPRangeTable)
+        if self.allowed_ips:
+            client_ip = self.client_ip(request)
+            if client_ip not in self.allowed_ips:
                 self.logger.warning(f"Blocked request from unauthorized IP: {client_ip}")
                 return False
         
@@ -321,6 +2966,8 @@ class TunnelServer:
         if self.config.get('security', 'require_auth'):
             auth_token = self.config.get('tunnel', 'auth_token')
             request_token = request.headers.get('Authorization', '').replace('Bearer ', '')
+            if query_token and 'Authorization' not in request.headers:
+                request_token = request.query.get('token', '')
             
             if request_token != auth_token:
                 self.logger.warning("Request with invalid or missing auth token")
@@ -330,72 +2977,165 @@ class TunnelServer:
     
     async def check_rate_limit(self, request: web.Request) -> bool:
         """Check rate limiting"""
-        client_ip = request.remote
-        current_time = time.time()
-        rate_limit = self.config.get('security', 'rate_limit')
-        
-        if client_ip not in self.rate_limiter:
-            self.rate_limiter[client_ip] = {'requests': [], 'blocked_until': 0}
+        client_ip = self.client_ip(request)
         
-        client_data = self.rate_limiter[client_ip]
-        
-        # Check if client is currently blocked
-        if current_time < client_data['blocked_until']:
+        # Other workers' traffic only reaches this process through the hub
+        if self.worker_sync and self.worker_sync.is_blocked(client_ip):
+            self.worker_sync.record(client_ip, False)
             return False
         
-        # Clean old requests (older than 1 hour)
-        client_data['requests'] = [
-            req_time for req_time in client_data['requests']
-            if current_time - req_time < 3600
-        ]
+        allowed = self.rate_limiter.allow(client_ip)
+        if self.worker_sync:
+            self.worker_sync.record(client_ip, allowed)
+        if allowed:
+            return True
         
-        # Check rate limit
-        if len(client_data['requests']) >= rate_limit:
-            # Block for 1 hour
-            client_data['blocked_until'] = current_time + 3600
+        if self.rate_limiter.is_first_rejection(client_ip):
             self.logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return False
+        return False
+    
+    async def start_background_tasks(self, app: web.Application):
+        """Start periodic maintenance tasks"""
+        # First health probe before serving so /health is accurate immediately
+        await self.health_monitor.check_all()
+        self.background_tasks.append(asyncio.create_task(self.health_monitor.run()))
+        self.background_tasks.append(asyncio.create_task(self.evict_idle_clients()))
+        self.background_tasks.append(asyncio.create_task(self.dashboard.run()))
+        if self.mirror:
+            self.background_tasks.extend(self.mirror.start())
+        if self.worker_sync:
+            self.background_tasks.append(asyncio.create_task(self.worker_sync.run(self.worker_snapshot)))
+    
+    async def stop_background_tasks(self, app: web.Application):
+        """Cancel periodic maintenance tasks on shutdown"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+        if self.worker_sync:
+            await self.worker_sync.close()
+        if self.mirror:
+            await self.mirror.close()
+    
+    async def evict_idle_clients(self):
+        """Periodically drop idle clients from the rate limiter"""
+        while True:
+            await asyncio.sleep(60)
+            evicted = self.rate_limiter.evict_idle()
+            if evicted:
+                self.logger.debug(f"Evicted {evicted} idle rate-limit entries")
+    
+    def worker_snapshot(self) -> dict:
+        """This process's raw counters, as sent to the stats hub"""
+        return {
+            'requests': dict(self.request_stats),
+            'connections': len(self.connections),
+            'upstream_pool': dict(self.pool_stats),
+            'metrics': self.metrics.to_dict(),
+            'admission': self.admission.to_dict(),
+            'tcp_relays': {name: relay.snapshot() for name, relay in self.relays.items()},
+            'circuit_breakers': self.get_breaker_stats(),
+            'websockets': self.get_websocket_stats(),
+            'payload_validation': self.get_validation_stats(),
+            'mirror': self.mirror.to_dict() if self.mirror else None
+        }
+    
+    async def collect_stats(self, top: int = 10) -> dict:
+        """Counters for this process, or summed over all workers in multi-worker mode"""
+        if self.worker_sync:
+            reply = await self.worker_sync.exchange('aggregate', self.worker_snapshot(), top)
+            if reply:
+                totals = reply['totals']
+                totals.pop('metrics', None)
+                totals.pop('admission_exports', None)
+                return totals
+            self.logger.warning("Stats hub unavailable, reporting this worker only")
         
-        # Add current request
-        client_data['requests'].append(current_time)
-        return True
+        return {
+            'requests': dict(self.request_stats),
+            'routes': self.metrics.summary(),
+            'admission': self.admission.stats(),
+            'connections': len(self.connections),
+            'upstream_pool': self.get_pool_stats(),
+            'rate_limiter': self.rate_limiter.stats(top),
+            'tcp_relays': {name: relay.snapshot() for name, relay in self.relays.items()},
+            'circuit_breakers': self.get_breaker_stats(),
+            'websockets': self.get_websocket_stats(),
+            'payload_validation': self.get_validation_stats(),
+            'mirror': ShadowMirror.summarize([self.mirror.to_dict()]) if self.mirror else None
+        }
+    
+    async def collect_metrics(self):
+        """Route metrics, admission exports and payload validation counters,
+        for this process or for all workers"""
+        if self.worker_sync:
+            reply = await self.worker_sync.exchange('aggregate', self.worker_snapshot(), 0)
+            if reply:
+                totals = reply['totals']
+                return (TunnelMetrics.merged([totals['metrics']]), totals['admission_exports'],
+                        totals['payload_validation'])
+        return self.metrics, [self.admission.to_dict()], self.get_validation_stats()
+    
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Prometheus scrape endpoint"""
+        metrics, admission, validation = await self.collect_metrics()
+        return web.Response(
+            text=(metrics.prometheus() + AdmissionController.prometheus(admission)
+                  + PayloadSchema.prometheus(validation)),
+            content_type='text/plain'
+        )
     
     async def handle_status(self, request: web.Request) -> web.Response:
         """Handle status endpoint"""
+        if not await self.check_security(request, query_token=True):
+            return web.Response(text='Unauthorized', status=401)
+        stats = await self.collect_stats()
         status = {
             'status': 'running',
             'timestamp': datetime.now().isoformat(),
             'local_target': f"{self.config.get('tunnel', 'local_host')}:{self.config.get('tunnel', 'local_port')}",
             'public_url': f"https://{self.config.get('server', 'domain')}/webhook",
-            'connections': len(self.connections),
-            'stats': self.request_stats
+            'connections': stats['connections'],
+            'stats': stats['requests'],
+            'upstream_pool': stats['upstream_pool']
         }
+        if 'workers' in stats:
+            status['workers'] = len(stats['workers'])
+        if self.agents:
+            status['agents'] = self.get_agent_stats()
+        if stats.get('websockets', {}).get('opened'):
+            status['websockets'] = stats['websockets']
+            # Open connections of the worker answering this request
+            status['websocket_connections'] = {
+                connection_id: self.connections[connection_id]
+                for connection_id in list(self.websockets)[:50]
+            }
+        if any(stats.get('circuit_breakers', {}).values()):
+            status['circuit_breakers'] = stats['circuit_breakers']
+        if stats.get('tcp_relays'):
+            status['tcp_relays'] = {
+                name: {key: relay[key] for key in ('listen', 'backend', 'active', 'connections', 'bytes_in', 'bytes_out')}
+                for name, relay in stats['tcp_relays'].items()
+            }
         return web.json_response(status)
     
     async def handle_health(self, request: web.Request) -> web.Response:
-        """Handle health check endpoint"""
-        try:
-            # Check if local server is reachable
-            local_host = self.config.get('tunnel', 'local_host')
-            local_port = self.config.get('tunnel', 'local_port')
-            
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((local_host, local_port))
-            sock.close()
-            
-            if result == 0:
-                return web.json_response({'status': 'healthy', 'local_server': 'reachable'})
-            else:
-                return web.json_response(
-                    {'status': 'unhealthy', 'local_server': 'unreachable'},
-                    status=503
-                )
-        except Exception as e:
-            return web.json_response(
-                {'status': 'error', 'message': str(e)},
-                status=500
-            )
+        """Handle health check endpoint (answers from the cached probe results)"""
+        upstreams = self.health_monitor.snapshot()
+        # Healthy while every pool still has a target to send to
+        healthy = all(pool.is_available() for pool in self.pools.values())
+        health = {'upstreams': upstreams}
+        
+        # In reverse mode the local server is reachable only through an agent
+        if self.config.get('tunnel', 'mode') == 'reverse':
+            healthy = healthy and bool(self.agents)
+            health['agents'] = list(self.agents)
+        
+        health.update(
+            status='healthy' if healthy else 'unhealthy',
+            local_server='reachable' if healthy else 'unreachable'
+        )
+        return web.json_response(health, status=200 if healthy else 503)
     
     async def handle_dashboard(self, request: web.Request) -> web.Response:
         """Handle dashboard web interface"""
@@ -425,6 +3165,8 @@ class TunnelServer:
         .refresh-btn { background: linear-gradient(135deg, #667eea, #764ba2); color: white; border: none; padding: 12px 24px; border-radius: 8px; cursor: pointer; font-weight: bold; transition: transform 0.2s; }
         .refresh-btn:hover { transform: translateY(-2px); }
         .dodo-icon { font-size: 1.5em; margin-right: 10px; }
+        .activity { font-family: monospace; padding: 4px 8px; border-left: 4px solid #4CAF50; margin: 2px 0; white-space: pre; }
+        .activity.failed { border-left-color: #f44336; }
     </style>
 </head>
 <body>
@@ -494,9 +3236,13 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
     </div>
     
     <script>
+        // With require_auth on, open /dashboard?token=... and the token is passed along
+        const token = new URLSearchParams(location.search).get('token');
+        const auth = token ? '?token=' + encodeURIComponent(token) : '';
+        
         async function refreshData() {
             try {
-                const response = await fetch('/status');
+                const response = await fetch('/status' + auth);
                 const data = await response.json();
                 
                 document.getElementById('public-url').textContent = data.public_url;
@@ -504,10 +3250,7 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
                 document.getElementById('webhook-url').textContent = data.public_url;
                 document.getElementById('n8n-url').textContent = data.public_url.replace('/webhook', '/webhook/n8n');
                 
-                document.getElementById('total-requests').textContent = data.stats.total;
-                document.getElementById('success-requests').textContent = data.stats.success;
-                document.getElementById('error-requests').textContent = data.stats.errors;
-                document.getElementById('connections').textContent = data.connections;
+                renderStats({requests: data.stats, connections: data.connections});
                 
                 const status = document.getElementById('status');
                 status.className = 'status running';
@@ -520,8 +3263,58 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
             }
         }
         
-        // Auto refresh every 30 seconds
-        setInterval(refreshData, 30000);
+        function renderStats(stats) {
+            if (stats.requests) {
+                document.getElementById('total-requests').textContent = stats.requests.total;
+                document.getElementById('success-requests').textContent = stats.requests.success;
+                document.getElementById('error-requests').textContent = stats.requests.errors;
+            }
+            if (stats.connections !== undefined) {
+                document.getElementById('connections').textContent = stats.connections;
+            }
+        }
+        
+        // Recent activity, newest first, de-duplicated by sequence number
+        let lastSeq = 0;
+        function renderActivity(entries) {
+            const log = document.getElementById('activity-log');
+            if (lastSeq === 0 && entries.length) {
+                log.innerHTML = '';
+            }
+            for (const entry of entries) {
+                if (entry.seq <= lastSeq) continue;
+                lastSeq = entry.seq;
+                const row = document.createElement('div');
+                row.className = 'activity ' + (entry.status < 400 ? 'ok' : 'failed');
+                const time = new Date(entry.time * 1000).toLocaleTimeString();
+                row.textContent = `${time}  ${entry.status}  ${entry.method} ${entry.path}  ${entry.duration_ms} ms  ${entry.client || ''}`;
+                log.prepend(row);
+            }
+            while (log.children.length > 50) {
+                log.removeChild(log.lastChild);
+            }
+        }
+        
+        // Live updates pushed by the server; fall back to polling without EventSource
+        if (window.EventSource) {
+            const events = new EventSource('/events' + auth);
+            const status = document.getElementById('status');
+            const apply = (event) => {
+                const data = JSON.parse(event.data);
+                renderStats(data.stats);
+                renderActivity(data.activity);
+                status.className = 'status running';
+                status.textContent = '🟢 DodoHook Online (live)';
+            };
+            events.addEventListener('snapshot', apply);
+            events.addEventListener('delta', apply);
+            events.onerror = () => {
+                status.className = 'status error';
+                status.textContent = '🔴 DodoHook Connection Error (reconnecting)';
+            };
+        } else {
+            setInterval(refreshData, 30000);
+        }
         
         // Initial load
         refreshData();
@@ -531,19 +3324,29 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
         """
         return web.Response(text=dashboard_html, content_type='text/html')
     
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        """Live dashboard stream; it carries client IPs and paths, so it is guarded like /status"""
+        if not await self.check_security(request, query_token=True):
+            return web.Response(text='Unauthorized', status=401)
+        return await self.dashboard.handle_events(request)
+    
     async def handle_stats(self, request: web.Request) -> web.Response:
-        """Handle statistics endpoint"""
-        stats = {
-            'requests': self.request_stats,
-            'connections': len(self.connections),
-            'rate_limiter': {
-                ip: {
-                    'requests_count': len(data['requests']),
-                    'blocked_until': data['blocked_until']
-                }
-                for ip, data in self.rate_limiter.items()
-            }
-        }
+        """Handle statistics endpoint; ?top=N lists up to N rate-limit offenders (at most MAX_STATS_TOP)"""
+        if not await self.check_security(request, query_token=True):
+            return web.Response(text='Unauthorized', status=401)
+        try:
+            top = int(request.query.get('top', 10))
+        except ValueError:
+            top = -1
+        if not 0 <= top <= MAX_STATS_TOP:
+            return web.json_response(
+                {'error': f"top must be a whole number from 0 to {MAX_STATS_TOP}"}, status=400
+            )
+        stats = await self.collect_stats(top)
+        stats['dashboard'] = dict(self.dashboard.stats, subscribers=len(self.dashboard.subscribers))
+        stats['agents'] = self.get_agent_stats()
+        stats['upstreams'] = {name: pool.snapshot() for name, pool in self.pools.items()}
+        stats['upstream_routes'] = dict(self.routes)
         return web.json_response(stats)
     
     async def start_server(self):
@@ -570,7 +3373,9 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
         runner = web.AppRunner(self.app)
         await runner.setup()
         
-        site = web.TCPSite(runner, host, port, ssl_context=ssl_context)
+        # Workers bind the same port; the kernel spreads connections across them
+        site = web.TCPSite(runner, host, port, ssl_context=ssl_context,
+                           reuse_port=self.worker_sync is not None)
         await site.start()
         
         protocol = "https" if ssl_context else "http"
@@ -584,6 +3389,133 @@ Custom: https://webhook.dodohook.com/webhook/automation/platform-name</pre>
         return runner
 
 
+def install_event_loop(name: str) -> str:
+    """Switch to uvloop when configured and installed; returns the loop in use"""
+    if name == 'uvloop':
+        try:
+            import uvloop
+        except ImportError:
+            print("uvloop is not installed, using the default asyncio event loop")
+            return 'asyncio'
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return 'uvloop'
+    return 'asyncio'
+
+
+async def serve_until_stopped(server: TunnelServer):
+    """Run one TunnelServer until SIGINT/SIGTERM, then shut it down cleanly"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    loop.add_signal_handler(signal.SIGHUP, server.reload_access_lists)
+    
+    runner = await server.start_server()
+    try:
+        await stop.wait()
+    finally:
+        print("\nShutting down tunnel server...")
+        await runner.cleanup()
+
+
+def run_workers(config: TunnelConfig, workers: int):
+    """Fork `workers` TunnelServer processes sharing the port, plus the stats hub"""
+    control_socket = config.get('server', 'control_socket') or os.path.join(
+        tempfile.gettempdir(), f"dodohook-{os.getpid()}.sock"
+    )
+    if os.path.exists(control_socket):
+        os.unlink(control_socket)
+    
+    # Bound before forking so workers can connect as soon as they start
+    hub_sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    hub_sock.bind(control_socket)
+    hub_sock.listen(workers * 2)
+    
+    pids = []
+    for worker_id in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            hub_sock.close()
+            exit_code = 0
+            try:
+                asyncio.run(serve_until_stopped(TunnelServer(config, worker_id, control_socket)))
+            except Exception as e:
+                print(f"Worker {worker_id} error: {e}")
+                exit_code = 1
+            os._exit(exit_code)
+        pids.append(pid)
+    print(f"Started {workers} workers: {', '.join(str(pid) for pid in pids)}")
+    
+    hub = WorkerStatsHub(
+        limit=config.get('security', 'rate_limit'),
+        window=config.get('security', 'rate_limit_window'),
+        max_clients=config.get('security', 'rate_limit_max_clients'),
+        logger=logging.getLogger(__name__)
+    )
+    
+    async def run_hub():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        
+        def forward_reload():
+            # Every worker holds its own compiled access lists
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGHUP)
+                except ProcessLookupError:
+                    pass
+        
+        loop.add_signal_handler(signal.SIGHUP, forward_reload)
+        
+        async def watch_workers():
+            # Stop the hub once every worker has exited on its own
+            remaining = set(pids)
+            while remaining:
+                await asyncio.sleep(1)
+                for pid in list(remaining):
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        remaining.discard(pid)
+                        print(f"Worker {pid} exited")
+            stop.set()
+        
+        watcher = asyncio.create_task(watch_workers())
+        await hub.serve(hub_sock, stop)
+        watcher.cancel()
+    
+    try:
+        asyncio.run(run_hub())
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        if os.path.exists(control_socket):
+            os.unlink(control_socket)
+
+
+def worker_count(config: TunnelConfig) -> int:
+    """server.workers, brought down to 1 where several workers cannot serve"""
+    workers = int(config.get('server', 'workers') or 1)
+    if workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("Multi-worker mode needs fork() and SO_REUSEPORT, starting a single worker")
+        return 1
+    if workers > 1 and config.get('tunnel', 'mode') == 'reverse':
+        # An agent connects to one worker; the others would answer 503 for
+        # their share of webhooks, which looks like random signal loss
+        print("Reverse mode needs a single worker, since each agent connects to one worker only; "
+              "starting a single worker")
+        return 1
+    return workers
+
+
 def main():
     """Main entry point"""
     print("🦤 DodoHook - Professional Webhook Tunneling Solution")
@@ -592,22 +3524,17 @@ def main():
     
     # Load configuration
     config = TunnelConfig()
+    event_loop = install_event_loop(config.get('server', 'event_loop'))
     
-    # Create and start server
-    server = TunnelServer(config)
-    
-    async def run_server():
-        runner = await server.start_server()
-        try:
-            while True:
-                await asyncio.sleep(1)
-        except KeyboardInterrupt:
-            print("\nShutting down tunnel server...")
-            await runner.cleanup()
+    workers = worker_count(config)
+    print(f"Workers: {workers}, event loop: {event_loop}")
     
     # Run the server
     try:
-        asyncio.run(run_server())
+        if workers > 1:
+            run_workers(config, workers)
+        else:
+            asyncio.run(serve_until_stopped(TunnelServer(config)))
     except KeyboardInterrupt:
         print("Server stopped by user")
     except Exception as e:
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Framed MetaTrader Protocol
+Copyright 2024, AI Trading Team
+
+Length-prefixed binary framing for signals sent to a MetaTrader terminal.
+Every frame is a fixed 13-byte header followed by a JSON payload:
+
+    +----------------+------------------+-----------+-----------------+
+    | length: uint32 | sequence: uint64 | type: u8  | payload (JSON)  |
+    +----------------+------------------+-----------+-----------------+
+
+All integers are big-endian and `length` counts only the payload. The
+sender numbers signals with monotonically increasing sequence IDs and the
+terminal answers each one with an ACK frame carrying the same ID, in any
+order. Many signals can therefore be in flight on one connection, and
+each ack gives an exact per-signal delivery latency.
+
+Running this module starts the reference receiver used for testing:
+
+    python3 mt_protocol.py --port 8081 --ack-delay 0.005 --reorder
+"""
+
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+FRAME_HEADER = struct.Struct('>IQB')
+FRAME_SIGNAL = 1
+FRAME_ACK = 2
+MAX_PAYLOAD = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends a malformed frame"""
+
+
+class SignalRejected(Exception):
+    """Raised when the terminal acks a signal with a status other than "ok".
+    
+    The terminal received the signal and refused it, so it must not be
+    retried through another channel such as the signal file.
+    """
+    
+    def __init__(self, ack: Dict):
+        super().__init__(f"Terminal rejected signal: {ack}")
+        self.ack = ack
+
+
+def encode_frame(frame_type: int, seq: int, payload: bytes) -> bytes:
+    """Build one frame"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload too large: {len(payload)} bytes")
+    return FRAME_HEADER.pack(len(payload), seq, frame_type) + payload
+
+
+class FrameReader:
+    """Incremental frame decoder that tolerates partial reads"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, int, bytes]]:
+        """Add received bytes and return every complete (type, seq, payload) frame"""
+        self.buffer.extend(data)
+        frames = []
+
+        while len(self.buffer) >= FRAME_HEADER.size:
+            length, seq, frame_type = FRAME_HEADER.unpack_from(self.buffer)
+            if length > MAX_PAYLOAD:
+                raise ProtocolError(f"Frame length {length} exceeds limit")
+
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+
+            frames.append((frame_type, seq, bytes(self.buffer[FRAME_HEADER.size:end])))
+            del self.buffer[:end]
+
+        return frames
+
+
+class PendingAck:
+    """A signal waiting for its ack"""
+
+    def __init__(self, seq: int, sock: socket.socket):
+        self.seq = seq
+        self.sock = sock
+        self.sent_at = time.perf_counter()
+        self.event = threading.Event()
+        self.ack = None
+        self.error = None
+        self.latency_ms = None
+
+    def resolve(self, ack: Dict):
+        self.latency_ms = (time.perf_counter() - self.sent_at) * 1000
+        self.ack = ack
+        self.event.set()
+
+    def fail(self, error: Exception):
+        self.error = error
+        self.event.set()
+
+    def wait(self, timeout: float) -> Dict:
+        if not self.event.wait(timeout):
+            raise TimeoutError(f"No ack for signal {self.seq} within {timeout}s")
+        if self.error:
+            raise self.error
+        return self.ack
+
+
+class FramedConnection:
+    """One persistent framed connection to a terminal with pipelined acks.
+
+    Any number of threads can call `request` concurrently; a background
+    reader thread matches acks to senders by sequence ID. The connection is
+    re-established on the next send after a failure, and sequence IDs keep
+    increasing across reconnects.
+    """
+
+    def __init__(self, transport, timeout: float = 5):
+        if not hasattr(transport, 'connect'):
+            raise ValueError(f"Framed protocol needs a stream transport, got {transport.name}")
+        self.transport = transport
+        self.timeout = timeout
+        self.sock = None
+        self.seq = 0
+        self.pending: Dict[int, PendingAck] = {}
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        # Blocking socket: the reader thread waits on recv indefinitely and
+        # per-signal timeouts are enforced by PendingAck.wait
+        sock = self.transport.connect()
+        sock.settimeout(None)
+        self.sock = sock
+        reader = threading.Thread(target=self._read_loop, args=(sock,), daemon=True)
+        reader.start()
+        return sock
+
+    def send(self, message: Dict) -> PendingAck:
+        """Send a signal without waiting for its ack"""
+        return self.send_many([message])[0]
+    
+    def send_many(self, messages: List[Dict]) -> List[PendingAck]:
+        """Send signals back to back in a single write, without waiting for acks"""
+        payloads = [json.dumps(message).encode('utf-8') for message in messages]
+        
+        # send_lock keeps frames whole and in sequence order on the wire; the
+        # reader thread only needs self.lock, so acks keep draining while a
+        # sender is blocked on a full socket buffer
+        with self.send_lock:
+            with self.lock:
+                sock = self.sock or self._connect()
+                frames = []
+                for payload in payloads:
+                    self.seq += 1
+                    frames.append((PendingAck(self.seq, sock), encode_frame(FRAME_SIGNAL, self.seq, payload)))
+                for pending, _ in frames:
+                    self.pending[pending.seq] = pending
+            try:
+                sock.sendall(b''.join(frame for _, frame in frames))
+            except OSError as e:
+                with self.lock:
+                    self._fail_locked(sock, e)
+                raise
+        
+        return [pending for pending, _ in frames]
+
+    def request(self, message: Dict, timeout: Optional[float] = None) -> Tuple[Dict, float]:
+        """Send a signal and wait for its ack; returns (ack, latency_ms)"""
+        pending = self.send(message)
+        try:
+            ack = pending.wait(self.timeout if timeout is None else timeout)
+        finally:
+            with self.lock:
+                self.pending.pop(pending.seq, None)
+        return ack, pending.latency_ms
+    
+    def request_many(self, messages: List[Dict], timeout: Optional[float] = None) -> List[PendingAck]:
+        """Send signals in one write and wait for all their acks.
+        
+        Returns one PendingAck per message, with `ack` set, or `error` when
+        the signal failed or was not acked within the shared timeout.
+        """
+        batch = self.send_many(messages)
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        try:
+            for pending in batch:
+                try:
+                    pending.wait(max(0.0, deadline - time.time()))
+                except Exception as e:
+                    pending.error = e
+        finally:
+            with self.lock:
+                for pending in batch:
+                    self.pending.pop(pending.seq, None)
+        return batch
+
+    def _read_loop(self, sock: socket.socket):
+        reader = FrameReader()
+        error = ConnectionError("Terminal closed the connection")
+
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                for frame_type, seq, payload in reader.feed(data):
+                    if frame_type != FRAME_ACK:
+                        continue
+                    with self.lock:
+                        pending = self.pending.pop(seq, None)
+                    if pending:
+                        pending.resolve(json.loads(payload))
+        except (OSError, ProtocolError, ValueError) as e:
+            error = e
+
+        with self.lock:
+            self._fail_locked(sock, error)
+
+    def _fail_locked(self, sock: socket.socket, error: Exception):
+        """Drop a broken socket and fail every signal still waiting on it"""
+        if self.sock is sock:
+            self.sock = None
+        for seq, pending in list(self.pending.items()):
+            if pending.sock is sock:
+                del self.pending[seq]
+                pending.fail(error)
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def in_flight(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def close(self):
+        with self.lock:
+            if self.sock:
+                self._fail_locked(self.sock, ConnectionError("Connection closed"))
+
+
+class ReferenceReceiver:
+    """Python stand-in for the EA side of the framed protocol.
+
+    Acks every signal frame with its sequence ID. `ack_delay` and `reorder`
+    simulate a terminal that executes signals concurrently and answers out
+    of order.
+    """
+
+    def __init__(self, address, family=socket.AF_INET, ack_delay: float = 0.0,
+                 reorder: bool = False):
+        self.address = address
+        self.family = family
+        self.ack_delay = ack_delay
+        self.reorder = reorder
+        self.received = 0
+        self.server = None
+
+    def start(self):
+        self.server = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen(128)
+        self.address = self.server.getsockname()
+
+        thread = threading.Thread(target=self._accept_loop, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            thread = threading.Thread(target=self._serve, args=(conn,), daemon=True)
+            thread.start()
+
+    def _serve(self, conn: socket.socket):
+        reader = FrameReader()
+        send_lock = threading.Lock()
+
+        def ack(seq, signal):
+            delay = self.ack_delay * random.random() if self.reorder else self.ack_delay
+            if delay:
+                time.sleep(delay)
+            payload = json.dumps({
+                'status': 'ok',
+                'symbol': signal.get('symbol'),
+                'received_at': time.time()
+            }).encode('utf-8')
+            with send_lock:
+                try:
+                    conn.sendall(encode_frame(FRAME_ACK, seq, payload))
+                except OSError:
+                    pass
+
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    break
+                if not data:
+                    break
+                for frame_type, seq, payload in reader.feed(data):
+                    if frame_type != FRAME_SIGNAL:
+                        continue
+                    self.received += 1
+                    signal = json.loads(payload)
+                    if self.ack_delay:
+                        threading.Thread(target=ack, args=(seq, signal), daemon=True).start()
+                    else:
+                        ack(seq, signal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reference receiver for the framed MT protocol')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--unix', help='Listen on a Unix domain socket path instead of TCP')
+    parser.add_argument('--ack-delay', type=float, default=0.0, help='Seconds before each ack')
+    parser.add_argument('--reorder', action='store_true', help='Randomize ack delays so acks arrive out of order')
+    args = parser.parse_args()
+
+    if args.unix:
+        receiver = ReferenceReceiver(args.unix, socket.AF_UNIX, args.ack_delay, args.reorder)
+    else:
+        receiver = ReferenceReceiver((args.host, args.port), socket.AF_INET, args.ack_delay, args.reorder)
+    receiver.start()
+    print(f"Reference receiver listening on {receiver.address}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        receiver.stop()
+        print(f"\nReceived {receiver.received} signals")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - MetaTrader Transports
+Copyright 2024, AI Trading Team
+
+Pluggable transports used by the webhook servers to deliver signals to a
+MetaTrader terminal. TCP is the default; co-located terminals that share a
+volume with the webhook server can use a Unix domain socket or a FIFO pair
+instead, which skips the loopback TCP stack.
+
+Each terminal is described by a small dict, for example:
+
+    {'transport': 'tcp', 'host': 'localhost', 'port': 8081}
+    {'transport': 'unix', 'path': '/app/ipc/mt5.sock'}
+    {'transport': 'fifo', 'path': '/app/ipc/mt5.fifo'}
+
+A FIFO transport writes requests to `path` and reads the terminal's reply
+from `path + '.ack'`, one newline-terminated line per request. JSON requests
+get a `request_id`; a terminal that echoes it in the reply lets the transport
+skip late replies to requests that already timed out. Replies already waiting
+in the FIFO are discarded before each request either way.
+"""
+
+import itertools
+import json
+import os
+import select
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+
+class MTTransport:
+    """Base class for request/response transports to a MetaTrader terminal"""
+
+    name = 'base'
+
+    def __init__(self, timeout: float = 5):
+        self.timeout = timeout
+
+    def request(self, payload: bytes) -> bytes:
+        """Send one request and return the terminal's raw reply"""
+        raise NotImplementedError
+
+    def probe(self) -> bool:
+        """Check whether the terminal is accepting connections"""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class _StreamTransport(MTTransport):
+    """Shared logic for connection-oriented socket transports"""
+
+    family = None
+
+    def address(self):
+        raise NotImplementedError
+
+    def connect(self, timeout: Optional[float] = None) -> socket.socket:
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            sock.connect(self.address())
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def request(self, payload: bytes) -> bytes:
+        sock = self.connect()
+        try:
+            sock.sendall(payload)
+            return sock.recv(1024)
+        finally:
+            sock.close()
+
+    def probe(self) -> bool:
+        try:
+            self.connect().close()
+            return True
+        except OSError:
+            return False
+
+
+class TcpTransport(_StreamTransport):
+    """TCP transport, the historical default"""
+
+    name = 'tcp'
+    family = socket.AF_INET
+
+    def __init__(self, host: str = 'localhost', port: int = 8081, timeout: float = 5):
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+
+    def address(self):
+        return (self.host, self.port)
+
+    def connect(self, timeout: Optional[float] = None) -> socket.socket:
+        sock = super().connect(timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def describe(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+
+class UnixSocketTransport(_StreamTransport):
+    """Unix domain socket transport for terminals on the same host"""
+
+    name = 'unix'
+    family = getattr(socket, 'AF_UNIX', None)
+
+    def __init__(self, path: str, timeout: float = 5):
+        super().__init__(timeout)
+        if self.family is None:
+            raise ValueError("Unix domain sockets are not supported on this platform")
+        self.path = path
+
+    def address(self):
+        return self.path
+
+    def describe(self) -> str:
+        return f"unix://{self.path}"
+
+
+class FifoTransport(MTTransport):
+    """Named-pipe transport: requests go to `path`, replies come back on `path.ack`.
+
+    A FIFO is a single shared channel, so requests are serialized with a lock.
+    """
+    
+    name = 'fifo'
+    MAX_REPLY = 64 * 1024
+    
+    def __init__(self, path: str, ack_path: Optional[str] = None, timeout: float = 5):
+        super().__init__(timeout)
+        self.path = path
+        self.ack_path = ack_path or f"{path}.ack"
+        self.lock = threading.Lock()
+        self.ack_fd = None
+        self.buffer = b''  # Reply bytes read past the current line
+        self.request_ids = itertools.count(1)
+
+    def _open_ack(self) -> int:
+        # Kept open between requests so replies are never lost to a closed
+        # reader. O_RDWR (Linux) holds a write end too, so select() never
+        # reports a spurious EOF while the terminal has the pipe closed.
+        if self.ack_fd is None:
+            self.ack_fd = os.open(self.ack_path, os.O_RDWR | os.O_NONBLOCK)
+        return self.ack_fd
+
+    @staticmethod
+    def _tag(payload: bytes, request_id: int) -> bytes:
+        """Add a request_id to a JSON object request; other payloads go as they are"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return payload
+        if not isinstance(message, dict):
+            return payload
+        message['request_id'] = request_id
+        return (json.dumps(message) + '\n').encode('utf-8')
+    
+    @staticmethod
+    def _reply_id(line: bytes):
+        try:
+            reply = json.loads(line)
+        except ValueError:
+            return None
+        return reply.get('request_id') if isinstance(reply, dict) else None
+    
+    def _drain(self, ack_fd: int):
+        """Drop replies that arrived after their request timed out"""
+        self.buffer = b''
+        try:
+            while os.read(ack_fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+    
+    def _read_line(self, ack_fd: int, deadline: float) -> bytes:
+        while b'\n' not in self.buffer:
+            if len(self.buffer) > self.MAX_REPLY:
+                self.buffer = b''
+                raise OSError(f"FIFO reply exceeds {self.MAX_REPLY} bytes")
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise socket.timeout("Timed out waiting for FIFO reply")
+            readable, _, _ = select.select([ack_fd], [], [], remaining)
+            if readable:
+                try:
+                    self.buffer += os.read(ack_fd, 65536)
+                except BlockingIOError:
+                    pass
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line + b'\n'
+    
+    def request(self, payload: bytes) -> bytes:
+        with self.lock:
+            ack_fd = self._open_ack()
+            self._drain(ack_fd)
+            request_id = next(self.request_ids)
+            payload = self._tag(payload, request_id)
+            
+            # O_NONBLOCK makes open fail with ENXIO when no terminal is reading
+            fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            try:
+                os.set_blocking(fd, True)
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+            
+            deadline = time.time() + self.timeout
+            while True:
+                line = self._read_line(ack_fd, deadline)
+                reply_id = self._reply_id(line)
+                # Replies without an id are taken as is; the drain above
+                # already removed the stale ones that had arrived
+                if reply_id is None or reply_id == request_id:
+                    return line
+
+    def probe(self) -> bool:
+        try:
+            os.close(os.open(self.path, os.O_WRONLY | os.O_NONBLOCK))
+            return True
+        except OSError:
+            # ENXIO: nobody has the FIFO open for reading
+            return False
+
+    def describe(self) -> str:
+        return f"fifo://{self.path}"
+
+
+TRANSPORTS = {
+    'tcp': TcpTransport,
+    'unix': UnixSocketTransport,
+    'fifo': FifoTransport,
+}
+
+
+def create_transport(spec: Dict, timeout: float = 5) -> MTTransport:
+    """Build a transport from a terminal config dict"""
+    spec = dict(spec)
+    kind = spec.pop('transport', 'tcp')
+    spec.setdefault('timeout', timeout)
+
+    if kind not in TRANSPORTS:
+        raise ValueError(f"Unknown MT transport: {kind}")
+
+    return TRANSPORTS[kind](**spec)
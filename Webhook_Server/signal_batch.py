@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Batch Signal Parsing
+Copyright 2024, AI Trading Team
+
+Reads the body of `POST /webhook/batch` on both webhook servers. A batch
+is either a JSON array of signal objects:
+
+    [{"action": "BUY", "symbol": "EURUSD"}, {"action": "CLOSE", "symbol": "GBPUSD"}]
+
+or newline-delimited JSON, one signal object per line (blank lines are
+skipped):
+
+    {"action": "BUY", "symbol": "EURUSD"}
+    {"action": "CLOSE", "symbol": "GBPUSD"}
+
+A malformed NDJSON line only fails its own item. A malformed array fails
+the whole request, since its items cannot be told apart.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+MAX_BATCH_ITEMS = 500
+
+
+class BatchError(ValueError):
+    """Raised when a batch body cannot be read at all"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _entry(item) -> Tuple[Optional[Dict], Optional[str]]:
+    if isinstance(item, dict):
+        return item, None
+    return None, "Item is not a JSON object"
+
+
+def parse_batch(body: bytes, max_items: int = MAX_BATCH_ITEMS) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    """Split a batch body into one (signal, error) pair per item, in order"""
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise BatchError("Batch body is not UTF-8")
+
+    if text.lstrip().startswith('['):
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            raise BatchError(f"Invalid JSON array: {e}")
+        entries = [_entry(item) for item in items]
+    else:
+        entries = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(_entry(json.loads(line)))
+            except ValueError as e:
+                entries.append((None, f"Invalid JSON: {e}"))
+
+    if not entries:
+        raise BatchError("Empty batch")
+    if len(entries) > max_items:
+        raise BatchError(f"Batch has {len(entries)} items, the limit is {max_items}", 413)
+    return entries
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Alert-to-Execution Latency
+Copyright 2024, AI Trading Team
+
+Follows each signal from the moment the alert fired to its execution on
+the MetaTrader terminal. Up to five timestamps are kept per signal:
+
+    source      when the alert fired, from the payload's `source_time` or
+                `timenow` field (TradingView's {{timenow}} is ISO 8601 UTC;
+                epoch seconds or milliseconds also work)
+    received    when the webhook server got the request
+    dispatched  when the signal left the dispatch queue for the terminal
+    acked       when the terminal's reply arrived
+    executed    when the EA says it acted, from the reply's `executed_at`
+                (or `received_at`, which is all the reference receiver sends)
+
+and turned into latency segments in milliseconds:
+
+    transit   source -> received     alert platform and network
+    queue     received -> dispatched validation, netting and queueing
+    delivery  dispatched -> acked    round trip to the terminal
+    total     source -> executed     the whole slippage window (acked
+                                     when the terminal reports no time)
+
+Segments that start at `source` compare the alert platform's clock with
+ours. {{timenow}} has one-second resolution, so they are only as good as
+that and as NTP on this host; a negative transit means clock skew.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+SOURCE_TIME_FIELDS = ('source_time', 'timenow')  # Not `time`: {{time}} is the bar's open
+ACK_TIME_FIELDS = ('executed_at', 'received_at')
+
+# name, start stage, end stages in order of preference
+SEGMENTS = (
+    ('transit', 'source', ('received',)),
+    ('queue', 'received', ('dispatched',)),
+    ('delivery', 'dispatched', ('acked',)),
+    ('total', 'source', ('executed', 'acked')),
+)
+SEGMENT_NAMES = tuple(name for name, _, _ in SEGMENTS)
+DIMENSIONS = ('source', 'symbol', 'terminal')
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds from an ISO 8601 string or epoch seconds/milliseconds; None if unparseable"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            # Alert platforms send UTC; a naive timestamp is read as UTC too
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    if not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return value / 1000 if value > 1e11 else float(value)
+
+
+def source_time(payload: Dict) -> Optional[float]:
+    """When the alert fired, from the first parseable source time field"""
+    for field in SOURCE_TIME_FIELDS:
+        parsed = parse_timestamp(payload.get(field))
+        if parsed is not None:
+            return parsed
+    return None
+
+
+def parse_reply(raw) -> Dict:
+    """A terminal's line-protocol reply as a dict; {} when it is not JSON"""
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8', 'replace')
+    try:
+        reply = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    return reply if isinstance(reply, dict) else {}
+
+
+def _percentile(ordered, pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class SignalTimeline:
+    """Timestamps of one signal on its way from the alert to the terminal"""
+
+    __slots__ = ('source', 'symbol', 'terminal', 'times', 'delivered_via')
+
+    def __init__(self, source: str, symbol: str, terminal: str,
+                 source_time: Optional[float] = None, received: Optional[float] = None):
+        self.source = str(source or 'webhook')
+        self.symbol = str(symbol or '')
+        self.terminal = terminal
+        self.times = {
+            'source': source_time,
+            'received': received,
+            'dispatched': None,
+            'acked': None,
+            'executed': None
+        }
+        self.delivered_via = None
+
+    @classmethod
+    def from_signal(cls, signal: Dict, terminal: str) -> 'SignalTimeline':
+        """Timeline for a signal dict stamped with `received_at` by the server"""
+        return cls(signal.get('source'), signal.get('symbol'), terminal,
+                   source_time(signal), signal.get('received_at'))
+
+    def mark(self, stage: str, when: Optional[float] = None):
+        self.times[stage] = time.time() if when is None else when
+
+    def ack(self, reply: Dict):
+        """Record the terminal's reply and the execution time it reports, if any"""
+        self.mark('acked')
+        self.delivered_via = 'socket'
+        for field in ACK_TIME_FIELDS:
+            executed = parse_timestamp(reply.get(field))
+            if executed is not None:
+                self.times['executed'] = executed
+                break
+
+    def segments(self) -> Dict[str, float]:
+        """Latency segments in milliseconds; those missing an end are left out"""
+        result = {}
+        for name, start, ends in SEGMENTS:
+            begin = self.times[start]
+            end = next((self.times[stage] for stage in ends if self.times[stage] is not None), None)
+            if begin is not None and end is not None:
+                result[name] = round((end - begin) * 1000, 3)
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            'source': self.source,
+            'symbol': self.symbol,
+            'terminal': self.terminal,
+            'delivered_via': self.delivered_via,
+            'times': {stage: round(when, 6) if when is not None else None for stage, when in self.times.items()},
+            'latency_ms': self.segments()
+        }
+
+
+class LatencyTracker:
+    """Latency distributions per source, symbol and terminal.
+
+    Keeps the last `window` samples of each segment for every key, plus the
+    most recent timelines. With a `path`, every timeline is also appended
+    to it as one JSON line. Thread-safe.
+    """
+
+    MAX_KEYS = 200  # Distinct keys per dimension; later ones count as 'other'
+
+    def __init__(self, window: int = 1000, recent: int = 100, path: Optional[str] = None):
+        self.window = window
+        self.overall = self._new_samples()
+        self.by = {dimension: {} for dimension in DIMENSIONS}
+        self.recent = deque(maxlen=recent)
+        self.count = 0
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8') if path else None
+
+    def _new_samples(self) -> Dict[str, deque]:
+        return {name: deque(maxlen=self.window) for name in SEGMENT_NAMES}
+
+    def record(self, timeline: SignalTimeline) -> Dict[str, float]:
+        """Add a finished timeline; returns its segments"""
+        entry = timeline.to_dict()
+        segments = entry['latency_ms']
+
+        with self.lock:
+            self.count += 1
+            self.recent.append(entry)
+            groups = [self.overall]
+            for dimension in DIMENSIONS:
+                keys = self.by[dimension]
+                key = getattr(timeline, dimension)
+                if key not in keys and len(keys) >= self.MAX_KEYS:
+                    key = 'other'
+                if key not in keys:
+                    keys[key] = self._new_samples()
+                groups.append(keys[key])
+            for name, ms in segments.items():
+                for group in groups:
+                    group[name].append(ms)
+
+            if self.file:
+                self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                self.file.flush()
+
+        return segments
+
+    @staticmethod
+    def distribution(samples: Dict[str, deque]) -> Dict:
+        result = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            result[name] = {
+                'count': len(ordered),
+                'p50_ms': _percentile(ordered, 50),
+                'p95_ms': _percentile(ordered, 95),
+                'p99_ms': _percentile(ordered, 99),
+                'max_ms': ordered[-1]
+            }
+        return result
+
+    def summary(self, recent: int = 20) -> Dict:
+        """Distributions overall and per dimension, and the latest timelines"""
+        with self.lock:
+            result = {
+                'signals': self.count,
+                'window': self.window,
+                'overall': self.distribution(self.overall)
+            }
+            for dimension in DIMENSIONS:
+                result[f"by_{dimension}"] = {
+                    key: self.distribution(samples) for key, samples in self.by[dimension].items()
+                }
+            result['recent'] = list(self.recent)[-recent:] if recent > 0 else []
+        return result
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,147 @@
+"""
+Shared pytest setup for the webhook server and tunnel modules.
+
+The modules live next to this directory and import each other by plain
+name, the way the servers are run, so that directory goes on sys.path.
+"""
+
+import contextlib
+import json
+import os
+import socket
+import sys
+import threading
+
+import pytest
+import yaml
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_tunnel_server import TunnelConfig, TunnelServer  # noqa: E402
+from mt_protocol import FRAME_ACK, FRAME_SIGNAL, FrameReader, encode_frame  # noqa: E402
+from webhook_server import WebhookServer  # noqa: E402
+
+
+class RejectingReceiver:
+    """Framed terminal stand-in that acks every signal and refuses some symbols"""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.received = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = FrameReader()
+        with conn:
+            while True:
+                try:
+                    data = conn.recv(65536)
+                except OSError:
+                    break
+                if not data:
+                    break
+                for frame_type, seq, payload in reader.feed(data):
+                    if frame_type != FRAME_SIGNAL:
+                        continue
+                    signal = json.loads(payload)
+                    self.received.append(signal)
+                    status = 'rejected' if signal.get('symbol') in self.reject else 'ok'
+                    ack = json.dumps({'status': status, 'symbol': signal.get('symbol')}).encode('utf-8')
+                    conn.sendall(encode_frame(FRAME_ACK, seq, ack))
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def rejecting_receiver():
+    receiver = RejectingReceiver(reject={'BAD'})
+    yield receiver
+    receiver.close()
+
+
+@pytest.fixture
+def free_port():
+    """A local TCP port with nothing listening on it"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def make_server(tmp_path, monkeypatch):
+    """Build WebhookServers that write their signal file and log to tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    servers = []
+
+    def make(**kwargs):
+        server = WebhookServer(port=0, **kwargs)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.is_running = False
+        for worker in server.workers:
+            worker.join()
+        for connection in server.mt_connections.values():
+            connection.close()
+
+
+@pytest.fixture
+def run_tunnel(tmp_path):
+    """Async context manager running a TunnelServer behind an aiohttp TestClient.
+    
+    `sections` are merged over test defaults (no auth, no rate limit) and
+    `upstream` is an aiohttp handler serving every path of the local server.
+    Yields (client, tunnel).
+    """
+    @contextlib.asynccontextmanager
+    async def run(sections=None, upstream=None):
+        runner = None
+        local_port = 9  # Nothing listens there unless an upstream is given
+        if upstream is not None:
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', upstream)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            local_port = site._server.sockets[0].getsockname()[1]
+
+        config = {
+            'server': {'host': '127.0.0.1', 'workers': 1},
+            'tunnel': {'local_host': '127.0.0.1', 'local_port': local_port, 'auth_token': 'test-token'},
+            'security': {'allowed_ips': [], 'rate_limit': 10 ** 9, 'require_auth': False},
+            'logging': {'level': 'WARNING', 'file': str(tmp_path / 'tunnel_server.log')}
+        }
+        for section, values in (sections or {}).items():
+            config.setdefault(section, {}).update(values)
+        path = tmp_path / 'tunnel_config.yaml'
+        path.write_text(yaml.safe_dump(config))
+
+        tunnel = TunnelServer(TunnelConfig(str(path)))
+        client = TestClient(TestServer(tunnel.app))
+        await client.start_server()
+        try:
+            yield client, tunnel
+        finally:
+            await client.close()
+            if runner is not None:
+                await runner.cleanup()
+
+    return run
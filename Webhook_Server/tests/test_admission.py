@@ -0,0 +1,124 @@
+"""Admission control: concurrency cap with a bounded, deadline-aware wait queue"""
+
+import asyncio
+
+from aiohttp import web
+
+from custom_tunnel_server import AdmissionController
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def later(seconds=10.0):
+    return asyncio.get_running_loop().time() + seconds
+
+
+def test_requests_under_the_limit_are_admitted_at_once():
+    async def scenario():
+        admission = AdmissionController(limit=2)
+        results = [await admission.acquire(later()), await admission.acquire(later())]
+        return results, admission.stats()
+
+    results, stats = run(scenario)
+    assert results == [True, True]
+    assert (stats['in_flight'], stats['admitted'], stats['queued']) == (2, 2, 0)
+
+
+def test_released_slots_go_to_waiters_in_arrival_order():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_size=5, queue_timeout=5)
+        await admission.acquire(later())
+        order = []
+
+        async def wait(name):
+            await admission.acquire(later())
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in ('first', 'second')]
+        await asyncio.sleep(0.01)
+        waiting = len(admission.waiters)
+        admission.release()
+        await asyncio.sleep(0.01)
+        admission.release()
+        await asyncio.gather(*tasks)
+        return waiting, order, admission.stats()
+
+    waiting, order, stats = run(scenario)
+    assert waiting == 2
+    assert order == ['first', 'second']
+    # Each slot was handed over, never freed in between
+    assert (stats['in_flight'], stats['queued'], stats['admitted']) == (1, 2, 3)
+
+
+def test_waiters_are_shed_after_the_queue_timeout():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_size=5, queue_timeout=0.05)
+        await admission.acquire(later())
+        return await admission.acquire(later()), admission.stats()
+
+    admitted, stats = run(scenario)
+    assert not admitted
+    assert (stats['shed_timeout'], stats['waiting']) == (1, 0)
+
+
+def test_the_request_deadline_caps_the_wait():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_size=5, queue_timeout=10)
+        await admission.acquire(later())
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        admitted = await admission.acquire(later(0.05))
+        waited = loop.time() - started
+        expired = await admission.acquire(later(-1))
+        return admitted, waited, expired, admission.stats()
+
+    admitted, waited, expired, stats = run(scenario)
+    assert not admitted and waited < 1
+    assert not expired
+    assert (stats['shed_timeout'], stats['shed_queue_full']) == (1, 1)
+
+
+def test_a_full_queue_sheds_at_once():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_size=1, queue_timeout=5)
+        await admission.acquire(later())
+        waiter = asyncio.create_task(admission.acquire(later()))
+        await asyncio.sleep(0.01)
+        shed = await admission.acquire(later())
+        admission.release()
+        return shed, await waiter, admission.stats()
+
+    shed, admitted, stats = run(scenario)
+    assert not shed and admitted
+    assert stats['shed_queue_full'] == 1
+
+
+def test_a_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(limit=1, queue_size=5, queue_timeout=5)
+        await admission.acquire(later())
+        waiter = asyncio.create_task(admission.acquire(later()))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        waiting = len(admission.waiters)
+        admission.release()
+        return waiting, admission.in_flight
+
+    assert run(scenario) == (0, 0)
+
+
+def test_tunnel_sheds_past_the_limit_with_retry_after(run_tunnel):
+    async def upstream(request):
+        await asyncio.sleep(0.3)
+        return web.json_response({'status': 'ok'})
+
+    async def scenario():
+        sections = {'tunnel': {'max_connections': 1, 'queue_size': 0, 'queue_timeout': 3}}
+        async with run_tunnel(sections, upstream) as (client, tunnel):
+            responses = await asyncio.gather(*(client.post('/webhook', data=b'{}') for _ in range(2)))
+            return sorted((response.status, response.headers.get('Retry-After')) for response in responses)
+
+    assert run(scenario) == [(200, None), (503, '3')]
@@ -0,0 +1,152 @@
+"""Circuit breaker transitions for one upstream"""
+
+import asyncio
+
+from aiohttp import web
+
+from custom_tunnel_server import CircuitBreaker
+
+
+def make_breaker(**kwargs):
+    settings = dict(window=10, min_requests=4, failure_rate=0.5, slow_call_ms=1000,
+                    slow_call_rate=0.8, open_time=30, half_open_requests=2)
+    settings.update(kwargs)
+    return CircuitBreaker('127.0.0.1:5000', **settings)
+
+
+def record(breaker, outcomes, now, latency_ms=10.0):
+    for ok in outcomes:
+        breaker.record(ok, latency_ms, now)
+
+
+def open_breaker(breaker, now=0):
+    record(breaker, [False] * breaker.min_requests, now)
+    assert breaker.state == breaker.OPEN
+
+
+def test_stays_closed_below_min_requests():
+    breaker = make_breaker()
+    record(breaker, [False] * 3, now=0)
+
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allows(0)
+
+
+def test_opens_at_the_failure_rate():
+    breaker = make_breaker()
+    record(breaker, [True, True, True, False, False], now=0)
+    assert breaker.state == breaker.CLOSED  # 2 of 5
+
+    record(breaker, [False], now=0)
+
+    assert breaker.state == breaker.OPEN  # 3 of 6
+    assert breaker.opens == 1
+    assert not breaker.allows(29)
+    assert breaker.retry_after(20) == 10
+
+
+def test_opens_when_most_calls_are_slow():
+    breaker = make_breaker()
+    record(breaker, [True] * 4, now=0, latency_ms=1500)
+
+    assert breaker.state == breaker.OPEN
+    assert 'slower than' in breaker.transitions[-1]['reason']
+
+
+def test_unanswered_calls_count_as_slow():
+    breaker = make_breaker(failure_rate=1.0)
+    record(breaker, [True] * 4, now=0, latency_ms=None)
+
+    assert breaker.state == breaker.OPEN
+
+
+def test_old_outcomes_leave_the_window():
+    breaker = make_breaker()
+    record(breaker, [False, False, False], now=0)
+    record(breaker, [True], now=10)
+
+    assert breaker.state == breaker.CLOSED
+    assert (breaker.calls, breaker.failures) == (1, 0)
+
+
+def test_half_open_after_open_time_with_limited_probes():
+    breaker = make_breaker()
+    open_breaker(breaker)
+
+    assert not breaker.would_allow(29)
+    assert breaker.would_allow(30) and breaker.state == breaker.OPEN
+    assert breaker.allows(30)
+    assert breaker.state == breaker.HALF_OPEN
+    breaker.on_acquire()
+    breaker.on_acquire()
+    assert not breaker.allows(30)
+
+
+def test_successful_probes_close_the_breaker():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    breaker.allows(30)
+    for _ in range(2):
+        breaker.on_acquire()
+    record(breaker, [True], now=31)
+    assert breaker.state == breaker.HALF_OPEN
+
+    record(breaker, [True], now=31)
+
+    assert breaker.state == breaker.CLOSED
+    assert [transition['to'] for transition in breaker.transitions] == ['open', 'half_open', 'closed']
+
+
+def test_a_failed_or_slow_probe_reopens_it():
+    for outcome, latency_ms in [(False, 10.0), (True, 2000.0)]:
+        breaker = make_breaker()
+        open_breaker(breaker)
+        breaker.allows(30)
+        breaker.on_acquire()
+
+        breaker.record(outcome, latency_ms, 31)
+
+        assert breaker.state == breaker.OPEN
+        assert breaker.opens == 2
+        assert breaker.retry_after(31) == 30
+
+
+def test_outcomes_of_calls_sent_before_opening_are_ignored():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    record(breaker, [True] * 10, now=1)
+
+    assert breaker.state == breaker.OPEN
+    assert breaker.calls == 0
+
+
+def test_merged_view_reports_the_most_severe_state():
+    closed, opened = make_breaker(), make_breaker()
+    record(closed, [True, True], now=0)
+    open_breaker(opened)
+
+    merged = CircuitBreaker.merge({'1': closed.snapshot(0), '2': opened.snapshot(0)})
+
+    assert merged['state'] == 'open'
+    assert merged['worker_states'] == {'1': 'closed', '2': 'open'}
+    assert merged['opens'] == 1
+
+
+def test_open_breaker_answers_503_with_retry_after(run_tunnel):
+    async def upstream(request):
+        return web.Response(text='upstream broken', status=502)
+
+    async def scenario():
+        sections = {'circuit_breaker': {'min_requests': 2, 'open_time': 60}}
+        async with run_tunnel(sections, upstream) as (client, tunnel):
+            responses = []
+            for _ in range(3):
+                response = await client.post('/webhook', data=b'{}')
+                responses.append((response.status, response.headers.get('Retry-After')))
+            return responses
+
+    responses = asyncio.run(scenario())
+    assert responses[:2] == [(502, None)] * 2
+    status, retry_after = responses[2]
+    assert status == 503
+    assert 55 <= int(retry_after) <= 60
@@ -0,0 +1,205 @@
+"""Dispatch workers: priority lanes and draining the queue on shutdown"""
+
+import threading
+import time
+
+from webhook_server import EXIT_PRIORITY, PRIORITY_CLASSES, PriorityLanes
+
+
+def record_sends(server, delay=0.0):
+    """Replace delivery to the terminal with a list of (action, symbol) sends"""
+    sent = []
+    lock = threading.Lock()
+
+    def send_to_mt(signal, lane='general', timeline=None):
+        time.sleep(delay)
+        with lock:
+            sent.append((signal['action'], signal['symbol']))
+        return True
+
+    server.send_to_mt = send_to_mt
+    return sent
+
+
+def test_shutdown_delivers_an_open_netting_window(make_server):
+    server = make_server(netting_window=60)
+    sent = record_sends(server)
+    server.start_workers()
+
+    response = server.app.test_client().post('/webhook', json={'action': 'CLOSE_ALL', 'symbol': 'EURUSD'})
+    assert response.get_json()['message'] == "Signal buffered for netting"
+    server.shutdown(timeout=5)
+
+    assert sent == [('CLOSE_ALL', 'EURUSD')]
+    assert not any(worker.is_alive() for worker in server.workers)
+
+
+def test_shutdown_waits_for_queued_signals(make_server):
+    server = make_server()
+    sent = record_sends(server, delay=0.02)
+    server.start_workers()
+
+    for index in range(10):
+        server.enqueue_signal({'action': 'BUY', 'symbol': f"SYM{index}"})
+    server.shutdown(timeout=5)
+
+    assert len(sent) == 10
+    assert server.signal_queue.qsize() == 0
+
+
+def test_shutdown_gives_up_after_the_timeout(make_server):
+    server = make_server()
+    sent = record_sends(server, delay=0.2)
+    server.start_workers()
+
+    for index in range(10):
+        server.enqueue_signal({'action': 'BUY', 'symbol': f"SYM{index}"})
+    started = time.time()
+    server.shutdown(timeout=0.3)
+
+    assert time.time() - started < 2
+    assert len(sent) < 10
+    assert server.signal_queue.qsize() == 10 - len(sent)
+
+
+def test_no_new_signals_after_shutdown(make_server):
+    server = make_server()
+    server.start_workers()
+    server.shutdown(timeout=1)
+
+    client = server.app.test_client()
+    assert client.post('/webhook', json={'action': 'BUY', 'symbol': 'EURUSD'}).status_code == 503
+    assert client.post('/webhook/batch', json=[{'action': 'BUY', 'symbol': 'EURUSD'}]).status_code == 503
+
+
+def record_spans(server, delays):
+    """Replace delivery with a list of (action, symbol, started, finished) sends"""
+    spans = []
+    lock = threading.Lock()
+
+    def send_to_mt(signal, lane='general', timeline=None):
+        started = time.monotonic()
+        time.sleep(delays.get(signal['action'], 0.0))
+        with lock:
+            spans.append((signal['action'], signal['symbol'], started, time.monotonic()))
+        return True
+
+    server.send_to_mt = send_to_mt
+    return spans
+
+
+def wait_for(spans, count, timeout=5):
+    deadline = time.time() + timeout
+    while len(spans) < count and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(spans) == count
+
+
+def test_netted_entry_waits_for_the_close_all_before_it(make_server):
+    # Netting emits [CLOSE_ALL, BUY]; the reserved and general workers must not
+    # race them, or the CLOSE_ALL could close the position the BUY just opened
+    server = make_server(netting_window=60, dispatch_workers=2)
+    spans = record_spans(server, {'CLOSE_ALL': 0.1})
+    for action in ('BUY', 'CLOSE_ALL', 'BUY'):
+        server.netter.add({'action': action, 'symbol': 'EURUSD', 'lot_size': 0.1})
+    server.netter.flush('EURUSD')
+    server.start_workers()
+
+    wait_for(spans, 2)
+    (first, _, _, close_finished), (second, _, buy_started, _) = sorted(spans, key=lambda span: span[2])
+    assert (first, second) == ('CLOSE_ALL', 'BUY')
+    assert buy_started >= close_finished
+
+
+def test_one_symbol_is_never_sent_by_two_workers_at_once(make_server):
+    server = make_server(dispatch_workers=3)
+    spans = record_spans(server, {'BUY': 0.05, 'SELL': 0.05})
+    for action in ('BUY', 'SELL', 'BUY', 'SELL'):
+        server.enqueue_signal({'action': action, 'symbol': 'EURUSD'})
+    server.start_workers()
+
+    wait_for(spans, 4)
+    spans.sort(key=lambda span: span[2])
+    assert [span[0] for span in spans] == ['BUY', 'SELL', 'BUY', 'SELL']
+    assert all(later[2] >= earlier[3] for earlier, later in zip(spans, spans[1:]))
+
+
+def test_exits_still_overtake_other_symbols(make_server):
+    server = make_server(dispatch_workers=1)
+    spans = record_spans(server, {'BUY': 0.3})
+    server.enqueue_signal({'action': 'BUY', 'symbol': 'GBPUSD'})
+    server.start_workers()
+    time.sleep(0.05)
+    server.enqueue_signal({'action': 'CLOSE_ALL', 'symbol': 'EURUSD'})
+
+    wait_for(spans, 2)
+    assert [span[0] for span in spans] == ['CLOSE_ALL', 'BUY']
+
+
+def test_batch_keeps_a_symbols_signals_in_order(make_server):
+    server = make_server()
+    signals = [
+        {'action': 'BUY', 'symbol': 'EURUSD'},
+        {'action': 'CLOSE', 'symbol': 'GBPUSD'},
+        {'action': 'CLOSE_ALL', 'symbol': 'EURUSD'}
+    ]
+
+    items = server.enqueue_batch(signals)
+
+    # EURUSD's BUY rides with its CLOSE_ALL, ahead of it as in the batch
+    assert [item['indexes'] for item in items] == [[0, 2], [1]]
+    assert [signal['action'] for signal in items[0]['signals']] == ['BUY', 'CLOSE_ALL']
+
+
+def queue_item(action, symbol='EURUSD'):
+    return {'signal': {'action': action, 'symbol': symbol}, 'priority': PRIORITY_CLASSES[action],
+            'enqueued_at': time.time()}
+
+
+def test_lanes_hand_out_the_most_urgent_class_first():
+    lanes = PriorityLanes()
+    for action, symbol in [('BUY', 'A'), ('MODIFY', 'B'), ('SELL', 'C'), ('CLOSE', 'D'), ('CLOSE_ALL', 'E')]:
+        lanes.put(queue_item(action, symbol))
+
+    order = []
+    while lanes.qsize():
+        item = lanes.get(timeout=0)
+        order.append(item['signal']['symbol'])
+        lanes.done(item)
+
+    # Entries keep their arrival order within their class
+    assert order == ['E', 'D', 'B', 'A', 'C']
+    assert lanes.wait_summary()['entry']['count'] == 2
+
+
+def test_exit_only_workers_never_take_entries():
+    lanes = PriorityLanes()
+    lanes.put(queue_item('BUY'))
+
+    assert lanes.get(EXIT_PRIORITY, timeout=0.05) is None
+    assert lanes.sizes()['entry'] == 1
+
+
+def test_reserved_lane_sends_exits_while_the_general_lane_is_busy(make_server):
+    server = make_server(dispatch_workers=1)
+    sent = []
+
+    def send_to_mt(signal, lane='general', timeline=None):
+        time.sleep(0.5 if signal['action'] == 'BUY' else 0)
+        sent.append((signal['action'], lane, time.monotonic()))
+        return True
+
+    server.send_to_mt = send_to_mt
+    server.start_workers()
+    started = time.monotonic()
+    server.enqueue_signal({'action': 'BUY', 'symbol': 'GBPUSD'})
+    time.sleep(0.05)
+    server.enqueue_signal({'action': 'CLOSE', 'symbol': 'EURUSD'})
+
+    deadline = time.time() + 5
+    while len(sent) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    (first, first_lane, first_at), (second, second_lane, _) = sent
+    assert (first, first_lane) == ('CLOSE', 'reserved')
+    assert first_at - started < 0.3
+    assert (second, second_lane) == ('BUY', 'general')
@@ -0,0 +1,72 @@
+"""IP allowlist lookups against compiled CIDR intervals"""
+
+import pytest
+
+from custom_tunnel_server import IPRangeTable, parse_ip
+
+
+def test_single_addresses_and_cidr_ranges():
+    table = IPRangeTable(['52.89.214.238', '10.0.0.0/8', ' 192.168.1.0/24 '])
+
+    assert '52.89.214.238' in table
+    assert '52.89.214.239' not in table
+    assert '10.255.255.255' in table
+    assert '11.0.0.0' not in table
+    assert '192.168.1.77' in table
+    assert '192.168.2.1' not in table
+    assert len(table) == 3
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    table = IPRangeTable(['10.0.0.0/25', '10.0.0.128/25', '10.0.0.5', '10.0.1.0/24'])
+
+    assert table.starts[4] == [int.from_bytes(bytes([10, 0, 0, 0]), 'big')]
+    assert table.ends[4] == [int.from_bytes(bytes([10, 0, 1, 255]), 'big')]
+    assert '10.0.0.200' in table
+    assert '10.0.2.0' not in table
+    assert len(table) == 4
+
+
+def test_host_bits_in_a_range_are_ignored():
+    assert '172.16.5.9' in IPRangeTable(['172.16.5.1/24'])
+
+
+def test_ipv6_ranges():
+    table = IPRangeTable(['2001:db8::/32', '::1'])
+
+    assert '2001:db8:ffff::1' in table
+    assert '2001:db9::1' not in table
+    assert '::1' in table
+    assert 'fe80::1%eth0' not in table
+
+
+def test_ipv4_mapped_addresses_match_ipv4_entries():
+    table = IPRangeTable(['203.0.113.0/24'])
+
+    assert '::ffff:203.0.113.9' in table
+    assert '::ffff:198.51.100.1' not in table
+    assert parse_ip('::ffff:203.0.113.9') == parse_ip('203.0.113.9')
+
+
+def test_versions_do_not_cross():
+    table = IPRangeTable(['0.0.0.0/0'])
+
+    assert '8.8.8.8' in table
+    assert '2001:db8::1' not in table
+
+
+@pytest.mark.parametrize('address', ['', 'unknown', '300.1.1.1', '10.0.0.0/8'])
+def test_unparsable_addresses_are_not_allowed(address):
+    assert address not in IPRangeTable(['0.0.0.0/0', '::/0'])
+
+
+def test_empty_table_allows_nothing():
+    table = IPRangeTable()
+
+    assert len(table) == 0
+    assert '127.0.0.1' not in table
+
+
+def test_invalid_entry_fails_at_build_time():
+    with pytest.raises(ValueError):
+        IPRangeTable(['10.0.0.0/33'])
@@ -0,0 +1,91 @@
+"""Framed MetaTrader protocol: frame decoding and pipelined acks"""
+
+import threading
+
+import pytest
+
+from mt_protocol import (
+    FRAME_ACK, FRAME_HEADER, FRAME_SIGNAL, MAX_PAYLOAD, FramedConnection, FrameReader,
+    ProtocolError, ReferenceReceiver, encode_frame
+)
+from mt_transport import TcpTransport
+
+
+@pytest.fixture
+def receiver():
+    receiver = ReferenceReceiver(('127.0.0.1', 0), ack_delay=0.02, reorder=True).start()
+    yield receiver
+    receiver.stop()
+
+
+@pytest.fixture
+def connection(receiver):
+    connection = FramedConnection(TcpTransport('127.0.0.1', receiver.address[1]), timeout=5)
+    yield connection
+    connection.close()
+
+
+def test_frame_reader_reassembles_partial_reads():
+    data = encode_frame(FRAME_SIGNAL, 1, b'{"a":1}') + encode_frame(FRAME_ACK, 2, b'{}')
+    reader = FrameReader()
+
+    frames = []
+    for index in range(len(data)):
+        frames.extend(reader.feed(data[index:index + 1]))
+
+    assert frames == [(FRAME_SIGNAL, 1, b'{"a":1}'), (FRAME_ACK, 2, b'{}')]
+    assert not reader.buffer
+
+
+def test_frame_reader_rejects_oversized_length():
+    with pytest.raises(ProtocolError):
+        FrameReader().feed(FRAME_HEADER.pack(MAX_PAYLOAD + 1, 1, FRAME_SIGNAL))
+
+
+def test_encode_frame_rejects_oversized_payload():
+    with pytest.raises(ProtocolError):
+        encode_frame(FRAME_SIGNAL, 1, b'x' * (MAX_PAYLOAD + 1))
+
+
+def test_request_returns_ack_and_latency(connection):
+    ack, latency_ms = connection.request({'action': 'BUY', 'symbol': 'EURUSD'})
+
+    assert ack['status'] == 'ok'
+    assert ack['symbol'] == 'EURUSD'
+    assert latency_ms > 0
+    assert connection.in_flight() == 0
+
+
+def test_concurrent_requests_get_their_own_acks(connection):
+    # The receiver acks in random order; each sender must still get its own
+    symbols = [f"SYM{index}" for index in range(40)]
+    acks = {}
+
+    def send(symbol):
+        acks[symbol] = connection.request({'action': 'BUY', 'symbol': symbol})[0]
+
+    threads = [threading.Thread(target=send, args=(symbol,)) for symbol in symbols]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {symbol: ack['symbol'] for symbol, ack in acks.items()} == {symbol: symbol for symbol in symbols}
+
+
+def test_request_many_acks_every_signal(connection, receiver):
+    batch = connection.request_many([{'action': 'BUY', 'symbol': f"SYM{index}"} for index in range(10)])
+
+    assert [pending.ack['symbol'] for pending in batch] == [f"SYM{index}" for index in range(10)]
+    assert all(pending.error is None for pending in batch)
+    assert receiver.received == 10
+    assert connection.in_flight() == 0
+
+
+def test_request_reconnects_after_the_connection_drops(connection):
+    assert connection.request({'symbol': 'A'})[0]['symbol'] == 'A'
+    connection.close()
+
+    # Sequence IDs keep increasing on the new connection
+    assert connection.request({'symbol': 'B'})[0]['symbol'] == 'B'
+    assert connection.seq == 2
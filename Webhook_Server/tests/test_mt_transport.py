@@ -0,0 +1,157 @@
+"""MT transports: TCP, Unix domain socket and FIFO pair"""
+
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from mt_transport import FifoTransport, TcpTransport, UnixSocketTransport, create_transport
+
+
+class UnixTerminal:
+    """Line-protocol terminal stand-in listening on a Unix domain socket"""
+
+    def __init__(self, path):
+        self.received = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(4)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            with conn:
+                data = conn.recv(65536)
+                if not data:
+                    continue  # A probe
+                signal = json.loads(data)
+                self.received.append(signal)
+                conn.sendall(json.dumps({'status': 'ok', 'symbol': signal['symbol']}).encode('utf-8'))
+
+    def close(self):
+        self.server.close()
+
+
+class FifoTerminal:
+    """Terminal stand-in reading requests from a FIFO and replying on its .ack FIFO.
+
+    `replies(request)` returns the lines written back for one request, so a
+    test can send stale or id-less replies.
+    """
+
+    def __init__(self, path, replies):
+        os.mkfifo(path)
+        os.mkfifo(path + '.ack')
+        self.path = path
+        self.replies = replies
+        self.received = []
+        self.ready = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+        self.ready.wait(5)
+
+    def _serve(self):
+        # O_RDWR keeps the request FIFO open while no request is being written
+        requests = os.fdopen(os.open(self.path, os.O_RDWR), 'rb')
+        acks = os.open(self.path + '.ack', os.O_RDWR)
+        self.ready.set()
+        for line in requests:
+            request = json.loads(line)
+            self.received.append(request)
+            for reply in self.replies(request):
+                os.write(acks, (json.dumps(reply) + '\n').encode('utf-8'))
+
+
+def test_create_transport_builds_each_kind(tmp_path):
+    tcp = create_transport({'host': '127.0.0.1', 'port': 9000})
+    unix = create_transport({'transport': 'unix', 'path': str(tmp_path / 'mt.sock')}, timeout=2)
+    fifo = create_transport({'transport': 'fifo', 'path': str(tmp_path / 'mt.fifo'), 'timeout': 1})
+
+    assert isinstance(tcp, TcpTransport) and tcp.describe() == 'tcp://127.0.0.1:9000'
+    assert isinstance(unix, UnixSocketTransport) and unix.timeout == 2
+    assert isinstance(fifo, FifoTransport) and fifo.ack_path == str(tmp_path / 'mt.fifo.ack')
+    assert fifo.timeout == 1
+
+
+def test_unknown_transport_is_rejected():
+    with pytest.raises(ValueError):
+        create_transport({'transport': 'carrier-pigeon'})
+
+
+def test_unix_socket_round_trip(tmp_path):
+    path = str(tmp_path / 'mt.sock')
+    transport = UnixSocketTransport(path, timeout=2)
+    assert not transport.probe()
+
+    terminal = UnixTerminal(path)
+    try:
+        assert transport.probe()
+        reply = transport.request(b'{"action": "BUY", "symbol": "EURUSD"}\n')
+    finally:
+        terminal.close()
+
+    assert json.loads(reply) == {'status': 'ok', 'symbol': 'EURUSD'}
+    assert {'action': 'BUY', 'symbol': 'EURUSD'} in terminal.received
+
+
+def test_webhook_server_delivers_over_a_unix_socket(make_server, tmp_path):
+    path = str(tmp_path / 'mt.sock')
+    terminal = UnixTerminal(path)
+    server = make_server(mt_transport={'transport': 'unix', 'path': path})
+    try:
+        assert server.send_to_mt({'action': 'CLOSE', 'symbol': 'GBPUSD'})
+    finally:
+        terminal.close()
+
+    assert terminal.received == [{'action': 'CLOSE', 'symbol': 'GBPUSD'}]
+    assert not (tmp_path / 'mt_signals.json').exists()
+
+
+def test_fifo_requests_carry_an_id_the_reply_is_matched_on(tmp_path):
+    path = str(tmp_path / 'mt.fifo')
+    terminal = FifoTerminal(path, lambda request: [
+        {'status': 'ok', 'request_id': request['request_id'] + 100},  # Late reply to someone else
+        {'status': 'ok', 'request_id': request['request_id'], 'symbol': request['symbol']}
+    ])
+    transport = FifoTransport(path, timeout=2)
+
+    first = json.loads(transport.request(b'{"action": "BUY", "symbol": "EURUSD"}\n'))
+    second = json.loads(transport.request(b'{"action": "SELL", "symbol": "GBPUSD"}\n'))
+
+    assert [request['request_id'] for request in terminal.received] == [1, 2]
+    assert (first['request_id'], first['symbol']) == (1, 'EURUSD')
+    assert (second['request_id'], second['symbol']) == (2, 'GBPUSD')
+
+
+def test_fifo_replies_without_an_id_are_taken_as_is(tmp_path):
+    path = str(tmp_path / 'mt.fifo')
+    FifoTerminal(path, lambda request: [{'status': 'ok'}])
+    transport = FifoTransport(path, timeout=2)
+
+    assert json.loads(transport.request(b'{"action": "BUY", "symbol": "EURUSD"}\n')) == {'status': 'ok'}
+
+
+def test_fifo_times_out_without_a_reply(tmp_path):
+    path = str(tmp_path / 'mt.fifo')
+    FifoTerminal(path, lambda request: [])
+    transport = FifoTransport(path, timeout=0.2)
+
+    assert transport.probe()
+    with pytest.raises(socket.timeout):
+        transport.request(b'{"action": "BUY", "symbol": "EURUSD"}\n')
+
+
+def test_fifo_without_a_reader_fails_fast(tmp_path):
+    path = str(tmp_path / 'mt.fifo')
+    os.mkfifo(path)
+    os.mkfifo(path + '.ack')
+    transport = FifoTransport(path, timeout=2)
+
+    assert not transport.probe()
+    with pytest.raises(OSError):
+        transport.request(b'{"action": "BUY", "symbol": "EURUSD"}\n')
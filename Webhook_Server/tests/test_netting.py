@@ -0,0 +1,112 @@
+"""Signal netting: collapsing a symbol's window into its net effect"""
+
+import pytest
+
+from webhook_server import SignalNetter
+
+
+def collapse(*signals, default_lot=0.1):
+    netter = SignalNetter(60, lambda signal: None, default_lot=default_lot)
+    return netter.collapse([dict(signal, symbol='EURUSD') for signal in signals])
+
+
+def test_same_side_entries_are_summed():
+    netted = collapse({'action': 'BUY', 'lot_size': 0.1}, {'action': 'BUY', 'lot_size': 0.25})
+
+    assert [(signal['action'], signal['lot_size']) for signal in netted] == [('BUY', 0.35)]
+    assert netted[0]['netted_from'] == 2
+
+
+def test_opposite_sides_cancel():
+    assert collapse({'action': 'BUY', 'lot_size': 0.3}, {'action': 'SELL', 'lot_size': 0.3}) == []
+
+
+def test_opposite_sides_leave_the_difference():
+    netted = collapse({'action': 'BUY', 'lot_size': 0.1}, {'action': 'SELL', 'lot_size': 0.4})
+
+    assert [(signal['action'], signal['lot_size']) for signal in netted] == [('SELL', 0.3)]
+
+
+def test_entries_without_a_lot_size_use_the_default():
+    netted = collapse({'action': 'BUY'}, {'action': 'BUY', 'lot_size': 0.5}, default_lot=0.2)
+
+    assert netted[0]['lot_size'] == 0.7
+
+
+def test_close_drops_the_entries_before_it():
+    netted = collapse(
+        {'action': 'BUY', 'lot_size': 0.1},
+        {'action': 'MODIFY', 'sl': 1.05},
+        {'action': 'CLOSE'},
+        {'action': 'SELL', 'lot_size': 0.2}
+    )
+
+    assert [(signal['action'], signal.get('lot_size')) for signal in netted] == [('CLOSE', None), ('SELL', 0.2)]
+
+
+def test_close_all_outranks_a_close_on_either_side():
+    before = collapse({'action': 'CLOSE'}, {'action': 'CLOSE_ALL'}, {'action': 'BUY', 'lot_size': 0.1})
+    after = collapse({'action': 'CLOSE_ALL'}, {'action': 'CLOSE'})
+
+    assert [signal['action'] for signal in before] == ['CLOSE_ALL', 'BUY']
+    assert [signal['action'] for signal in after] == ['CLOSE_ALL']
+
+
+def test_only_the_latest_modify_survives():
+    netted = collapse({'action': 'MODIFY', 'sl': 1.05}, {'action': 'MODIFY', 'sl': 1.06})
+
+    assert netted == [{'action': 'MODIFY', 'sl': 1.06, 'symbol': 'EURUSD'}]
+
+
+def test_flush_dispatches_each_symbol_separately():
+    dispatched = []
+    netter = SignalNetter(60, dispatched.append)
+    netter.add({'action': 'BUY', 'symbol': 'EURUSD', 'lot_size': 0.1})
+    netter.add({'action': 'SELL', 'symbol': 'GBPUSD', 'lot_size': 0.1})
+    netter.add({'action': 'SELL', 'symbol': 'EURUSD', 'lot_size': 0.1})
+
+    netter.flush('EURUSD')
+    assert dispatched == []
+    netter.flush_all()
+
+    assert [(signal['action'], signal['symbol']) for signal in dispatched] == [('SELL', 'GBPUSD')]
+    assert netter.stats == {'received': 3, 'dispatched': 1, 'netted_out': 2}
+
+
+def test_a_window_that_cannot_be_netted_is_sent_as_is():
+    dispatched = []
+    netter = SignalNetter(60, dispatched.append)
+    window = [
+        {'action': 'CLOSE_ALL', 'symbol': 'EURUSD'},
+        {'action': 'BUY', 'symbol': 'EURUSD', 'lot_size': 'lots'}
+    ]
+    for signal in window:
+        netter.add(signal)
+
+    netter.flush('EURUSD')
+
+    assert dispatched == window
+    assert netter.buffers == {}
+
+
+@pytest.mark.parametrize('lot_size', ['lots', None, [0.1], 0, -0.1, 'nan', 'inf'])
+def test_bad_lot_sizes_are_rejected_before_netting(make_server, lot_size):
+    server = make_server(netting_window=60)
+
+    response = server.app.test_client().post(
+        '/webhook', json={'action': 'BUY', 'symbol': 'EURUSD', 'lot_size': lot_size}
+    )
+
+    assert response.status_code == 400
+    assert server.netter.buffers == {}
+
+
+def test_numeric_strings_are_valid_lot_sizes(make_server):
+    server = make_server(netting_window=60)
+
+    response = server.app.test_client().post(
+        '/webhook', json={'action': 'BUY', 'symbol': 'EURUSD', 'lot_size': '0.2'}
+    )
+
+    assert response.status_code == 200
+    assert server.netter.collapse(server.netter.buffers['EURUSD'])[0]['lot_size'] == 0.2
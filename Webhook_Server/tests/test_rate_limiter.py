@@ -0,0 +1,96 @@
+"""Sliding-window-counter rate limiting per client"""
+
+from custom_tunnel_server import SlidingWindowRateLimiter
+
+
+def allowed(limiter, key, count, now):
+    return sum(limiter.allow(key, now) for _ in range(count))
+
+
+def test_limit_within_one_window():
+    limiter = SlidingWindowRateLimiter(limit=10, window=100)
+
+    assert allowed(limiter, 'a', 15, now=0) == 10
+    assert limiter.is_limited('a', now=50)
+    assert not limiter.is_limited('b', now=50)
+
+
+def test_previous_window_counts_by_its_overlap():
+    limiter = SlidingWindowRateLimiter(limit=10, window=100)
+    allowed(limiter, 'a', 10, now=0)
+
+    # Halfway into the next window half of the previous 10 still counts
+    assert allowed(limiter, 'a', 10, now=150) == 5
+    # Near its end only a tenth does: 10 * 0.1 + 5 = 6, so four more fit
+    assert allowed(limiter, 'a', 10, now=190) == 4
+
+
+def test_counts_reset_after_a_full_idle_window():
+    limiter = SlidingWindowRateLimiter(limit=10, window=100)
+    allowed(limiter, 'a', 10, now=0)
+
+    assert allowed(limiter, 'a', 15, now=250) == 10
+
+
+def test_clients_are_limited_separately():
+    limiter = SlidingWindowRateLimiter(limit=2, window=100)
+
+    assert allowed(limiter, 'a', 3, now=0) == 2
+    assert allowed(limiter, 'b', 3, now=0) == 2
+
+
+def test_first_rejection_is_reported_once_per_window():
+    limiter = SlidingWindowRateLimiter(limit=1, window=100)
+    limiter.allow('a', now=0)
+
+    firsts = []
+    for now in (1, 2, 3):
+        limiter.allow('a', now=now)
+        firsts.append(limiter.is_first_rejection('a'))
+    limiter.allow('a', now=201)
+    limiter.allow('a', now=202)
+
+    assert firsts == [True, False, False]
+    assert limiter.is_first_rejection('a')
+
+
+def test_least_recently_seen_client_is_evicted_at_capacity():
+    limiter = SlidingWindowRateLimiter(limit=10, window=100, max_clients=2)
+    limiter.allow('a', now=0)
+    limiter.allow('b', now=1)
+    limiter.allow('a', now=2)
+    limiter.allow('c', now=3)
+
+    assert list(limiter.clients) == ['a', 'c']
+    assert limiter.evicted == 1
+
+
+def test_idle_clients_are_evicted_after_two_windows():
+    limiter = SlidingWindowRateLimiter(limit=10, window=100)
+    limiter.allow('a', now=0)
+    limiter.allow('b', now=50)
+    limiter.allow('c', now=150)
+
+    assert limiter.evict_idle(now=210) == 1
+    assert list(limiter.clients) == ['b', 'c']
+    assert limiter.stats()['evicted_clients'] == 1
+
+
+def test_remote_counts_are_recorded_without_a_check():
+    limiter = SlidingWindowRateLimiter(limit=5, window=100)
+    limiter.record('a', allowed=7, rejected=2, now=0)
+
+    assert limiter.is_limited('a', now=1)
+    assert limiter.clients['a'].rejected == 2
+
+
+def test_top_offenders_are_ranked_by_rejections():
+    limiter = SlidingWindowRateLimiter(limit=1, window=100)
+    for key, requests in [('a', 3), ('b', 6), ('c', 1), ('d', 4)]:
+        allowed(limiter, key, requests, now=0)
+
+    offenders = limiter.top_offenders(2, now=10)
+
+    assert [(offender['ip'], offender['rejected']) for offender in offenders] == [('b', 5), ('d', 3)]
+    assert offenders[0]['current_rate'] == 1
+    assert [offender['ip'] for offender in limiter.top_offenders(10, now=10)] == ['b', 'd', 'a']
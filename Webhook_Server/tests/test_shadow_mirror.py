@@ -0,0 +1,100 @@
+"""Shadow mirroring: sampling, the bounded queue and the comparison report"""
+
+import asyncio
+import random
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+from custom_tunnel_server import ShadowMirror
+
+
+def sampled(mirror, requests=1000):
+    mirror.queue = asyncio.Queue(mirror.queue_size)
+    return sum(mirror.sample() for _ in range(requests))
+
+
+def test_sample_rate_bounds():
+    assert sampled(ShadowMirror('127.0.0.1:6000', sample_rate=0.0)) == 0
+    assert sampled(ShadowMirror('127.0.0.1:6000', sample_rate=1.0)) == 1000
+
+
+def test_partial_sample_rate():
+    random.seed(7)
+    mirror = ShadowMirror('127.0.0.1:6000', sample_rate=0.25)
+
+    count = sampled(mirror)
+
+    assert 200 <= count <= 300
+    assert mirror.counters['sampled'] == count
+
+
+def test_nothing_is_sampled_before_start():
+    mirror = ShadowMirror('127.0.0.1:6000')
+
+    assert not mirror.sample()
+    assert mirror.counters['sampled'] == 0
+
+
+def test_copies_beyond_the_queue_are_dropped():
+    mirror = ShadowMirror('127.0.0.1:6000', queue_size=2)
+    mirror.queue = asyncio.Queue(mirror.queue_size)
+
+    for _ in range(5):
+        mirror.offer('POST', '/webhook', CIMultiDict(), b'{}', 200, 1.0)
+
+    assert mirror.queue.qsize() == 2
+    assert mirror.counters['dropped'] == 3
+    assert mirror.to_dict()['counters']['queued'] == 2
+
+
+def test_summary_merges_workers():
+    first, second = ShadowMirror('127.0.0.1:6000'), ShadowMirror('127.0.0.1:6000')
+    first.counters.update(mirrored=3, status_match=3)
+    second.counters.update(mirrored=1, status_mismatch=1)
+    second.mismatches['200->500'] = 1
+
+    summary = ShadowMirror.summarize([first.to_dict(), second.to_dict()])
+
+    assert (summary['mirrored'], summary['status_match_rate']) == (4, 0.75)
+    assert summary['status_mismatches'] == {'200->500': 1}
+
+
+def test_tunnel_mirrors_requests_and_compares_statuses(run_tunnel):
+    mirrored = []
+
+    async def primary(request):
+        return web.json_response({'status': 'ok'})
+
+    async def staging(request):
+        mirrored.append((request.path, request.headers.get('X-DodoHook-Mirror'), await request.read()))
+        return web.Response(status=500 if request.path == '/webhook/n8n' else 200)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', staging)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            sections = {'mirror': {'upstream': f"127.0.0.1:{port}", 'sample_rate': 1.0}}
+            async with run_tunnel(sections, primary) as (client, tunnel):
+                statuses = []
+                for path in ('/webhook', '/webhook/n8n'):
+                    response = await client.post(path, data=b'{"action": "BUY"}')
+                    statuses.append(response.status)
+                for _ in range(100):
+                    if tunnel.mirror.counters['mirrored'] == 2:
+                        break
+                    await asyncio.sleep(0.02)
+                return statuses, ShadowMirror.summarize([tunnel.mirror.to_dict()])
+        finally:
+            await runner.cleanup()
+
+    statuses, summary = asyncio.run(scenario())
+    assert statuses == [200, 200]
+    assert sorted(mirrored) == [('/webhook', '1', b'{"action": "BUY"}'), ('/webhook/n8n', '1', b'{"action": "BUY"}')]
+    assert (summary['sampled'], summary['mirrored'], summary['status_match']) == (2, 2, 1)
+    assert summary['status_mismatches'] == {'200->500': 1}
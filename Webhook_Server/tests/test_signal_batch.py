@@ -0,0 +1,95 @@
+"""Batch signal parsing and per-class queueing"""
+
+import pytest
+
+from signal_batch import BatchError, parse_batch
+from webhook_server import ENTRY_PRIORITY, EXIT_PRIORITY, PRIORITY_CLASSES, WebhookServer
+
+
+def test_array_batch_keeps_item_order():
+    entries = parse_batch(b'[{"action": "BUY", "symbol": "EURUSD"}, {"action": "CLOSE", "symbol": "GBPUSD"}]')
+
+    assert entries == [
+        ({'action': 'BUY', 'symbol': 'EURUSD'}, None),
+        ({'action': 'CLOSE', 'symbol': 'GBPUSD'}, None)
+    ]
+
+
+def test_ndjson_bad_line_only_fails_its_item():
+    body = b'{"action": "BUY", "symbol": "EURUSD"}\n\n{not json}\n{"action": "SELL", "symbol": "USDJPY"}\n'
+
+    entries = parse_batch(body)
+
+    assert [signal for signal, _ in entries] == [
+        {'action': 'BUY', 'symbol': 'EURUSD'}, None, {'action': 'SELL', 'symbol': 'USDJPY'}
+    ]
+    assert entries[1][1].startswith('Invalid JSON')
+
+
+def test_non_object_items_are_errors():
+    entries = parse_batch(b'[{"action": "BUY", "symbol": "EURUSD"}, 42, "CLOSE"]')
+
+    assert [error for _, error in entries] == [None, "Item is not a JSON object", "Item is not a JSON object"]
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'[{"action": "BUY"}, {', 'Invalid JSON array'),
+    (b'', 'Empty batch'),
+    (b' \n\n ', 'Empty batch'),
+    (b'[]', 'Empty batch'),
+    (b'\xff\xfe{}', 'not UTF-8')
+])
+def test_unreadable_batch_is_a_400(body, message):
+    with pytest.raises(BatchError, match=message) as excinfo:
+        parse_batch(body)
+
+    assert excinfo.value.status == 400
+
+
+def test_oversized_batch_is_a_413():
+    body = b'\n'.join([b'{"action": "BUY", "symbol": "EURUSD"}'] * 4)
+
+    with pytest.raises(BatchError) as excinfo:
+        parse_batch(body, max_items=3)
+
+    assert excinfo.value.status == 413
+    assert len(parse_batch(body, max_items=4)) == 4
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return WebhookServer(port=0)
+
+
+@pytest.mark.parametrize('signal', [
+    {'action': ['BUY'], 'symbol': 'EURUSD'},
+    {'action': 'BUY', 'symbol': {'name': 'EURUSD'}},
+    {'action': 'HOLD', 'symbol': 'EURUSD'},
+    {'action': 'BUY', 'symbol': 'EURUSD', 'lot_size': 'nan'},
+    {'symbol': 'EURUSD'},
+    ['BUY', 'EURUSD']
+])
+def test_validate_signal_rejects_malformed_signals(server, signal):
+    assert server.validate_signal(signal) is False
+
+
+def test_mixed_batch_is_queued_per_priority_class(server):
+    signals = [
+        {'action': 'BUY', 'symbol': 'EURUSD'},
+        {'action': 'CLOSE', 'symbol': 'GBPUSD'},
+        {'action': 'SELL', 'symbol': 'USDJPY'},
+        {'action': 'MODIFY', 'symbol': 'AUDUSD'}
+    ]
+
+    items = server.enqueue_batch(signals)
+
+    assert [item['priority'] for item in items] == [PRIORITY_CLASSES['CLOSE'], EXIT_PRIORITY, ENTRY_PRIORITY]
+    assert [item['indexes'] for item in items] == [[1], [3], [0, 2]]
+    assert items[2]['signals'] == [signals[0], signals[2]]
+
+    # The reserved exit lane takes the exits and leaves the entries queued
+    assert server.signal_queue.get(max_priority=EXIT_PRIORITY, timeout=0) is items[0]
+    assert server.signal_queue.get(max_priority=EXIT_PRIORITY, timeout=0) is items[1]
+    assert server.signal_queue.get(max_priority=EXIT_PRIORITY, timeout=0) is None
+    assert server.signal_queue.get(timeout=0) is items[2]
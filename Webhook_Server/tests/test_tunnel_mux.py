@@ -0,0 +1,189 @@
+"""Reverse-tunnel stream multiplexing and the agent's handling of early responses"""
+
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from tunnel_agent import TunnelAgent
+from tunnel_mux import FRAME_RESPONSE, Multiplexer, StreamReset
+
+
+async def connect(on_open, window=64 * 1024):
+    """A server-side and an agent-side multiplexer joined by in-memory pipes"""
+    pipes = {'to_agent': asyncio.Queue(), 'to_server': asyncio.Queue()}
+    server = Multiplexer(pipes['to_agent'].put, window=window)
+    agent = Multiplexer(pipes['to_server'].put, on_open=on_open, first_stream_id=2, window=window)
+
+    async def pump(queue, mux):
+        while True:
+            await mux.feed(await queue.get())
+
+    pumps = [
+        asyncio.create_task(pump(pipes['to_agent'], agent)),
+        asyncio.create_task(pump(pipes['to_server'], server))
+    ]
+    return server, agent, pumps
+
+
+async def disconnect(server, agent, pumps):
+    for task in pumps:
+        task.cancel()
+    await asyncio.gather(*pumps, return_exceptions=True)
+    server.close()
+    agent.close()
+
+
+async def echo(stream, head):
+    body = b''.join([chunk async for chunk in stream.chunks()])
+    await stream.send_head(FRAME_RESPONSE, {'status': 200, 'headers': [['X-Path', head['path']]]})
+    await stream.write(body)
+    await stream.end()
+
+
+def test_request_and_response_round_trip():
+    async def scenario():
+        server, agent, pumps = await connect(echo)
+        try:
+            stream = await server.open_stream({'method': 'POST', 'path': '/webhook', 'has_body': True})
+            await stream.write(b'{"action": "BUY"}')
+            await stream.end()
+            head = await asyncio.wait_for(stream.head, 5)
+            body = b''.join([chunk async for chunk in stream.chunks()])
+            return head, body, server.snapshot(), agent.snapshot()
+        finally:
+            await disconnect(server, agent, pumps)
+
+    head, body, server_stats, agent_stats = asyncio.run(scenario())
+    assert head['status'] == 200
+    assert head['headers'] == [['X-Path', '/webhook']]
+    assert body == b'{"action": "BUY"}'
+    assert server_stats['streams_active'] == 0
+    assert agent_stats['streams_active'] == 0
+
+
+def test_body_larger_than_the_window_is_flow_controlled():
+    window = 4096
+    peaks = []
+
+    async def slow_reader(stream, head):
+        received = 0
+        while True:
+            peaks.append(stream.buffered)
+            chunk = await stream.read()
+            if not chunk:
+                break
+            received += len(chunk)
+            await asyncio.sleep(0)
+        await stream.send_head(FRAME_RESPONSE, {'status': 200, 'headers': []})
+        await stream.write(str(received).encode())
+        await stream.end()
+
+    async def scenario():
+        server, agent, pumps = await connect(slow_reader, window=window)
+        try:
+            stream = await server.open_stream({'method': 'POST', 'path': '/', 'has_body': True})
+            await asyncio.wait_for(stream.write(b'x' * (window * 20)), 5)
+            await stream.end()
+            await asyncio.wait_for(stream.head, 5)
+            return b''.join([chunk async for chunk in stream.chunks()])
+        finally:
+            await disconnect(server, agent, pumps)
+
+    assert asyncio.run(scenario()) == str(window * 20).encode()
+    assert max(peaks) <= window
+
+
+def test_handler_error_resets_the_stream():
+    async def broken(stream, head):
+        raise RuntimeError('local server exploded')
+
+    async def scenario():
+        server, agent, pumps = await connect(broken)
+        try:
+            stream = await server.open_stream({'method': 'GET', 'path': '/', 'has_body': False})
+            await stream.end()
+            with pytest.raises(StreamReset, match='exploded'):
+                await asyncio.wait_for(stream.head, 5)
+            return server.snapshot()
+        finally:
+            await disconnect(server, agent, pumps)
+
+    assert asyncio.run(scenario())['streams_active'] == 0
+
+
+def test_reset_unblocks_a_writer_waiting_for_window():
+    # A peer that never reads grants no credit; its reset must free the writer
+    async def ignore_body(stream, head):
+        await asyncio.sleep(0.05)
+        await stream.reset('not reading')
+
+    async def scenario():
+        server, agent, pumps = await connect(ignore_body, window=1024)
+        try:
+            stream = await server.open_stream({'method': 'POST', 'path': '/', 'has_body': True})
+            with pytest.raises(StreamReset):
+                await asyncio.wait_for(stream.write(b'x' * 10000), 5)
+        finally:
+            await disconnect(server, agent, pumps)
+
+    asyncio.run(scenario())
+
+
+def test_close_fails_open_streams():
+    async def never_answer(stream, head):
+        await asyncio.sleep(60)
+
+    async def scenario():
+        server, agent, pumps = await connect(never_answer)
+        try:
+            stream = await server.open_stream({'method': 'GET', 'path': '/', 'has_body': False})
+            server.close('agent went away')
+            with pytest.raises(StreamReset, match='agent went away'):
+                await stream.head
+            with pytest.raises(StreamReset):
+                await stream.write(b'late')
+        finally:
+            await disconnect(server, agent, pumps)
+
+    asyncio.run(scenario())
+
+
+def test_agent_resets_a_stream_answered_before_its_body_was_read():
+    # The local server refuses the body at 1 KB; the tunnel side must learn
+    # that the rest will never be read instead of waiting for window credit
+    async def scenario():
+        app = web.Application(client_max_size=1024)
+
+        async def handler(request):
+            return web.json_response({'size': len(await request.read())})
+
+        app.router.add_post('/{tail:.*}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        tunnel_agent = TunnelAgent('http://unused', 'token', f"http://127.0.0.1:{port}")
+        tunnel_agent.session = aiohttp.ClientSession()
+        server, agent, pumps = await connect(tunnel_agent.handle_stream, window=16 * 1024)
+        try:
+            stream = await server.open_stream({
+                'method': 'POST', 'path': '/webhook', 'has_body': True,
+                'headers': [['Content-Length', str(256 * 1024)]], 'timeout': 5
+            })
+            writer = asyncio.create_task(stream.write(b'x' * (256 * 1024)))
+            head = await asyncio.wait_for(stream.head, 5)
+            await asyncio.wait_for(asyncio.gather(writer, return_exceptions=True), 5)
+            return head['status'], writer.exception(), agent.snapshot()
+        finally:
+            await disconnect(server, agent, pumps)
+            await tunnel_agent.session.close()
+            await runner.cleanup()
+
+    status, error, agent_stats = asyncio.run(scenario())
+    assert status == 413
+    assert isinstance(error, StreamReset)
+    assert agent_stats['streams_active'] == 0
@@ -0,0 +1,87 @@
+"""Tunnel server startup settings and its monitoring endpoints"""
+
+import asyncio
+
+import pytest
+import yaml
+
+from custom_tunnel_server import TunnelConfig, worker_count
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    def make(**sections):
+        path = tmp_path / 'tunnel_config.yaml'
+        path.write_text(yaml.safe_dump(sections))
+        return TunnelConfig(str(path))
+
+    return make
+
+
+def test_proxy_mode_keeps_its_workers(make_config):
+    assert worker_count(make_config(server={'workers': 4}, tunnel={'mode': 'proxy'})) == 4
+
+
+def test_reverse_mode_runs_a_single_worker(make_config, capsys):
+    assert worker_count(make_config(server={'workers': 4}, tunnel={'mode': 'reverse'})) == 1
+    assert 'single worker' in capsys.readouterr().out
+
+
+def test_missing_workers_setting_means_one(make_config):
+    assert worker_count(make_config(server={'workers': None})) == 1
+
+
+@pytest.mark.parametrize('query, status', [
+    ('', 200), ('?top=0', 200), ('?top=100', 200),
+    ('?top=abc', 400), ('?top=-1', 400), ('?top=101', 400), ('?top=1.5', 400)
+])
+def test_stats_top_is_validated(run_tunnel, query, status):
+    async def scenario():
+        async with run_tunnel() as (client, tunnel):
+            response = await client.get('/stats' + query)
+            return response.status, await response.json()
+
+    code, body = asyncio.run(scenario())
+    assert code == status
+    if status == 400:
+        assert 'top must be' in body['error']
+    else:
+        assert 'top_offenders' in body['rate_limiter']
+
+
+def test_stats_top_limits_the_offender_list(run_tunnel):
+    async def scenario():
+        sections = {'security': {'rate_limit': 1, 'trusted_proxies': ['127.0.0.1']}}
+        async with run_tunnel(sections) as (client, tunnel):
+            for index in range(5):
+                for _ in range(2):
+                    await client.post('/webhook', data=b'{}', headers={'X-Forwarded-For': f"10.0.0.{index}"})
+            response = await client.get('/stats?top=3')
+            return await response.json()
+
+    assert len(asyncio.run(scenario())['rate_limiter']['top_offenders']) == 3
+
+
+@pytest.mark.parametrize('path', ['/status', '/stats', '/events'])
+def test_monitoring_endpoints_need_the_token(run_tunnel, path):
+    async def scenario():
+        async with run_tunnel({'security': {'require_auth': True}}) as (client, tunnel):
+            statuses = []
+            for query, headers in [('', {}), ('?token=wrong', {}), ('?token=test-token', {}),
+                                   ('', {'Authorization': 'Bearer test-token'})]:
+                response = await client.get(path + query, headers=headers)
+                statuses.append(response.status)
+                if response.status == 200 and path == '/events':
+                    assert (await response.content.readline()).startswith(b'event: snapshot')
+                response.close()
+            return statuses
+
+    assert asyncio.run(scenario()) == [401, 401, 200, 200]
+
+
+def test_events_honour_the_ip_allowlist(run_tunnel):
+    async def scenario():
+        async with run_tunnel({'security': {'allowed_ips': ['203.0.113.0/24']}}) as (client, tunnel):
+            return (await client.get('/events')).status
+
+    assert asyncio.run(scenario()) == 401
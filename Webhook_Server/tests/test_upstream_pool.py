@@ -0,0 +1,190 @@
+"""Upstream pools: choosing a target, ejection, slow start and what counts against a target's health"""
+
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from custom_tunnel_server import UpstreamHealthMonitor, UpstreamPool
+
+BREAKER = {'window': 30, 'min_requests': 2, 'failure_rate': 0.5, 'open_time': 30, 'half_open_requests': 1}
+
+
+def make_pool(addresses=('127.0.0.1:5000',), **kwargs):
+    return UpstreamPool('default', list(addresses), UpstreamHealthMonitor(), breaker=BREAKER, **kwargs)
+
+
+def test_client_side_outcome_frees_the_slot_without_counting():
+    pool = make_pool(ejection_failures=2)
+    target = pool.targets[0]
+
+    for _ in range(5):
+        pool.acquire(target)
+        pool.release(target, None, None)
+
+    assert target.outstanding == 0
+    assert target.failures == 0
+    assert not target.ejected_until
+    assert target.breaker.calls == 0
+    assert pool.pick() is target
+
+
+def test_upstream_failures_eject_the_target():
+    pool = make_pool(ejection_failures=2)
+    target = pool.targets[0]
+
+    for _ in range(2):
+        pool.acquire(target)
+        pool.release(target, None, False)
+
+    assert target.ejected_until
+    assert pool.pick() is None
+
+
+def test_client_side_outcome_returns_a_half_open_probe():
+    pool = make_pool()
+    target = pool.targets[0]
+    for _ in range(2):
+        pool.acquire(target)
+        pool.release(target, None, False)
+    breaker = target.breaker
+    breaker.opened_until = 0  # Skip the open time
+    target.ejected_until = 0
+
+    assert pool.pick() is target
+    pool.acquire(target)
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.would_allow(0)
+
+    pool.release(target, None, None)
+
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.probes_in_flight == 0
+
+
+async def chunked_body(size, chunk=1024):
+    for _ in range(size // chunk):
+        yield b'x' * chunk
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_oversized_bodies_do_not_eject_a_healthy_upstream(run_tunnel, streaming):
+    async def upstream(request):
+        return web.json_response({'size': len(await request.read())})
+
+    async def scenario():
+        sections = {
+            'tunnel': {'streaming': streaming},
+            'advanced': {'max_request_size': '1KB'},
+            'load_balancing': {'ejection_failures': 2},
+            'circuit_breaker': {'min_requests': 2}
+        }
+        async with run_tunnel(sections, upstream) as (client, tunnel):
+            statuses = []
+            for _ in range(5):
+                # Chunked, so the size is only found out while forwarding
+                response = await client.post('/webhook', data=chunked_body(8192))
+                statuses.append(response.status)
+            response = await client.post('/webhook', data=b'{}')
+            target = tunnel.pools['default'].targets[0]
+            return statuses, response.status, target
+
+    statuses, status, target = asyncio.run(scenario())
+    assert statuses == [413] * 5
+    assert status == 200
+    assert target.failures == 0
+    assert not target.ejected_until
+    assert target.breaker.calls == 1
+
+
+def test_gateway_errors_still_count_as_failures(run_tunnel):
+    async def upstream(request):
+        return web.Response(text='upstream broken', status=502)
+
+    async def scenario():
+        async with run_tunnel({'load_balancing': {'ejection_failures': 2}}, upstream) as (client, tunnel):
+            bodies = []
+            for _ in range(3):
+                response = await client.post('/webhook', data=b'{}')
+                bodies.append((response.status, await response.text()))
+            return bodies, tunnel.pools['default'].targets[0]
+
+    bodies, target = asyncio.run(scenario())
+    assert bodies == [(502, 'upstream broken')] * 2 + [(503, 'Local server unavailable')]
+    assert target.ejections == 1
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        make_pool(strategy='round_robin')
+
+
+def test_least_outstanding_picks_the_idlest_target():
+    pool = make_pool(('127.0.0.1:5000', '127.0.0.1:5001', '127.0.0.1:5002'))
+    first, second, third = pool.targets
+    pool.acquire(first)
+    pool.acquire(first)
+    pool.acquire(third)
+
+    assert pool.pick() is second
+
+
+def test_ewma_explores_unmeasured_targets_then_prefers_the_fastest():
+    pool = make_pool(('127.0.0.1:5000', '127.0.0.1:5001'), strategy='ewma')
+    slow, fast = pool.targets
+    pool.acquire(slow)
+    pool.release(slow, 200.0, True)
+
+    assert pool.pick() is fast
+    pool.acquire(fast)
+    pool.release(fast, 20.0, True)
+    assert pool.pick() is fast
+    # Enough requests in flight outweigh the lower latency
+    for _ in range(10):
+        pool.acquire(fast)
+    assert pool.pick() is slow
+
+
+def test_success_resets_the_consecutive_failure_count():
+    pool = make_pool(ejection_failures=3)
+    target = pool.targets[0]
+    for ok in (False, False, True, False, False):
+        pool.acquire(target)
+        pool.release(target, 1.0, ok)
+
+    assert not target.ejected_until
+    assert target.failures == 4
+
+
+def test_ejected_target_sits_out_then_slow_starts():
+    pool = make_pool(('127.0.0.1:5000', '127.0.0.1:5001'), ejection_failures=1, slow_start=30)
+    ejected, other = pool.targets
+    pool.acquire(ejected)
+    pool.release(ejected, 1.0, False)
+
+    assert pool.available() == [other]
+    for _ in range(3):
+        pool.acquire(other)
+    assert pool.pick() is other
+
+    ejected.ejected_until = time.time() - 1  # Ejection time over
+    assert pool.pick() is other  # 3 in flight at full weight beat idle at 10%
+    assert pool.weight(ejected, ejected.recovered_at) == 0.1
+    assert pool.weight(ejected, ejected.recovered_at + 15) == 0.5
+
+    ejected.recovered_at -= 30  # Slow start over
+    assert pool.pick() is ejected
+
+
+def test_targets_marked_down_are_skipped_and_slow_start_on_recovery():
+    monitor = UpstreamHealthMonitor()
+    pool = UpstreamPool('default', ['127.0.0.1:5000', '127.0.0.1:5001'], monitor, slow_start=10)
+    down, up = pool.targets
+    for target in pool.targets:
+        monitor.add(target.address)
+    monitor.upstreams[down.address]['healthy'] = False
+
+    assert pool.available() == [up]
+    monitor.upstreams[down.address].update(healthy=True, last_change=time.time())
+    assert pool.weight(down, time.time()) < 0.2
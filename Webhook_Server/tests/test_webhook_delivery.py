@@ -0,0 +1,76 @@
+"""Delivery to the terminal: rejected signals never reach the signal file"""
+
+import json
+
+import pytest
+
+from mt_protocol import SignalRejected
+from signal_latency import SignalTimeline
+
+
+def timeline(signal):
+    return SignalTimeline.from_signal(signal, 'test')
+
+
+def test_rejected_signal_raises_and_skips_file(make_server, rejecting_receiver, tmp_path):
+    server = make_server(mt_port=rejecting_receiver.port, mt_protocol='framed')
+    signal = {'action': 'BUY', 'symbol': 'BAD'}
+
+    with pytest.raises(SignalRejected) as excinfo:
+        server.send_to_mt(signal, 'general', timeline(signal))
+
+    assert excinfo.value.ack['status'] == 'rejected'
+    assert not (tmp_path / 'mt_signals.json').exists()
+
+
+def test_acked_signal_is_delivered_over_the_socket(make_server, rejecting_receiver, tmp_path):
+    server = make_server(mt_port=rejecting_receiver.port, mt_protocol='framed')
+    signal = {'action': 'BUY', 'symbol': 'EURUSD'}
+    signal_timeline = timeline(signal)
+
+    assert server.send_to_mt(signal, 'general', signal_timeline) is True
+    assert signal_timeline.delivered_via == 'socket'
+    assert not (tmp_path / 'mt_signals.json').exists()
+
+
+@pytest.mark.parametrize('protocol', ['line', 'framed'])
+def test_unreachable_terminal_falls_back_to_file(make_server, free_port, tmp_path, protocol):
+    server = make_server(mt_port=free_port, mt_protocol=protocol)
+    signal = {'action': 'SELL', 'symbol': 'GBPUSD'}
+    signal_timeline = timeline(signal)
+
+    assert server.send_to_mt(signal, 'general', signal_timeline) is True
+    assert signal_timeline.delivered_via == 'file'
+    written = json.loads((tmp_path / 'mt_signals.json').read_text())
+    assert [entry['symbol'] for entry in written] == ['GBPUSD']
+
+
+def test_batch_reports_rejections_and_files_nothing(make_server, rejecting_receiver, tmp_path):
+    server = make_server(mt_port=rejecting_receiver.port, mt_protocol='framed')
+    signals = [{'action': 'BUY', 'symbol': 'BAD'}, {'action': 'BUY', 'symbol': 'EURUSD'}]
+
+    results = server.send_batch_to_mt(signals, [timeline(signal) for signal in signals])
+
+    assert isinstance(results[0], SignalRejected)
+    assert results[1] is True
+    assert not (tmp_path / 'mt_signals.json').exists()
+
+
+def test_batch_without_terminal_files_every_signal(make_server, free_port, tmp_path):
+    server = make_server(mt_port=free_port, mt_protocol='framed')
+    signals = [{'action': 'BUY', 'symbol': 'EURUSD'}, {'action': 'CLOSE', 'symbol': 'GBPUSD'}]
+
+    assert server.send_batch_to_mt(signals, [timeline(signal) for signal in signals]) == [True, True]
+    written = json.loads((tmp_path / 'mt_signals.json').read_text())
+    assert [entry['symbol'] for entry in written] == ['EURUSD', 'GBPUSD']
+
+
+def test_webhook_answers_422_for_a_rejected_signal(make_server, rejecting_receiver, tmp_path):
+    server = make_server(mt_port=rejecting_receiver.port, mt_protocol='framed', dispatch_timeout=5)
+    server.start_workers()
+    
+    response = server.app.test_client().post('/webhook', json={'action': 'BUY', 'symbol': 'BAD'})
+
+    assert response.status_code == 422
+    assert 'rejected' in response.get_json()['message']
+    assert not (tmp_path / 'mt_signals.json').exists()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Signal Tracing
+Copyright 2024, AI Trading Team
+
+Ties one signal's hops together: the DodoHook tunnel, the webhook server
+and the delivery to the MetaTrader terminal. The trace context travels as
+a W3C `traceparent` value:
+
+    00-<trace id: 32 hex>-<parent span id: 16 hex>-<flags: 01 = sampled>
+
+in the HTTP headers between the tunnel and the webhook server, and as a
+`traceparent` field of the signal sent to the terminal. A hop that gets
+no context starts a new trace. Each process appends its finished spans to
+a local JSON-lines file:
+
+    {"trace_id": ..., "span_id": ..., "parent_id": ..., "name": "mt.delivery",
+     "service": "webhook_server", "start": 1718000000.123, "duration_ms": 2.41,
+     "status": "ok", "attributes": {...}}
+
+Running this module reads one or more span files and prints the slowest
+traces and a per-hop latency breakdown:
+
+    python3 tracing.py tunnel_traces.jsonl webhook_traces.jsonl --slowest 5
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+TRACEPARENT = 'traceparent'
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a traceparent value; None when it is missing or malformed"""
+    if not value or not isinstance(value, str):
+        return None
+    parts = value.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == 'ff':
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return SpanContext(parts[1].lower(), parts[2].lower(), bool(flags & 1))
+
+
+class Span:
+    """One timed operation; exported by its tracer when it ends"""
+
+    __slots__ = ('tracer', 'name', 'context', 'parent_id', 'start', 'started', 'attributes', 'ended')
+
+    def __init__(self, tracer: 'Tracer', name: str, context: SpanContext, parent_id: Optional[str],
+                 start: Optional[float] = None, attributes: Optional[Dict] = None):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        # Spans started now are timed with the monotonic clock; spans
+        # recorded after the fact (queue waits) from wall-clock timestamps
+        self.start = start if start is not None else time.time()
+        self.started = time.perf_counter() if start is None else None
+        self.attributes = attributes or {}
+        self.ended = False
+
+    def traceparent(self) -> str:
+        """Context to hand to the next hop, with this span as its parent"""
+        return self.context.traceparent()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, status: str = 'ok', end_time: Optional[float] = None):
+        if self.ended:
+            return
+        self.ended = True
+        if self.started is not None and end_time is None:
+            duration_ms = (time.perf_counter() - self.started) * 1000
+        else:
+            duration_ms = ((end_time or time.time()) - self.start) * 1000
+        if self.context.sampled:
+            self.tracer.export(self, max(0.0, duration_ms), status)
+
+
+class Tracer:
+    """Creates spans for one service and appends finished ones to a file.
+
+    Sampling is decided where a trace starts (`sample_rate`); a hop that
+    receives a context keeps its decision, so a trace is recorded at every
+    hop or at none. Writes are thread-safe.
+    """
+
+    def __init__(self, service: str, path: str, sample_rate: float = 1.0, flush_every: int = 1):
+        self.service = service
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_every = flush_every
+        self.count = 0
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def start_span(self, name: str, parent=None, start: Optional[float] = None, **attributes) -> Span:
+        """Start a span under `parent` (a Span, SpanContext or traceparent value)"""
+        if isinstance(parent, Span):
+            parent = parent.context
+        elif not isinstance(parent, SpanContext):
+            parent = parse_traceparent(parent)
+
+        span_id = os.urandom(8).hex()
+        if parent is None:
+            context = SpanContext(os.urandom(16).hex(), span_id, random.random() < self.sample_rate)
+            return Span(self, name, context, None, start, attributes)
+        return Span(self, name, SpanContext(parent.trace_id, span_id, parent.sampled),
+                    parent.span_id, start, attributes)
+
+    def export(self, span: Span, duration_ms: float, status: str):
+        line = json.dumps({
+            'trace_id': span.context.trace_id,
+            'span_id': span.context.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'service': self.service,
+            'start': round(span.start, 6),
+            'duration_ms': round(duration_ms, 3),
+            'status': status,
+            'attributes': span.attributes
+        }, separators=(',', ':'), default=str)
+
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count += 1
+            if self.count % self.flush_every == 0:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_spans(paths: List[str]) -> Iterator[dict]:
+    """Yield every span in the given files; lines cut short by a crash are skipped"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_traces(spans: Iterator[dict]) -> List[dict]:
+    """Group spans by trace; each span gets its children and self time"""
+    by_trace = defaultdict(list)
+    for span in spans:
+        by_trace[span['trace_id']].append(span)
+
+    traces = []
+    for trace_id, trace_spans in by_trace.items():
+        ids = {span['span_id'] for span in trace_spans}
+        children = defaultdict(list)
+        for span in trace_spans:
+            children[span.get('parent_id')].append(span)
+        for span in trace_spans:
+            span['children'] = sorted(children.get(span['span_id'], []), key=lambda child: child['start'])
+            # Time not covered by a child; async children (queued signals)
+            # may outlive their parent, hence the floor at zero
+            span['self_ms'] = max(0.0, span['duration_ms'] - sum(child['duration_ms'] for child in span['children']))
+
+        # Roots: spans whose parent is unknown (started here, or recorded by
+        # a hop whose file was not given)
+        roots = sorted((span for span in trace_spans if span.get('parent_id') not in ids),
+                       key=lambda span: span['start'])
+        start = min(span['start'] for span in trace_spans)
+        end = max(span['start'] + span['duration_ms'] / 1000 for span in trace_spans)
+        traces.append({
+            'trace_id': trace_id,
+            'start': start,
+            'duration_ms': round((end - start) * 1000, 3),
+            'spans': len(trace_spans),
+            'services': sorted({span['service'] for span in trace_spans}),
+            'errors': sum(1 for span in trace_spans if span.get('status') != 'ok'),
+            'roots': roots
+        })
+    return traces
+
+
+def hop_breakdown(traces: List[dict]) -> List[dict]:
+    """Latency per (service, span name) across all traces"""
+    hops = defaultdict(lambda: {'duration': [], 'self': []})
+    for trace in traces:
+        stack = list(trace['roots'])
+        while stack:
+            span = stack.pop()
+            hop = hops[(span['service'], span['name'])]
+            hop['duration'].append(span['duration_ms'])
+            hop['self'].append(span['self_ms'])
+            stack.extend(span['children'])
+
+    rows = []
+    for (service, name), samples in hops.items():
+        rows.append({
+            'service': service,
+            'span': name,
+            'count': len(samples['duration']),
+            'p50_ms': round(percentile(samples['duration'], 50), 3),
+            'p95_ms': round(percentile(samples['duration'], 95), 3),
+            'max_ms': round(max(samples['duration']), 3),
+            'self_p50_ms': round(percentile(samples['self'], 50), 3),
+            'self_p95_ms': round(percentile(samples['self'], 95), 3)
+        })
+    return sorted(rows, key=lambda row: -row['p95_ms'])
+
+
+def span_tree(span: dict, depth: int = 0) -> List[str]:
+    label = span['name']
+    details = [f"{key}={value}" for key, value in span.get('attributes', {}).items()]
+    lines = [
+        f"    {'  ' * depth}{label:<{32 - 2 * depth}} {span['service']:<16} "
+        f"{span['duration_ms']:>10.3f} ms  (self {span['self_ms']:.3f})"
+        + (f"  {span['status']}" if span.get('status') != 'ok' else '')
+        + (f"  {' '.join(details)}" if details else '')
+    ]
+    for child in span['children']:
+        lines.extend(span_tree(child, depth + 1))
+    return lines
+
+
+def strip_tree(span: dict) -> dict:
+    return dict(span, children=[strip_tree(child) for child in span['children']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slowest signal traces and per-hop latency')
+    parser.add_argument('files', nargs='+', help='Span files (globs allowed), e.g. tunnel_traces.jsonl*')
+    parser.add_argument('--slowest', type=int, default=10, help='Number of slowest traces to show')
+    parser.add_argument('--since', type=float, default=0, help='Only traces that started in the last N minutes')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.files for path in (glob.glob(pattern) or [pattern])})
+    traces = build_traces(read_spans(paths))
+    if args.since:
+        cutoff = time.time() - args.since * 60
+        traces = [trace for trace in traces if trace['start'] >= cutoff]
+    slowest = sorted(traces, key=lambda trace: -trace['duration_ms'])[:args.slowest]
+    hops = hop_breakdown(traces)
+
+    if args.json:
+        print(json.dumps({
+            'traces': len(traces),
+            'slowest': [dict(trace, roots=[strip_tree(root) for root in trace['roots']]) for trace in slowest],
+            'hops': hops
+        }, indent=2))
+        return
+
+    print(f"{len(traces)} traces in {len(paths)} file(s)")
+    if not traces:
+        return
+
+    print(f"\nSlowest {len(slowest)} traces")
+    for trace in slowest:
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trace['start']))
+        print(f"  {trace['trace_id']}  {started}  {trace['duration_ms']:.3f} ms  "
+              f"{trace['spans']} spans  {'/'.join(trace['services'])}"
+              + (f"  {trace['errors']} error(s)" if trace['errors'] else ''))
+        for root in trace['roots']:
+            for line in span_tree(root):
+                print(line)
+
+    print("\nPer-hop latency (ms)")
+    print(f"  {'service':<16} {'span':<24} {'count':>7} {'p50':>10} {'p95':>10} {'max':>10} {'self p50':>10} {'self p95':>10}")
+    for row in hops:
+        print(f"  {row['service']:<16} {row['span']:<24} {row['count']:>7} {row['p50_ms']:>10.3f} "
+              f"{row['p95_ms']:>10.3f} {row['max_ms']:>10.3f} {row['self_p50_ms']:>10.3f} {row['self_p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
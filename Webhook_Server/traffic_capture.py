@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Webhook Traffic Capture
+Copyright 2024, AI Trading Team
+
+Compact binary capture of raw webhook requests with arrival timestamps,
+written by the webhook servers and the DodoHook tunnel when capture mode
+is enabled, and read back by traffic_replay.py.
+
+File layout: an 8-byte header (magic b'DEAC', uint16 version, 2 reserved
+bytes) followed by one record per request:
+
+    +-------------+-------------+-----------+-------------+-----------+
+    | ts: float64 | method: u8  | path: u32 | headers:u32 | body: u32 |
+    +-------------+-------------+-----------+-------------+-----------+
+    followed by the method, path, headers (JSON) and body bytes
+
+All integers are little-endian lengths. `ts` is the wall-clock arrival
+time in seconds since the epoch. Version 1 files, with a u16 path length,
+are still read, and appended to in their own layout.
+
+Credentials are not written: the values of Authorization, cookies and
+headers named like a secret, token or API key are replaced with REDACTED.
+"""
+
+import json
+import logging
+import struct
+import threading
+import time
+from typing import Dict, Iterator, NamedTuple, Optional
+
+CAPTURE_MAGIC = b'DEAC'
+CAPTURE_VERSION = 2
+FILE_HEADER = struct.Struct('<4sHxx')
+RECORD_HEADERS = {
+    1: struct.Struct('<dBHII'),
+    2: struct.Struct('<dBIII'),
+}
+RECORD_HEADER = RECORD_HEADERS[CAPTURE_VERSION]
+
+# Headers that describe the original connection rather than the request
+SKIPPED_HEADERS = {'host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding'}
+
+# Headers whose values are credentials; names containing a marker count too
+REDACTED = '[REDACTED]'
+REDACTED_HEADERS = {'authorization', 'proxy-authorization', 'cookie', 'set-cookie'}
+REDACTED_MARKERS = ('secret', 'token', 'api-key', 'apikey', 'password', 'signature')
+
+
+def is_sensitive(header: str) -> bool:
+    name = header.lower()
+    return name in REDACTED_HEADERS or any(marker in name for marker in REDACTED_MARKERS)
+
+
+class CapturedRequest(NamedTuple):
+    timestamp: float
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+class CaptureWriter:
+    """Append-only, thread-safe writer for capture files.
+    
+    Capture is a side channel: `write` logs and drops a request it cannot
+    record instead of failing the request being served.
+    """
+    
+    def __init__(self, path: str, flush_every: int = 1, redact: bool = True,
+                 logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.flush_every = flush_every
+        self.redact = redact
+        self.logger = logger or logging.getLogger(__name__)
+        self.count = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        
+        self.file = open(path, 'a+b')
+        self.file.seek(0)
+        header = self.file.read(FILE_HEADER.size)
+        if not header:
+            self.file.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+            self.file.flush()
+            version = CAPTURE_VERSION
+        else:
+            magic, version = FILE_HEADER.unpack(header)
+            if magic != CAPTURE_MAGIC or version not in RECORD_HEADERS:
+                self.file.close()
+                raise ValueError(f"{path} is not a capture file this version can append to")
+        self.record_header = RECORD_HEADERS[version]
+    
+    def write(self, method: str, path: str, headers, body: bytes,
+              timestamp: Optional[float] = None):
+        """Record one request; `headers` may be any mapping"""
+        try:
+            method_bytes = method.encode('ascii', 'replace')
+            path_bytes = path.encode('utf-8', 'replace')
+            header_bytes = json.dumps({
+                key: REDACTED if self.redact and is_sensitive(key) else value
+                for key, value in headers.items()
+                if key.lower() not in SKIPPED_HEADERS
+            }, separators=(',', ':')).encode('utf-8')
+            body = body or b''
+            
+            record = self.record_header.pack(
+                timestamp if timestamp is not None else time.time(),
+                len(method_bytes), len(path_bytes), len(header_bytes), len(body)
+            ) + method_bytes + path_bytes + header_bytes + body
+            
+            with self.lock:
+                self.file.write(record)
+                self.count += 1
+                if self.count % self.flush_every == 0:
+                    self.file.flush()
+        except Exception as e:
+            self.dropped += 1
+            self.logger.warning(f"Capture dropped {method[:16]} {path[:200]}: {e}")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_capture(path: str) -> Iterator[CapturedRequest]:
+    """Yield every request in a capture file in arrival order"""
+    with open(path, 'rb') as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            return
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a webhook capture file")
+        if version not in RECORD_HEADERS:
+            raise ValueError(f"Unsupported capture version: {version}")
+        record_struct = RECORD_HEADERS[version]
+        
+        while True:
+            record_header = f.read(record_struct.size)
+            if len(record_header) < record_struct.size:
+                # Clean end of file, or a record truncated by a crash
+                return
+            timestamp, method_len, path_len, headers_len, body_len = record_struct.unpack(record_header)
+            data = f.read(method_len + path_len + headers_len + body_len)
+            if len(data) < method_len + path_len + headers_len + body_len:
+                return
+
+            offset = 0
+            method = data[offset:offset + method_len].decode('ascii')
+            offset += method_len
+            req_path = data[offset:offset + path_len].decode('utf-8')
+            offset += path_len
+            headers = json.loads(data[offset:offset + headers_len])
+            offset += headers_len
+            body = data[offset:offset + body_len]
+
+            yield CapturedRequest(timestamp, method, req_path, headers, body)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+AI Trading Expert - Webhook Traffic Replay
+Copyright 2024, AI Trading Team
+
+Re-sends a capture written by traffic_capture.py against any of our HTTP
+servers (WebhookServer, EnhancedWebhookServer or the DodoHook
+TunnelServer), preserving the original inter-arrival gaps scaled by
+--speed, or as fast as possible with --speed max.
+
+    python3 traffic_replay.py capture.bin --target http://127.0.0.1:5000
+    python3 traffic_replay.py capture.bin --target https://127.0.0.1:8443 --speed 10 --insecure
+    python3 traffic_replay.py capture.bin --target http://127.0.0.1:5000 --speed max --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import statistics
+import time
+from collections import Counter
+
+import aiohttp
+
+from traffic_capture import REDACTED, read_capture
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Replayer:
+    """Schedules captured requests against a target base URL"""
+
+    def __init__(self, target: str, speed: float, concurrency: int, token: str = None,
+                 insecure: bool = False, timeout: float = 30):
+        self.target = target.rstrip('/')
+        self.speed = speed
+        self.concurrency = concurrency
+        self.token = token
+        self.insecure = insecure
+        self.timeout = timeout
+        self.statuses = Counter()
+        self.latencies = []
+        self.lag = []
+
+    async def send(self, session, semaphore, request):
+        # Redacted credentials are dropped; --token supplies a real one
+        headers = {key: value for key, value in request.headers.items() if value != REDACTED}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.request(
+                    request.method, self.target + request.path,
+                    headers=headers, data=request.body
+                ) as response:
+                    await response.read()
+                    self.statuses[response.status] += 1
+            except Exception as e:
+                self.statuses[type(e).__name__] += 1
+                return
+            self.latencies.append((time.perf_counter() - start) * 1000)
+
+    async def run(self, requests):
+        ssl_context = None
+        if self.insecure:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ssl=ssl_context)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            loop = asyncio.get_running_loop()
+            replay_start = loop.time()
+            capture_start = requests[0].timestamp if requests else 0
+
+            for request in requests:
+                if self.speed > 0:
+                    due = replay_start + (request.timestamp - capture_start) / self.speed
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    self.lag.append(max(0.0, loop.time() - due) * 1000)
+                tasks.append(asyncio.create_task(self.send(session, semaphore, request)))
+
+            await asyncio.gather(*tasks)
+            return loop.time() - replay_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured webhook traffic')
+    parser.add_argument('capture', help='Capture file written in capture mode')
+    parser.add_argument('--target', required=True, help='Base URL, e.g. http://127.0.0.1:5000')
+    parser.add_argument('--speed', default='1', help='Time scale: 1 = real time, 10 = 10x faster, max = no gaps')
+    parser.add_argument('--concurrency', type=int, default=100, help='Maximum requests in flight')
+    parser.add_argument('--token', help='Replace the Authorization header with this bearer token')
+    parser.add_argument('--insecure', action='store_true', help='Skip TLS verification (self-signed certs)')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    speed = 0.0 if args.speed == 'max' else float(args.speed)
+    if speed < 0:
+        parser.error('--speed must be positive or "max"')
+
+    requests = list(read_capture(args.capture))
+    if not requests:
+        parser.error(f"No requests in {args.capture}")
+
+    replayer = Replayer(args.target, speed, args.concurrency, args.token, args.insecure)
+    elapsed = asyncio.run(replayer.run(requests))
+
+    original = requests[-1].timestamp - requests[0].timestamp
+    summary = {
+        'requests': len(requests),
+        'original_duration_s': round(original, 3),
+        'replay_duration_s': round(elapsed, 3),
+        'requests_per_second': round(len(requests) / elapsed, 1) if elapsed else None,
+        'statuses': {str(status): count for status, count in replayer.statuses.items()},
+    }
+    if replayer.latencies:
+        summary['latency_ms'] = {
+            'mean': round(statistics.mean(replayer.latencies), 3),
+            'p50': round(percentile(replayer.latencies, 50), 3),
+            'p95': round(percentile(replayer.latencies, 95), 3),
+            'p99': round(percentile(replayer.latencies, 99), 3),
+            'max': round(max(replayer.latencies), 3)
+        }
+    if replayer.lag:
+        summary['schedule_lag_ms_p99'] = round(percentile(replayer.lag, 99), 3)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        for key, value in summary.items():
+            print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+DodoHook - Reverse Tunnel Agent
+Copyright 2024, Camlo Technologies
+
+Runs on the trading host, next to the webhook server. The agent dials out
+to the public DodoHook server and keeps one WebSocket open; the server
+multiplexes every incoming webhook over it (see tunnel_mux.py) and the
+agent replays each one against the local webhook server. The trading
+host needs no inbound port, so it can sit behind NAT or a firewall.
+
+Set `tunnel.mode: reverse` on the server, then:
+
+    python3 tunnel_agent.py --server https://webhook.example.com \\
+        --token your-secret-auth-token-here --local http://127.0.0.1:5000
+"""
+
+import argparse
+import asyncio
+import logging
+import socket
+import ssl
+
+import aiohttp
+
+from tunnel_mux import FRAME_RESPONSE, MAX_DATA_FRAME, Multiplexer, StreamReset
+
+# Hop-by-hop headers (RFC 7230) that apply to a single connection only
+HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+
+class TunnelAgent:
+    """Holds the tunnel connection and serves streams against the local server"""
+
+    def __init__(self, server_url: str, token: str, local_url: str, agent_id: str = None,
+                 insecure: bool = False, max_connections: int = 100):
+        self.connect_url = server_url.rstrip('/') + '/tunnel/connect'
+        self.token = token
+        self.local_url = local_url.rstrip('/')
+        self.agent_id = agent_id or socket.gethostname()
+        self.insecure = insecure
+        self.max_connections = max_connections
+        self.logger = logging.getLogger('tunnel_agent')
+        self.session = None
+
+    async def run(self):
+        """Connect and serve forever, reconnecting with backoff"""
+        ssl_context = None
+        if self.insecure:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector, auto_decompress=False)
+        delay = 1
+
+        try:
+            while True:
+                try:
+                    async with self.session.ws_connect(
+                        self.connect_url,
+                        params={'agent': self.agent_id},
+                        headers={'Authorization': f"Bearer {self.token}"},
+                        heartbeat=30,
+                        max_msg_size=0,
+                        ssl=ssl_context
+                    ) as ws:
+                        self.logger.info(f"Connected to {self.connect_url} as {self.agent_id}")
+                        delay = 1
+                        await self.serve(ws)
+                    self.logger.warning("Tunnel connection closed by the server")
+                except (aiohttp.ClientError, OSError) as e:
+                    self.logger.warning(f"Tunnel connection failed: {e}")
+
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        finally:
+            await self.session.close()
+
+    async def serve(self, ws: aiohttp.ClientWebSocketResponse):
+        mux = Multiplexer(ws.send_bytes, on_open=self.handle_stream, first_stream_id=2,
+                          logger=self.logger)
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.BINARY:
+                    await mux.feed(msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            mux.close()
+
+    async def handle_stream(self, stream, head: dict):
+        """Replay one tunnelled request against the local webhook server"""
+        body = stream.chunks() if head.get('has_body') else None
+        url = self.local_url + head['path']
+        responded = False
+
+        try:
+            async with self.session.request(
+                head['method'], url,
+                headers=head['headers'],
+                data=body,
+                allow_redirects=False,
+                timeout=aiohttp.ClientTimeout(total=head.get('timeout') or 30)
+            ) as response:
+                await stream.send_head(FRAME_RESPONSE, {
+                    'status': response.status,
+                    'headers': [
+                        [key, value] for key, value in response.headers.items()
+                        if key.lower() not in HOP_HEADERS
+                    ]
+                })
+                responded = True
+                async for chunk in response.content.iter_chunked(MAX_DATA_FRAME):
+                    await stream.write(chunk)
+                await stream.end()
+                if body is not None and not stream.remote_closed:
+                    # Answered without reading the whole body; stop the sender
+                    await stream.reset('response sent before the request body was read')
+        except StreamReset:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Local server error for {head['method']} {head['path']}: {e}")
+            if not responded:
+                await stream.send_head(FRAME_RESPONSE, {'status': 502, 'headers': []})
+                await stream.write(b'Failed to connect to local server')
+                await stream.end()
+            else:
+                await stream.reset(str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DodoHook reverse tunnel agent')
+    parser.add_argument('--server', required=True, help='Public tunnel URL, e.g. https://webhook.example.com')
+    parser.add_argument('--token', required=True, help='tunnel.auth_token of the server')
+    parser.add_argument('--local', default='http://127.0.0.1:5000', help='Local webhook server URL')
+    parser.add_argument('--agent-id', help='Name shown in the server dashboard (default: hostname)')
+    parser.add_argument('--insecure', action='store_true', help='Skip TLS verification (self-signed certs)')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper()),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    agent = TunnelAgent(args.server, args.token, args.local, args.agent_id, args.insecure)
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        print("Agent stopped by user")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+DodoHook - Stream Multiplexing for Reverse Tunnels
+Copyright 2024, Camlo Technologies
+
+Carries many concurrent HTTP exchanges over the one persistent WebSocket
+that a tunnel agent (tunnel_agent.py) holds open to the public tunnel
+server. Every WebSocket binary message is one frame:
+
+    +-----------+-------------------+-------------------+
+    | type: u8  | stream id: uint32 | payload           |
+    +-----------+-------------------+-------------------+
+
+The server opens streams with odd IDs. A request is OPEN (JSON head),
+DATA*, END from the server; the agent answers RESPONSE (JSON head), DATA*,
+END on the same stream. RESET aborts a stream from either side.
+
+Flow control is per stream and credit based, as in HTTP/2: a sender may
+have at most `window` DATA bytes the receiver has not yet read, and the
+receiver hands credit back with WINDOW frames as its consumer reads. A
+slow reader therefore never stalls the other streams or grows memory
+without bound.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+from typing import Awaitable, Callable, Dict, Optional
+
+MUX_HEADER = struct.Struct('>BI')
+WINDOW_UPDATE = struct.Struct('>I')
+
+FRAME_OPEN = 1
+FRAME_DATA = 2
+FRAME_END = 3
+FRAME_RESPONSE = 4
+FRAME_RESET = 5
+FRAME_WINDOW = 6
+
+INITIAL_WINDOW = 256 * 1024
+MAX_DATA_FRAME = 16 * 1024
+
+
+class StreamReset(Exception):
+    """Raised when the peer resets a stream or the tunnel connection is lost"""
+
+
+class MuxStream:
+    """One request/response exchange inside the tunnel"""
+
+    def __init__(self, mux: 'Multiplexer', stream_id: int):
+        self.mux = mux
+        self.id = stream_id
+        self.send_window = mux.window
+        self.window_open = asyncio.Event()
+        self.window_open.set()
+        self.inbound: asyncio.Queue = asyncio.Queue()  # bytes, None (END) or StreamReset
+        self.buffered = 0  # Received but not yet read; bounded by the window
+        self.unacked = 0  # Read but not yet credited back to the sender
+        self.head = asyncio.get_running_loop().create_future()
+        # Nobody awaits the head on the agent side; don't warn about it
+        self.head.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.error: Optional[StreamReset] = None
+        self.local_closed = False
+        self.remote_closed = False
+
+    async def send_head(self, frame_type: int, head: dict):
+        await self.mux.send(frame_type, self.id, json.dumps(head).encode('utf-8'))
+
+    async def write(self, data: bytes):
+        """Send body bytes, waiting for window credit as needed"""
+        view = memoryview(data)
+        while view:
+            while self.send_window <= 0 and not self.error:
+                self.window_open.clear()
+                await self.window_open.wait()
+            if self.error:
+                raise self.error
+
+            size = min(len(view), self.send_window, MAX_DATA_FRAME)
+            self.send_window -= size
+            await self.mux.send(FRAME_DATA, self.id, bytes(view[:size]))
+            view = view[size:]
+
+    async def end(self):
+        """Finish our side of the stream"""
+        if self.error:
+            raise self.error
+        self.local_closed = True
+        await self.mux.send(FRAME_END, self.id)
+        self.mux.forget(self)
+
+    async def reset(self, reason: str = ''):
+        """Abort the stream on both sides"""
+        if self.error:
+            return
+        self.fail(StreamReset(reason or 'reset'))
+        self.mux.forget(self)
+        try:
+            await self.mux.send(FRAME_RESET, self.id, reason.encode('utf-8'))
+        except Exception:
+            pass  # The connection itself is gone
+
+    async def read(self) -> bytes:
+        """Next body chunk, or b'' once the peer has ended the stream"""
+        item = await self.inbound.get()
+        if isinstance(item, StreamReset):
+            self.inbound.put_nowait(item)
+            raise item
+        if item is None:
+            self.inbound.put_nowait(None)
+            return b''
+
+        self.buffered -= len(item)
+        self.unacked += len(item)
+        if self.unacked >= self.mux.window // 2 and not self.remote_closed:
+            credit, self.unacked = self.unacked, 0
+            await self.mux.send(FRAME_WINDOW, self.id, WINDOW_UPDATE.pack(credit))
+        return item
+
+    async def chunks(self):
+        """Iterate over the peer's body chunks"""
+        while True:
+            chunk = await self.read()
+            if not chunk:
+                return
+            yield chunk
+
+    def fail(self, error: StreamReset):
+        if self.error:
+            return
+        self.error = error
+        self.inbound.put_nowait(error)
+        if not self.head.done():
+            self.head.set_exception(error)
+        self.window_open.set()
+
+
+class Multiplexer:
+    """Both ends of a tunnel connection.
+
+    `send_bytes` writes one WebSocket binary message; `feed` must be
+    called with every binary message received. `on_open(stream, head)` is
+    run as a task for every stream the peer opens.
+    """
+
+    def __init__(self, send_bytes: Callable[[bytes], Awaitable], on_open=None,
+                 first_stream_id: int = 1, window: int = INITIAL_WINDOW,
+                 logger: logging.Logger = None):
+        self.send_bytes = send_bytes
+        self.on_open = on_open
+        self.next_id = first_stream_id
+        self.window = window
+        self.logger = logger or logging.getLogger(__name__)
+        self.streams: Dict[int, MuxStream] = {}
+        self.handlers = set()
+        self.send_lock = asyncio.Lock()
+        self.closed = False
+        self.stats = {
+            'streams_opened': 0,
+            'streams_reset': 0,
+            'bytes_sent': 0,
+            'bytes_received': 0
+        }
+
+    async def send(self, frame_type: int, stream_id: int, payload: bytes = b''):
+        if self.closed:
+            raise StreamReset("Tunnel connection closed")
+        frame = MUX_HEADER.pack(frame_type, stream_id) + payload
+        async with self.send_lock:
+            await self.send_bytes(frame)
+        self.stats['bytes_sent'] += len(frame)
+
+    async def open_stream(self, head: dict) -> MuxStream:
+        """Start a new exchange by sending its request head"""
+        stream = MuxStream(self, self.next_id)
+        self.next_id += 2
+        self.streams[stream.id] = stream
+        self.stats['streams_opened'] += 1
+        await stream.send_head(FRAME_OPEN, head)
+        return stream
+
+    def forget(self, stream: MuxStream):
+        """Drop a stream once both sides are done with it"""
+        if stream.error or (stream.local_closed and stream.remote_closed):
+            self.streams.pop(stream.id, None)
+
+    async def feed(self, data: bytes):
+        """Dispatch one received frame"""
+        if len(data) < MUX_HEADER.size:
+            raise StreamReset("Truncated tunnel frame")
+        frame_type, stream_id = MUX_HEADER.unpack_from(data)
+        payload = data[MUX_HEADER.size:]
+        self.stats['bytes_received'] += len(data)
+
+        if frame_type == FRAME_OPEN:
+            if stream_id in self.streams or self.on_open is None:
+                await self.send(FRAME_RESET, stream_id, b'unexpected open')
+                return
+            stream = MuxStream(self, stream_id)
+            self.streams[stream_id] = stream
+            self.stats['streams_opened'] += 1
+            task = asyncio.create_task(self._serve(stream, json.loads(payload)))
+            self.handlers.add(task)
+            task.add_done_callback(self.handlers.discard)
+            return
+
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            return  # Late frame for a stream that already finished
+
+        if frame_type == FRAME_DATA:
+            stream.buffered += len(payload)
+            if stream.buffered > self.window:
+                self.logger.warning(f"Stream {stream_id} exceeded its flow-control window")
+                await stream.reset('flow control violation')
+                return
+            stream.inbound.put_nowait(payload)
+        elif frame_type == FRAME_END:
+            stream.remote_closed = True
+            stream.inbound.put_nowait(None)
+            self.forget(stream)
+        elif frame_type == FRAME_RESPONSE:
+            if not stream.head.done():
+                stream.head.set_result(json.loads(payload))
+        elif frame_type == FRAME_RESET:
+            self.stats['streams_reset'] += 1
+            stream.fail(StreamReset(payload.decode('utf-8', 'replace') or 'reset by peer'))
+            self.forget(stream)
+        elif frame_type == FRAME_WINDOW:
+            stream.send_window += WINDOW_UPDATE.unpack(payload)[0]
+            stream.window_open.set()
+
+    async def _serve(self, stream: MuxStream, head: dict):
+        try:
+            await self.on_open(stream, head)
+        except StreamReset:
+            pass
+        except Exception as e:
+            self.logger.error(f"Tunnel stream {stream.id} failed: {e}")
+            await stream.reset(str(e))
+
+    def close(self, reason: str = 'Tunnel connection closed'):
+        """Fail every open stream and stop accepting frames"""
+        self.closed = True
+        for stream in list(self.streams.values()):
+            stream.fail(StreamReset(reason))
+        self.streams.clear()
+        for task in list(self.handlers):
+            task.cancel()
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, streams_active=len(self.streams))
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+DodoHook - Layer-4 TCP Relay
+Copyright 2024, Camlo Technologies
+
+Forwards raw TCP connections, such as MT bridges that do not speak HTTP,
+from a public port to a fixed backend, byte for byte. Every `tcp_relays`
+entry in tunnel_config.yaml gets its own listener next to the HTTPS
+server:
+
+    tcp_relays:
+      mt_bridge:
+        listen_port: 9100
+        backend: 127.0.0.1:9000
+
+Where the OS has splice(2) (Linux), payload bytes never enter Python:
+each direction is spliced socket -> pipe -> socket inside the kernel.
+Elsewhere, or with `zero_copy: false`, each direction copies through one
+reusable buffer with the event loop's socket methods. The relay is a
+pure passthrough, so TLS, if any, runs end to end between the client and
+the backend.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+from collections import deque
+from typing import Dict, List
+
+HAS_SPLICE = hasattr(os, 'splice')
+
+# One pipe's default capacity on Linux, so a spliced chunk always fits
+SPLICE_CHUNK = 64 * 1024
+BUFFER_SIZE = 64 * 1024
+
+COUNTERS = ('connections', 'connect_failures', 'bytes_in', 'bytes_out', 'closed')
+
+
+class RelayConnection:
+    """Byte counts and timing of one relayed connection"""
+
+    def __init__(self, conn_id: int, peer: str):
+        self.id = conn_id
+        self.peer = peer
+        self.started = time.time()
+        self.bytes_in = 0  # Client -> backend
+        self.bytes_out = 0  # Backend -> client
+        self.error = None
+
+    def to_dict(self, now: float) -> dict:
+        entry = {
+            'peer': self.peer,
+            'started': self.started,
+            'duration_s': round(now - self.started, 3),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
+        if self.error:
+            entry['error'] = self.error
+        return entry
+
+
+async def wait_ready(loop: asyncio.AbstractEventLoop, sock: socket.socket, readable: bool):
+    """Wait until `sock` is readable (or writable)"""
+    future = loop.create_future()
+    fd = sock.fileno()
+    if readable:
+        loop.add_reader(fd, lambda: future.done() or future.set_result(None))
+    else:
+        loop.add_writer(fd, lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        if readable:
+            loop.remove_reader(fd)
+        else:
+            loop.remove_writer(fd)
+
+
+class TcpRelay:
+    """One listening port relayed to one backend address"""
+
+    def __init__(self, name: str, listen_host: str, listen_port: int, backend: str,
+                 zero_copy: bool = True, connect_timeout: float = 10,
+                 logger: logging.Logger = None):
+        self.name = name
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.backend = backend
+        self.backend_host, backend_port = backend.rsplit(':', 1)
+        self.backend_port = int(backend_port)
+        self.zero_copy = zero_copy and HAS_SPLICE
+        self.connect_timeout = connect_timeout
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.listener = None
+        self.accept_task = None
+        self.handlers = set()
+        self.ids = itertools.count(1)
+        self.active: Dict[int, RelayConnection] = {}
+        self.recent = deque(maxlen=20)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lifetime_total = 0.0
+        self.lifetime_max = 0.0
+
+    async def start(self, reuse_port: bool = False):
+        """Bind the listener and start accepting connections"""
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.listen_host, self.listen_port,
+                                       type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)
+        family, sock_type, proto, _, address = infos[0]
+
+        listener = socket.socket(family, sock_type, proto)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listener.bind(address)
+            listener.listen(128)
+            listener.setblocking(False)
+        except OSError:
+            listener.close()
+            raise
+
+        self.listener = listener
+        self.accept_task = asyncio.create_task(self.serve())
+        mode = 'splice' if self.zero_copy else 'buffered'
+        self.logger.info(f"TCP relay {self.name}: {self.listen_host}:{self.listen_port} -> {self.backend} ({mode})")
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                client, address = await loop.sock_accept(self.listener)
+            except OSError as e:
+                self.logger.warning(f"TCP relay {self.name}: accept failed: {e}")
+                await asyncio.sleep(0.1)
+                continue
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            task = asyncio.create_task(self.handle(client, f"{address[0]}:{address[1]}"))
+            self.handlers.add(task)
+            task.add_done_callback(self.handlers.discard)
+
+    async def connect_backend(self) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(self.backend_host, self.backend_port, type=socket.SOCK_STREAM)
+        family, sock_type, proto, _, address = infos[0]
+
+        backend = socket.socket(family, sock_type, proto)
+        backend.setblocking(False)
+        try:
+            backend.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            await loop.sock_connect(backend, address)
+        except BaseException:
+            backend.close()
+            raise
+        return backend
+
+    async def handle(self, client: socket.socket, peer: str):
+        conn = RelayConnection(next(self.ids), peer)
+        self.active[conn.id] = conn
+        self.counters['connections'] += 1
+        backend = None
+        pumps = []
+
+        try:
+            try:
+                backend = await asyncio.wait_for(self.connect_backend(), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.counters['connect_failures'] += 1
+                conn.error = f"backend unreachable: {str(e) or 'connect timeout'}"
+                self.logger.warning(f"TCP relay {self.name}: {conn.error}")
+                return
+
+            pump = self._splice if self.zero_copy else self._copy
+            pumps = [
+                asyncio.create_task(pump(client, backend, conn, 'bytes_in')),
+                asyncio.create_task(pump(backend, client, conn, 'bytes_out'))
+            ]
+            done, _ = await asyncio.wait(pumps, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        except OSError as e:
+            # Reset or broken pipe on either side ends both directions
+            conn.error = str(e) or type(e).__name__
+        finally:
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            client.close()
+            if backend is not None:
+                backend.close()
+            self.finish(conn)
+
+    def count(self, conn: RelayConnection, direction: str, size: int):
+        setattr(conn, direction, getattr(conn, direction) + size)
+        self.counters[direction] += size
+
+    async def _splice(self, src: socket.socket, dst: socket.socket, conn: RelayConnection,
+                      direction: str):
+        """Move src -> dst through a kernel pipe until src reaches EOF"""
+        loop = asyncio.get_running_loop()
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        read_fd, write_fd = os.pipe()
+        try:
+            while True:
+                try:
+                    received = os.splice(src.fileno(), write_fd, SPLICE_CHUNK, flags=flags)
+                except BlockingIOError:
+                    await wait_ready(loop, src, readable=True)
+                    continue
+                if not received:
+                    break
+
+                pending = received
+                while pending:
+                    try:
+                        pending -= os.splice(read_fd, dst.fileno(), pending, flags=flags)
+                    except BlockingIOError:
+                        await wait_ready(loop, dst, readable=False)
+                self.count(conn, direction, received)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+        self.half_close(dst)
+
+    async def _copy(self, src: socket.socket, dst: socket.socket, conn: RelayConnection,
+                    direction: str):
+        """Buffered fallback: copy src -> dst until src reaches EOF"""
+        loop = asyncio.get_running_loop()
+        buffer = bytearray(BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            received = await loop.sock_recv_into(src, buffer)
+            if not received:
+                break
+            await loop.sock_sendall(dst, view[:received])
+            self.count(conn, direction, received)
+        self.half_close(dst)
+
+    @staticmethod
+    def half_close(sock: socket.socket):
+        """Pass EOF on; the other direction keeps flowing until it ends too"""
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def finish(self, conn: RelayConnection):
+        now = time.time()
+        self.active.pop(conn.id, None)
+        duration = now - conn.started
+        self.counters['closed'] += 1
+        self.lifetime_total += duration
+        self.lifetime_max = max(self.lifetime_max, duration)
+        self.recent.append(conn.to_dict(now))
+        self.logger.info(
+            f"TCP relay {self.name}: {conn.peer} closed after {duration:.1f}s "
+            f"({conn.bytes_in} bytes in, {conn.bytes_out} bytes out)"
+        )
+
+    async def close(self):
+        """Stop accepting and drop every relayed connection"""
+        if self.accept_task:
+            self.accept_task.cancel()
+            await asyncio.gather(self.accept_task, return_exceptions=True)
+        if self.listener:
+            self.listener.close()
+        for task in list(self.handlers):
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        """Counters, lifetimes and open connections, mergeable across workers"""
+        now = time.time()
+        return dict(
+            self.counters,
+            listen=f"{self.listen_host}:{self.listen_port}",
+            backend=self.backend,
+            mode='splice' if self.zero_copy else 'buffered',
+            active=len(self.active),
+            lifetime_total_s=round(self.lifetime_total, 3),
+            lifetime_max_s=round(self.lifetime_max, 3),
+            lifetime_mean_s=round(self.lifetime_total / self.counters['closed'], 3) if self.counters['closed'] else 0.0,
+            open=[conn.to_dict(now) for conn in list(self.active.values())[:20]],
+            recent=list(self.recent)[-10:]
+        )
+
+
+def merge_relay_stats(snapshots: List[dict]) -> dict:
+    """Combine snapshot() of the same relay from several workers"""
+    merged = dict(snapshots[0])
+    for key in COUNTERS + ('active', 'lifetime_total_s'):
+        merged[key] = sum(snapshot[key] for snapshot in snapshots)
+    merged['lifetime_max_s'] = max(snapshot['lifetime_max_s'] for snapshot in snapshots)
+    merged['lifetime_total_s'] = round(merged['lifetime_total_s'], 3)
+    merged['lifetime_mean_s'] = round(merged['lifetime_total_s'] / merged['closed'], 3) if merged['closed'] else 0.0
+    merged['open'] = [conn for snapshot in snapshots for conn in snapshot['open']][:20]
+    merged['recent'] = sorted(
+        (conn for snapshot in snapshots for conn in snapshot['recent']),
+        key=lambda conn: conn['started']
+    )[-10:]
+    return merged
@@ -7,23 +7,271 @@ This server receives webhook signals from TradingView and other platforms
 and communicates with the MetaTrader Expert Advisor.
 """
 
+import argparse
 import json
 import logging
-import socket
+import math
 import threading
 import time
+from collections import deque
 from datetime import datetime
-from flask import Flask, request, jsonify
-from queue import Queue
+from signal import SIGTERM, default_int_handler, signal as install_handler
+from flask import Flask, g, request, jsonify
 import requests
 
+from mt_protocol import FramedConnection, SignalRejected
+from mt_transport import TRANSPORTS, create_transport
+from signal_batch import MAX_BATCH_ITEMS, BatchError, parse_batch
+from signal_latency import LatencyTracker, SignalTimeline, parse_reply
+from traffic_capture import CaptureWriter
+from tracing import TRACEPARENT, Tracer
+
+# Dispatch priority classes, lower value is dispatched first
+PRIORITY_CLASSES = {'CLOSE_ALL': 0, 'CLOSE': 1, 'MODIFY': 2, 'BUY': 3, 'SELL': 3}
+PRIORITY_NAMES = ['close_all', 'close', 'modify', 'entry']
+EXIT_PRIORITY = PRIORITY_CLASSES['MODIFY']
+ENTRY_PRIORITY = PRIORITY_CLASSES['BUY']
+
+
+class PriorityLanes:
+    """Dispatch queue with one FIFO lane per priority class.
+
+    `get` returns the oldest signal of the most urgent class, so a CLOSE_ALL
+    jumps ahead of buffered entries for other symbols. Workers can be
+    limited to a subset of classes, which is how the reserved exit lane
+    works. Queue-wait time is measured per class.
+    
+    Each symbol is a serial key: an item is only handed out once every
+    earlier item for its symbols has been sent (see `done`). Otherwise two
+    workers could send a netted CLOSE_ALL and the BUY after it at the same
+    time, and the BUY could reach the terminal first.
+    """
+    
+    def __init__(self):
+        self.lanes = [deque() for _ in PRIORITY_NAMES]
+        self.symbols = {}  # symbol -> unfinished items in arrival order
+        self.condition = threading.Condition()
+        self.wait_stats = {
+            name: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            for name in PRIORITY_NAMES
+        }
+    
+    def put(self, item):
+        """Queue a dispatch item built by WebhookServer.enqueue_signal or enqueue_batch"""
+        signals = item['signals'] if 'signals' in item else [item['signal']]
+        item['symbols'] = {signal['symbol'] for signal in signals}
+        with self.condition:
+            for symbol in item['symbols']:
+                self.symbols.setdefault(symbol, deque()).append(item)
+            self.lanes[item['priority']].append(item)
+            self.condition.notify_all()
+    
+    def _ready(self, item):
+        return all(self.symbols[symbol][0] is item for symbol in item['symbols'])
+    
+    def get(self, max_priority=ENTRY_PRIORITY, timeout=None):
+        """Pop the most urgent ready item with priority <= max_priority, or None on timeout"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.condition:
+            while True:
+                for priority in range(max_priority + 1):
+                    lane = self.lanes[priority]
+                    for index, item in enumerate(lane):
+                        if self._ready(item):
+                            del lane[index]
+                            self._record_wait(item)
+                            return item
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def done(self, item):
+        """Release an item's symbols once it has been sent, skipped or failed"""
+        with self.condition:
+            for symbol in item['symbols']:
+                pending = self.symbols[symbol]
+                pending.popleft()
+                if not pending:
+                    del self.symbols[symbol]
+            self.condition.notify_all()
+    
+    def _record_wait(self, item):
+        wait_ms = (time.time() - item['enqueued_at']) * 1000
+        stats = self.wait_stats[PRIORITY_NAMES[item['priority']]]
+        stats['count'] += 1
+        stats['total_ms'] += wait_ms
+        stats['max_ms'] = max(stats['max_ms'], wait_ms)
+
+    def qsize(self):
+        with self.condition:
+            return sum(len(lane) for lane in self.lanes)
+
+    def sizes(self):
+        with self.condition:
+            return {name: len(lane) for name, lane in zip(PRIORITY_NAMES, self.lanes)}
+
+    def wait_summary(self):
+        """Average and maximum queue wait per class in milliseconds"""
+        with self.condition:
+            return {
+                name: {
+                    'count': stats['count'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 3) if stats['count'] else 0.0,
+                    'max_ms': round(stats['max_ms'], 3)
+                }
+                for name, stats in self.wait_stats.items()
+            }
+
+
+class SignalNetter:
+    """Buffers signals per symbol for a short window and collapses them
+    into a net position change before they are dispatched to MetaTrader.
+
+    Within a window BUY/SELL lot sizes are summed (opposite sides cancel),
+    CLOSE drops the entries buffered before it and CLOSE_ALL supersedes
+    everything buffered for the symbol, including an earlier CLOSE. Only
+    the latest SL/TP modification survives a window.
+    """
+
+    def __init__(self, window, dispatch, default_lot=0.1, logger=None):
+        self.window = window
+        self.dispatch = dispatch
+        self.default_lot = default_lot
+        self.logger = logger or logging.getLogger(__name__)
+        self.buffers = {}
+        self.lock = threading.Lock()
+        self.stats = {'received': 0, 'dispatched': 0, 'netted_out': 0}
+
+    def add(self, signal):
+        """Buffer a signal; the first signal for a symbol opens its window"""
+        symbol = signal['symbol']
+        with self.lock:
+            self.stats['received'] += 1
+            if symbol not in self.buffers:
+                self.buffers[symbol] = []
+                timer = threading.Timer(self.window, self.flush, args=(symbol,))
+                timer.daemon = True
+                timer.start()
+            self.buffers[symbol].append(signal)
+
+    def flush(self, symbol):
+        """Close the window for a symbol and dispatch its net signals"""
+        with self.lock:
+            signals = self.buffers.pop(symbol, [])
+        if not signals:
+            return
+        
+        try:
+            netted = self.collapse(signals)
+        except Exception as e:
+            # The window is already popped; losing it would silently drop
+            # signals (a CLOSE_ALL included) that were acknowledged to clients
+            self.logger.error(f"Netting failed for {symbol}, dispatching {len(signals)} signals unnetted: {e}")
+            netted = signals
+        with self.lock:
+            self.stats['dispatched'] += len(netted)
+            self.stats['netted_out'] += len(signals) - len(netted)
+
+        if len(signals) > 1:
+            self.logger.info(
+                f"Netted {len(signals)} signals for {symbol} into {len(netted)}"
+            )
+        for signal in netted:
+            self.dispatch(signal)
+
+    def flush_all(self):
+        """Flush every open window immediately (used on shutdown)"""
+        with self.lock:
+            symbols = list(self.buffers)
+        for symbol in symbols:
+            self.flush(symbol)
+
+    def collapse(self, signals):
+        """Collapse one symbol's buffered signals into their net effect"""
+        exit_signal = None
+        modify_signal = None
+        net_lots = 0.0
+        last_entry = {}
+
+        for signal in signals:
+            action = signal['action']
+            if action == 'CLOSE_ALL':
+                exit_signal = signal
+                modify_signal = None
+                net_lots = 0.0
+                last_entry = {}
+            elif action == 'CLOSE':
+                if exit_signal is None or exit_signal['action'] != 'CLOSE_ALL':
+                    exit_signal = signal
+                modify_signal = None
+                net_lots = 0.0
+                last_entry = {}
+            elif action == 'MODIFY':
+                modify_signal = signal
+            elif action in ('BUY', 'SELL'):
+                lots = float(signal.get('lot_size', self.default_lot))
+                net_lots += lots if action == 'BUY' else -lots
+                last_entry[action] = signal
+
+        netted = []
+        if exit_signal is not None:
+            netted.append(exit_signal)
+        if modify_signal is not None:
+            netted.append(modify_signal)
+
+        net_lots = round(net_lots, 2)
+        if net_lots != 0:
+            action = 'BUY' if net_lots > 0 else 'SELL'
+            entry = dict(last_entry[action])
+            entry['lot_size'] = abs(net_lots)
+            entry['netted_from'] = len(signals)
+            netted.append(entry)
+
+        return netted
+
+
 class WebhookServer:
-    def __init__(self, port=5000, mt_port=8081):  # Changed default port to 5000
+    def __init__(self, port=5000, mt_port=8081, netting_window=0,
+                 dispatch_timeout=30, mt_transport=None, mt_protocol='line',
+                 dispatch_workers=1, capture_file=None, trace_file=None, latency_file=None,
+                 max_batch=MAX_BATCH_ITEMS):  # Changed default port to 5000
         self.app = Flask(__name__)
         self.port = port
         self.mt_port = mt_port
-        self.signal_queue = Queue()
+        # Transport spec for the terminal, see mt_transport.py (default: TCP to localhost)
+        self.transport = create_transport(
+            mt_transport or {'transport': 'tcp', 'host': 'localhost', 'port': mt_port}
+        )
+        # 'line' sends one JSON line per connection; 'framed' keeps one
+        # persistent connection per dispatch lane with pipelined acks
+        # (see mt_protocol.py), so general workers share many in-flight signals
+        self.mt_protocol = mt_protocol
+        self.mt_connections = {}
+        if mt_protocol == 'framed':
+            self.mt_connections = {
+                'general': FramedConnection(self.transport),
+                'reserved': FramedConnection(self.transport)
+            }
+        self.delivery_stats = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        self.stats_lock = threading.Lock()
+        self.claim_lock = threading.Lock()  # Guards dispatch item states
+        self.signal_queue = PriorityLanes()
+        self.dispatch_timeout = dispatch_timeout
+        self.dispatch_workers = dispatch_workers
+        self.max_batch = max_batch
         self.is_running = False
+        self.accepting = True  # Cleared on shutdown; new signals get a 503
+        self.workers = []
+        
+        # Capture mode: record raw webhook requests for traffic_replay.py
+        self.capture = CaptureWriter(capture_file) if capture_file else None
+        
+        # Tracing: spans for tracing.py, continuing the tunnel's trace context
+        self.tracer = Tracer('webhook_server', trace_file) if trace_file else None
+        
+        # Alert-to-execution timelines; latency_file keeps one JSON line per signal
+        self.latency = LatencyTracker(path=latency_file)
         
         # Setup logging
         logging.basicConfig(
@@ -36,26 +284,75 @@ class WebhookServer:
         )
         self.logger = logging.getLogger(__name__)
         
+        # Optional netting stage ahead of MT dispatch (window in seconds, 0 = off)
+        self.netter = None
+        if netting_window > 0:
+            self.netter = SignalNetter(netting_window, self.enqueue_signal, logger=self.logger)
+        
         # Setup routes
         self.setup_routes()
         
     def setup_routes(self):
         """Setup Flask routes"""
         
+        @self.app.before_request
+        def capture_request():
+            if self.capture and request.path.startswith('/webhook'):
+                path = request.path
+                if request.query_string:
+                    path += '?' + request.query_string.decode('utf-8')
+                self.capture.write(request.method, path, request.headers, request.get_data(cache=True))
+        
+        @self.app.before_request
+        def start_trace():
+            if self.tracer and request.path.startswith('/webhook'):
+                g.trace_span = self.tracer.start_span(
+                    'webhook.request', request.headers.get(TRACEPARENT), path=request.path
+                )
+        
+        @self.app.after_request
+        def end_trace(response):
+            span = g.pop('trace_span', None)
+            if span:
+                span.set(status_code=response.status_code)
+                span.end('ok' if response.status_code < 500 else 'error')
+            return response
+        
         @self.app.route('/webhook', methods=['POST'])
         def webhook():
+            received_at = time.time()
+            if not self.accepting:
+                return jsonify({"status": "error", "message": "Server is shutting down"}), 503
             try:
                 data = request.get_json()
                 self.logger.info(f"Received webhook: {data}")
                 
                 # Validate signal
                 if self.validate_signal(data):
-                    # Add to queue for processing
-                    self.signal_queue.put(data)
+                    data['received_at'] = received_at
+
+                    # The signal carries the trace context through netting and the queue
+                    if g.get('trace_span'):
+                        g.trace_span.set(action=data['action'], symbol=data['symbol'])
+                        data[TRACEPARENT] = g.trace_span.traceparent()
+
+                    # Buffer for netting; the window flush queues the net signals
+                    if self.netter:
+                        self.netter.add(data)
+                        return jsonify({"status": "success", "message": "Signal buffered for netting"})
                     
-                    # Send to MetaTrader
-                    if self.send_to_mt(data):
+                    # Queue by priority class and wait for a dispatch worker
+                    item = self.enqueue_signal(data)
+                    state = self.await_dispatch(item)
+                    if state == 'abandoned':
+                        return jsonify({"status": "error", "message": "Timed out waiting for dispatch; the signal was not sent"}), 504
+                    if state == 'in_flight':
+                        return jsonify({"status": "accepted", "message": "Signal is being delivered; do not resend"}), 202
+                    
+                    if item['result']:
                         return jsonify({"status": "success", "message": "Signal processed"})
+                    elif item.get('rejected'):
+                        return jsonify({"status": "error", "message": str(item['rejected'])}), 422
                     else:
                         return jsonify({"status": "error", "message": "Failed to send to MT"}), 500
                 else:
@@ -65,13 +362,98 @@ class WebhookServer:
                 self.logger.error(f"Webhook error: {str(e)}")
                 return jsonify({"status": "error", "message": str(e)}), 500
         
+        @self.app.route('/webhook/batch', methods=['POST'])
+        def webhook_batch():
+            received_at = time.time()
+            if not self.accepting:
+                return jsonify({"status": "error", "message": "Server is shutting down"}), 503
+            try:
+                entries = parse_batch(request.get_data(cache=True), self.max_batch)
+            except BatchError as e:
+                return jsonify({"status": "error", "message": str(e)}), e.status
+            
+            # Validate every item; the valid ones travel downstream as one unit
+            results = [None] * len(entries)
+            signals = []
+            positions = []
+            for index, (data, error) in enumerate(entries):
+                if error is None and not self.validate_signal(data):
+                    error = "Invalid signal"
+                if error:
+                    results[index] = {"index": index, "status": "error", "message": error}
+                    continue
+                data['received_at'] = received_at
+                if g.get('trace_span'):
+                    data[TRACEPARENT] = g.trace_span.traceparent()
+                signals.append(data)
+                positions.append(index)
+            
+            self.logger.info(f"Received batch of {len(entries)} signals, {len(signals)} valid")
+            if g.get('trace_span'):
+                g.trace_span.set(batch=len(entries))
+            
+            if signals:
+                if self.netter:
+                    for signal in signals:
+                        self.netter.add(signal)
+                    outcomes = [("success", "Signal buffered for netting")] * len(signals)
+                else:
+                    # One dispatch item per priority class, sharing the wait
+                    outcomes = [None] * len(signals)
+                    deadline = time.time() + self.dispatch_timeout
+                    for item in self.enqueue_batch(signals):
+                        state = self.await_dispatch(item, deadline - time.time())
+                        for offset, sent in zip(item['indexes'], item['results']):
+                            if state == 'abandoned':
+                                outcomes[offset] = ("error", "Timed out waiting for dispatch; not sent")
+                            elif state == 'in_flight':
+                                outcomes[offset] = ("accepted", "Signal is being delivered; do not resend")
+                            elif isinstance(sent, SignalRejected):
+                                outcomes[offset] = ("error", str(sent))
+                            elif sent:
+                                outcomes[offset] = ("success", "Signal processed")
+                            else:
+                                outcomes[offset] = ("error", "Failed to send to MT")
+                
+                for index, (status, message) in zip(positions, outcomes):
+                    results[index] = {"index": index, "status": status, "message": message}
+            
+            failed = sum(1 for result in results if result['status'] != 'success')
+            return jsonify({
+                "status": "success" if not failed else "partial" if failed < len(results) else "error",
+                "received": len(results),
+                "failed": failed,
+                "results": results
+            }), 200 if not failed else 207
+        
         @self.app.route('/status', methods=['GET'])
         def status():
-            return jsonify({
+            status = {
                 "status": "running",
                 "queue_size": self.signal_queue.qsize(),
+                "queue_lanes": self.signal_queue.sizes(),
+                "queue_wait": self.signal_queue.wait_summary(),
                 "timestamp": datetime.now().isoformat()
-            })
+            }
+            if self.mt_connections:
+                status["in_flight"] = {
+                    lane: conn.in_flight() for lane, conn in self.mt_connections.items()
+                }
+                with self.stats_lock:
+                    delivery = dict(self.delivery_stats)
+                status["delivery_ms"] = {
+                    "count": delivery['count'],
+                    "avg": round(delivery['total_ms'] / delivery['count'], 3) if delivery['count'] else 0.0,
+                    "max": round(delivery['max_ms'], 3)
+                }
+            if self.netter:
+                status["netting"] = dict(self.netter.stats, window=self.netter.window)
+            return jsonify(status)
+        
+        @self.app.route('/latency', methods=['GET'])
+        def latency():
+            recent = request.args.get('recent', 20, type=int)
+            return jsonify(self.latency.summary(recent))
         
         @self.app.route('/health', methods=['GET'])
         def health():
@@ -89,49 +471,217 @@ class WebhookServer:
                 self.logger.warning(f"Missing required field: {field}")
                 return False
         
-        valid_actions = ['BUY', 'SELL', 'CLOSE', 'CLOSE_ALL']
-        if data['action'] not in valid_actions:
+        # Lists and dicts would make the class lookup below raise TypeError
+        for field in required_fields:
+            if not isinstance(data[field], str):
+                self.logger.warning(f"Invalid {field}: {data[field]!r}")
+                return False
+        
+        if data['action'] not in PRIORITY_CLASSES:
             self.logger.warning(f"Invalid action: {data['action']}")
             return False
-            
+        
+        # Netting sums lot sizes, so a bad one must be caught here
+        if 'lot_size' in data:
+            try:
+                lot_size = float(data['lot_size'])
+            except (TypeError, ValueError):
+                lot_size = None
+            if lot_size is None or not math.isfinite(lot_size) or lot_size <= 0:
+                self.logger.warning(f"Invalid lot_size: {data['lot_size']}")
+                return False
+        
         return True
     
-    def send_to_mt(self, signal):
-        """Send signal to MetaTrader via socket or file"""
+    def enqueue_signal(self, signal):
+        """Queue a signal for dispatch in its priority class"""
+        item = {
+            'signal': signal,
+            'priority': PRIORITY_CLASSES[signal['action']],
+            'enqueued_at': time.time(),
+            'done': threading.Event(),
+            'state': 'queued',
+            'result': False
+        }
+        self.signal_queue.put(item)
+        return item
+    
+    def await_dispatch(self, item, timeout=None):
+        """Wait for a worker to finish an item: 'done', 'abandoned' or 'in_flight'.
+        
+        An item still queued at the timeout is abandoned, so the workers skip
+        it and a client retrying the request cannot get the signal sent twice.
+        """
+        if timeout is None:
+            timeout = self.dispatch_timeout
+        if item['done'].wait(max(timeout, 0)):
+            return 'done'
+        with self.claim_lock:
+            if item['state'] == 'queued':
+                item['state'] = 'abandoned'
+                return 'abandoned'
+        return 'done' if item['done'].is_set() else 'in_flight'
+    
+    def claim(self, item):
+        """Take a queued item for dispatch unless its caller has abandoned it"""
+        with self.claim_lock:
+            if item['state'] != 'queued':
+                return False
+            item['state'] = 'dispatching'
+            return True
+    
+    def enqueue_batch(self, signals):
+        """Queue a batch as one dispatch item per priority class, most urgent first.
+        
+        Splitting by class keeps entries off the reserved exit lane and lets
+        exits overtake them. A symbol's signals must keep their batch order,
+        so they all go, in order, into the item of the most urgent class the
+        symbol has in the batch. Each item keeps the `indexes` of its signals.
+        """
+        symbol_priority = {}
+        for signal in signals:
+            priority = PRIORITY_CLASSES[signal['action']]
+            symbol_priority[signal['symbol']] = min(priority, symbol_priority.get(signal['symbol'], priority))
+        
+        classes = {}
+        for index, signal in enumerate(signals):
+            classes.setdefault(symbol_priority[signal['symbol']], []).append(index)
+        
+        items = []
+        enqueued_at = time.time()
+        for priority in sorted(classes):
+            indexes = classes[priority]
+            item = {
+                'signals': [signals[index] for index in indexes],
+                'indexes': indexes,
+                'priority': priority,
+                'enqueued_at': enqueued_at,
+                'done': threading.Event(),
+                'state': 'queued',
+                'result': False,
+                'results': [False] * len(indexes)
+            }
+            self.signal_queue.put(item)
+            items.append(item)
+        return items
+
+    def send_to_mt(self, signal, lane='general', timeline=None):
+        """Send signal to MetaTrader via socket or file; raises SignalRejected if the terminal refuses it"""
         try:
             # Method 1: Try socket communication
-            if self.send_via_socket(signal):
+            if self.send_via_socket(signal, lane, timeline):
                 return True
             
             # Method 2: Fallback to file communication
+            if timeline:
+                timeline.delivered_via = 'file'
             return self.send_via_file(signal)
-            
+        
+        except SignalRejected:
+            raise
         except Exception as e:
             self.logger.error(f"Failed to send to MT: {str(e)}")
             return False
     
-    def send_via_socket(self, signal):
-        """Send signal via socket to MetaTrader"""
+    def send_batch_to_mt(self, signals, timelines, lane='general'):
+        """Send several signals to MetaTrader as one unit.
+        
+        Returns one outcome per signal: True when delivered, False when it
+        could not be, or the SignalRejected raised for a signal the terminal
+        refused. Only undelivered signals fall back to the signal file.
+        """
+        results = [False] * len(signals)
+        try:
+            if self.mt_connections:
+                results = self.send_framed_batch(signals, timelines, lane)
+            else:
+                # The line protocol carries one signal per connection
+                for index, signal in enumerate(signals):
+                    if not self.send_via_socket(signal, lane, timelines[index]):
+                        break
+                    results[index] = True
+        except Exception as e:
+            self.logger.debug(f"Batch socket communication failed: {str(e)}")
+        
+        # Signals that got no ack go to the signal file in one write
+        failed = [index for index, sent in enumerate(results) if sent is False]
+        if failed and self.send_signals_via_file([signals[index] for index in failed]):
+            for index in failed:
+                results[index] = True
+                timelines[index].delivered_via = 'file'
+        return results
+    
+    def send_via_socket(self, signal, lane='general', timeline=None):
+        """Send signal to MetaTrader over the configured transport"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            sock.connect(('localhost', self.mt_port))
+            if self.mt_connections:
+                return self.send_framed(signal, lane, timeline)
             
             message = json.dumps(signal) + '\n'
-            sock.send(message.encode('utf-8'))
-            
-            response = sock.recv(1024).decode('utf-8')
-            sock.close()
-            
-            self.logger.info(f"Signal sent via socket: {response}")
+            response = self.transport.request(message.encode('utf-8')).decode('utf-8')
+            if timeline:
+                timeline.ack(parse_reply(response))
+
+            self.logger.info(f"Signal sent via {self.transport.name}: {response}")
             return True
-            
+        
+        except SignalRejected:
+            raise
         except Exception as e:
             self.logger.debug(f"Socket communication failed: {str(e)}")
             return False
     
+    def send_framed(self, signal, lane, timeline=None):
+        """Send signal on the lane's persistent framed connection and wait for its ack"""
+        ack, latency_ms = self.mt_connections[lane].request(signal)
+        if timeline:
+            timeline.ack(ack)
+        self.record_delivery(latency_ms)
+        
+        if ack.get('status') != 'ok':
+            self.logger.warning(f"Terminal rejected signal: {ack}")
+            raise SignalRejected(ack)
+        
+        self.logger.info(f"Signal acked via framed {self.transport.name} in {latency_ms:.2f} ms: {ack}")
+        return True
+    
+    def send_framed_batch(self, signals, timelines, lane):
+        """Write signals to the lane's framed connection at once and wait for every ack.
+        
+        Outcomes are as for send_batch_to_mt.
+        """
+        results = []
+        batch = self.mt_connections[lane].request_many(signals)
+        for signal, pending, timeline in zip(signals, batch, timelines):
+            if pending.error is not None:
+                self.logger.warning(f"No ack for {signal['action']} {signal['symbol']}: {pending.error}")
+                results.append(False)
+                continue
+            
+            timeline.ack(pending.ack)
+            self.record_delivery(pending.latency_ms)
+            if pending.ack.get('status') != 'ok':
+                self.logger.warning(f"Terminal rejected signal: {pending.ack}")
+                results.append(SignalRejected(pending.ack))
+            else:
+                results.append(True)
+        
+        acked = sum(1 for result in results if result is True)
+        self.logger.info(f"Batch of {len(signals)} sent via framed {self.transport.name}, {acked} acked")
+        return results
+    
+    def record_delivery(self, latency_ms):
+        with self.stats_lock:
+            self.delivery_stats['count'] += 1
+            self.delivery_stats['total_ms'] += latency_ms
+            self.delivery_stats['max_ms'] = max(self.delivery_stats['max_ms'], latency_ms)
+
     def send_via_file(self, signal):
         """Send signal via file to MetaTrader"""
+        return self.send_signals_via_file([signal])
+    
+    def send_signals_via_file(self, signals):
+        """Append signals to the MetaTrader signal file in one write"""
         try:
             signal_file = "mt_signals.json"
             
@@ -143,10 +693,11 @@ class WebhookServer:
             except (FileNotFoundError, json.JSONDecodeError):
                 pass
             
-            # Add timestamp and append new signal
-            signal['timestamp'] = datetime.now().isoformat()
-            signal['processed'] = False
-            existing_signals.append(signal)
+            # Add timestamp and append new signals
+            for signal in signals:
+                signal['timestamp'] = datetime.now().isoformat()
+                signal['processed'] = False
+                existing_signals.append(signal)
             
             # Keep only last 100 signals
             if len(existing_signals) > 100:
@@ -156,52 +707,237 @@ class WebhookServer:
             with open(signal_file, 'w') as f:
                 json.dump(existing_signals, f, indent=2)
             
-            self.logger.info(f"Signal saved to file: {signal_file}")
+            self.logger.info(f"{len(signals)} signal(s) saved to file: {signal_file}")
             return True
             
         except Exception as e:
             self.logger.error(f"File communication failed: {str(e)}")
             return False
     
-    def run(self):
-        """Start the webhook server"""
+    def start_workers(self):
+        """Start the dispatch workers.
+        
+        The general lane serves every class in priority order, the reserved
+        lane only serves exits and SL/TP modifications so they never wait
+        behind an entry being sent.
+        """
         self.is_running = True
+        lanes = [('general', ENTRY_PRIORITY)] * self.dispatch_workers + [('reserved', EXIT_PRIORITY)]
+        for index, (lane, max_priority) in enumerate(lanes):
+            processor_thread = threading.Thread(
+                target=self.process_signals, args=(max_priority, lane),
+                name=f"dispatch-{lane}-{index}"
+            )
+            processor_thread.daemon = True
+            processor_thread.start()
+            self.workers.append(processor_thread)
+    
+    def run(self):
+        """Start the webhook server; returns once the HTTP server stops"""
         self.logger.info(f"Starting webhook server on port {self.port}")
-        
-        # Start signal processor thread
-        processor_thread = threading.Thread(target=self.process_signals)
-        processor_thread.daemon = True
-        processor_thread.start()
+        self.start_workers()
         
         # Start Flask app
         self.app.run(host='0.0.0.0', port=self.port, debug=False, use_reloader=False)
     
-    def process_signals(self):
-        """Background thread to process signals"""
+    def shutdown(self, timeout=None):
+        """Deliver the signals already accepted, then stop the dispatch workers.
+        
+        New signals are refused, open netting windows are flushed into the
+        queue, and the workers keep going until the queue is empty or
+        `timeout` seconds (default: the dispatch timeout) have passed.
+        """
+        self.accepting = False
+        if self.netter:
+            self.netter.flush_all()
+        
+        if timeout is None:
+            timeout = self.dispatch_timeout
+        deadline = time.time() + timeout
+        while self.signal_queue.qsize() and time.time() < deadline:
+            if not any(worker.is_alive() for worker in self.workers):
+                break
+            time.sleep(0.05)
+        
+        # Workers finish the signal they are sending before they exit
+        self.is_running = False
+        for worker in self.workers:
+            worker.join(max(deadline - time.time(), 0) + 1)
+        
+        undelivered = self.signal_queue.qsize()
+        if undelivered:
+            self.logger.error(f"Shutting down with {undelivered} signals not delivered")
+        else:
+            self.logger.info("All accepted signals delivered")
+    
+    def process_signals(self, max_priority=ENTRY_PRIORITY, lane='general'):
+        """Background thread to dispatch queued signals to MetaTrader"""
         while self.is_running:
+            item = None
+            delivery = None
             try:
-                if not self.signal_queue.empty():
-                    signal = self.signal_queue.get(timeout=1)
-                    self.logger.info(f"Processing signal: {signal}")
-                    
-                    # Add any signal processing logic here
-                    # For example, risk validation, signal filtering, etc.
-                    
-                time.sleep(0.1)
+                item = self.signal_queue.get(max_priority, timeout=1)
+                if item is None:
+                    continue
+                if not self.claim(item):
+                    self.logger.warning("Skipping a dispatch abandoned after its caller timed out")
+                    continue
+                
+                if 'signals' in item:
+                    self.dispatch_batch(item, lane)
+                    continue
+                
+                signal = item['signal']
+                self.logger.info(f"Processing signal: {signal}")
+                
+                # Add any signal processing logic here
+                # For example, risk validation, signal filtering, etc.
+                
+                if self.tracer:
+                    parent = signal.get(TRACEPARENT)
+                    self.tracer.start_span(
+                        'webhook.queue', parent, start=item['enqueued_at'],
+                        priority=PRIORITY_NAMES[item['priority']]
+                    ).end()
+                    delivery = self.tracer.start_span(
+                        'mt.delivery', parent, lane=lane, transport=self.transport.describe(),
+                        protocol=self.mt_protocol
+                    )
+                    # The terminal sees the delivery span as its parent
+                    signal[TRACEPARENT] = delivery.traceparent()
                 
+                timeline = SignalTimeline.from_signal(signal, self.transport.describe())
+                timeline.mark('dispatched')
+                try:
+                    item['result'] = self.send_to_mt(signal, lane, timeline)
+                except SignalRejected as e:
+                    # Refused by the terminal: reported back, never retried via the file
+                    item['rejected'] = e
+                self.latency.record(timeline)
+            
             except Exception as e:
                 self.logger.error(f"Signal processing error: {str(e)}")
                 time.sleep(1)
+            finally:
+                if delivery:
+                    delivery.end('ok' if item['result'] else 'error')
+                if item is not None:
+                    self.signal_queue.done(item)
+                    item['done'].set()
+    
+    def dispatch_batch(self, item, lane):
+        """Send the signals of one priority class of a batch to MetaTrader in one write"""
+        signals = item['signals']
+        self.logger.info(f"Processing batch of {len(signals)} signals")
+        
+        delivery = None
+        if self.tracer:
+            parent = signals[0].get(TRACEPARENT)
+            self.tracer.start_span(
+                'webhook.queue', parent, start=item['enqueued_at'],
+                priority=PRIORITY_NAMES[item['priority']], batch=len(signals)
+            ).end()
+            delivery = self.tracer.start_span(
+                'mt.delivery', parent, lane=lane, transport=self.transport.describe(),
+                protocol=self.mt_protocol, batch=len(signals)
+            )
+            for signal in signals:
+                signal[TRACEPARENT] = delivery.traceparent()
+        
+        dispatched_at = time.time()
+        timelines = [SignalTimeline.from_signal(signal, self.transport.describe()) for signal in signals]
+        for timeline in timelines:
+            timeline.mark('dispatched', dispatched_at)
+        
+        try:
+            sent = self.send_batch_to_mt(signals, timelines, lane)
+            item['results'] = sent
+            item['result'] = all(result is True for result in sent)
+            for timeline in timelines:
+                self.latency.record(timeline)
+        finally:
+            if delivery:
+                delivery.end('ok' if item['result'] else 'error')
+
+# WebhookServer settings a --config file may set, by keyword argument name
+SETTINGS = (
+    'port', 'mt_port', 'mt_transport', 'mt_protocol', 'netting_window', 'dispatch_timeout',
+    'dispatch_workers', 'capture_file', 'trace_file', 'latency_file', 'max_batch'
+)
+
+
+def load_settings(args):
+    """WebhookServer keyword arguments from the --config file and the flags"""
+    settings = {}
+    if args.config:
+        import yaml  # Only needed for config files
+        with open(args.config, 'r') as f:
+            try:
+                settings = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                raise ValueError(f"Invalid config file {args.config}: {e}")
+        if not isinstance(settings, dict):
+            raise ValueError(f"{args.config} must be a mapping of settings")
+        unknown = set(settings) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown settings in {args.config}: {', '.join(sorted(unknown))}")
+    
+    # Flags win over the file
+    for key in SETTINGS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+    
+    # The terminal: --mt-transport starts a new spec, --mt-host/--mt-path adjust the file's
+    terminal = {'transport': args.mt_transport} if args.mt_transport else dict(settings.get('mt_transport') or {})
+    if args.mt_host:
+        terminal['host'] = args.mt_host
+    if args.mt_path:
+        terminal['path'] = args.mt_path
+    if terminal:
+        terminal.setdefault('transport', 'tcp')
+        if terminal['transport'] == 'tcp':
+            terminal.setdefault('host', 'localhost')
+            terminal.setdefault('port', settings.get('mt_port', 8081))
+        elif 'path' not in terminal:
+            raise ValueError(f"The {terminal['transport']} transport needs a path (--mt-path)")
+        settings['mt_transport'] = terminal
+    return settings
+
 
 def main():
     """Main entry point"""
-    server = WebhookServer(port=5000, mt_port=8081)
+    parser = argparse.ArgumentParser(description='AI Trading Expert webhook server')
+    parser.add_argument('--config', help='YAML file of server settings (see SETTINGS); flags override it')
+    parser.add_argument('--port', type=int, help='HTTP port (default: 5000)')
+    parser.add_argument('--mt-port', type=int, help='Terminal TCP port (default: 8081)')
+    parser.add_argument('--mt-transport', choices=sorted(TRANSPORTS), help='How to reach the terminal (default: tcp)')
+    parser.add_argument('--mt-host', help='Terminal host for the tcp transport (default: localhost)')
+    parser.add_argument('--mt-path', help='Socket or FIFO path for the unix and fifo transports')
+    parser.add_argument('--mt-protocol', choices=['line', 'framed'], help='default: line')
+    parser.add_argument('--netting-window', type=float, help='Seconds, 0 = off')
+    parser.add_argument('--dispatch-timeout', type=float, help='Seconds (default: 30)')
+    parser.add_argument('--dispatch-workers', type=int, help='General lane workers (default: 1)')
+    parser.add_argument('--capture-file', help='Record webhook requests for traffic_replay.py')
+    parser.add_argument('--trace-file', help='Write tracing spans as JSON lines')
+    parser.add_argument('--latency-file', help='Write signal timelines as JSON lines')
+    parser.add_argument('--max-batch', type=int, help=f'Items per batch (default: {MAX_BATCH_ITEMS})')
+    args = parser.parse_args()
+    
+    try:
+        settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    server = WebhookServer(**settings)
     
+    # Flask returns from app.run() on Ctrl+C; docker stop sends SIGTERM,
+    # which is made to stop it the same way
+    install_handler(SIGTERM, default_int_handler)
     try:
         server.run()
-    except KeyboardInterrupt:
+    finally:
         print("\nShutting down webhook server...")
-        server.is_running = False
+        server.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file